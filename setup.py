@@ -14,13 +14,28 @@ def get_version() -> str:
 install_requires = [
     "packaging>=20.9",
     "requests>=2.20.0",
-    "tqdm>=4.64.1",
     "python-gitlab>=5.0.0",
     "ipywidgets>=8.1.5",
 ]
 
 extras = {}
 
+extras["async"] = [
+    "aiohttp>=3.8.0",
+]
+
+extras["yaml"] = [
+    "pyyaml>=5.1",
+]
+
+extras["http2"] = [
+    "httpx[http2]>=0.23.0",
+]
+
+extras["testing"] = [
+    "pytest>=8.1.1",
+]
+
 extras["torch"] = [
     "torch",
     "safetensors[torch]",
@@ -34,7 +49,6 @@ extras["typing"] = [
     "types-requests",
     "types-simplejson",
     "types-toml",
-    "types-tqdm",
     "types-urllib3",
 ]
 
@@ -52,7 +66,7 @@ extras["doc"] = [
     "sphinx-markdown-tables>=0.0.17",
 ]
 
-extras["all"] = extras["quality"] + extras["typing"] + extras["doc"]
+extras["all"] = extras["testing"] + extras["quality"] + extras["typing"] + extras["doc"]
 
 extras["dev"] = extras["all"]
 
@@ -60,6 +74,7 @@ entry_points = {
     "console_scripts": [
         "wm_upload=wisemodel_hub.upload_script:wm_upload",
         "wm_download=wisemodel_hub.download_script:wm_download",
+        "wm_cache=wisemodel_hub.cache_script:wm_cache",
     ],
 }
 
@@ -14,22 +14,76 @@ logging.basicConfig(level=logging.INFO,
 # WARNING: any comment added in this dictionary definition will be lost when
 # re-generating the file !
 _SUBMOD_ATTRS = {
+    "aio": [
+        "afile_download",
+        "apush_to_hub",
+        "asnapshot_download",
+        "aupload_file",
+    ],
     "auth": [
         "get_local_token",
         "login",
         "notebook_login",
     ],
+    "batch_download": [
+        "download_many",
+    ],
+    "cache_manager": [
+        "gc_cache",
+        "pin_repo",
+        "prune_cache",
+        "scan_cache",
+        "unpin_repo",
+    ],
     "downloader": [
         "download_with_git",
         "file_download",
         "lfs_file_download",
         "snapshot_download",
+        "sync_snapshot",
+    ],
+    "events": [
+        "JSONLinesSink",
+        "MetricsSink",
+        "ProgressSink",
+        "add_event_sink",
+        "configure_events",
+        "remove_event_sink",
+    ],
+    "lazy_snapshot": [
+        "LazySnapshot",
+    ],
+    "mirrors": [
+        "configure_mirrors",
+    ],
+    "rate_limit": [
+        "configure_rate_limit",
+    ],
+    "remote_file": [
+        "open_remote",
+    ],
+    "remote_safetensors": [
+        "fetch_tensors",
+        "get_safetensors_header",
+    ],
+    "retry": [
+        "configure_retry",
+    ],
+    "session": [
+        "configure_session",
+    ],
+    "transport": [
+        "configure_transport",
+        "get_transport",
     ],
     "uploader": [
         "push_to_hub",
         "upload_file",
         "upload_with_git",
     ],
+    "utils": [
+        "list_repo_files",
+    ],
 }
 
 
@@ -138,19 +192,57 @@ if os.environ.get("EAGER_IMPORT", ""):
 # make style
 # ```
 if TYPE_CHECKING:  # pragma: no cover
+    from .aio import (
+        afile_download,  # noqa: F401
+        apush_to_hub,  # noqa: F401
+        asnapshot_download,  # noqa: F401
+        aupload_file,  # noqa: F401
+    )
     from .auth import (
         get_local_token,  # noqa: F401
         login,  # noqa: F401
         notebook_login,  # noqa: F401
     )
+    from .batch_download import download_many  # noqa: F401
+    from .cache_manager import (
+        gc_cache,  # noqa: F401
+        pin_repo,  # noqa: F401
+        prune_cache,  # noqa: F401
+        scan_cache,  # noqa: F401
+        unpin_repo,  # noqa: F401
+    )
     from .downloader import (
         download_with_git,  # noqa: F401
         file_download,  # noqa: F401
         lfs_file_download,  # noqa: F401
         snapshot_download,  # noqa: F401
+        sync_snapshot,  # noqa: F401
+    )
+    from .events import (
+        JSONLinesSink,  # noqa: F401
+        MetricsSink,  # noqa: F401
+        ProgressSink,  # noqa: F401
+        add_event_sink,  # noqa: F401
+        configure_events,  # noqa: F401
+        remove_event_sink,  # noqa: F401
+    )
+    from .lazy_snapshot import LazySnapshot  # noqa: F401
+    from .mirrors import configure_mirrors  # noqa: F401
+    from .rate_limit import configure_rate_limit  # noqa: F401
+    from .remote_file import open_remote  # noqa: F401
+    from .remote_safetensors import (
+        fetch_tensors,  # noqa: F401
+        get_safetensors_header,  # noqa: F401
+    )
+    from .retry import configure_retry  # noqa: F401
+    from .session import configure_session  # noqa: F401
+    from .transport import (
+        configure_transport,  # noqa: F401
+        get_transport,  # noqa: F401
     )
     from .uploader import (
         push_to_hub,  # noqa: F401
         upload_file,  # noqa: F401
         upload_with_git,  # noqa: F401
     )
+    from .utils import list_repo_files  # noqa: F401
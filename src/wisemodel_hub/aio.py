@@ -0,0 +1,658 @@
+import asyncio
+import contextlib
+import functools
+import os
+import time
+from copy import deepcopy
+
+from .auth import get_local_token, login, notebook_login
+from .cache import export_file, get_snapshot_dir, get_snapshot_path, link_cached_blob, snapshot_matches, store_file
+from .cache_index import get_cache_index, record_downloaded_files
+from .cache_manager import enforce_cache_budget
+from .constants import (
+    HEADERS,
+    LINK_MODE,
+    MAX_WORKERS,
+    RETRY_TIMES,
+    TEN_MB,
+    WM_URL_ADDFILES,
+    WM_URL_BASE,
+    WM_URL_CHECK,
+    WM_URL_MERGE,
+    WM_URL_UPLOAD,
+)
+from .downloader import _is_offline, _offline_file, _offline_snapshot, _resolve_snapshot
+from .events import CACHE_HIT, CACHE_MISS, Transfer, emit, log
+from .integrity import IntegrityError, StreamHasher, expected_digests
+from .mirrors import get_mirror_pool
+from .parallel_download_with_resume import LFSDownload
+from .rate_limit import get_limiter
+from .retry import RetryableError, check_range_response, get_retry_policy
+from .uploader import _collect_files_to_upload
+from .utils import (
+    calculate_md5,
+    file_metadata_from_headers,
+    get_file_url,
+    is_branch_exist,
+    is_notebook,
+)
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _import_aiohttp():
+    try:
+        import aiohttp  # type: ignore
+    except ImportError:
+        raise ImportError(
+            "The asyncio API of wisemodel_hub needs the `aiohttp` module: `pip install wisemodel_hub[async]`."
+        )
+    return aiohttp
+
+
+async def _run_sync(func, *args, **kwargs):
+    # 登录、分支检查和文件树等元数据调用仍是同步实现，放到线程池中执行，不阻塞事件循环
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+
+@contextlib.asynccontextmanager
+async def _client_session(session=None, limit=MAX_WORKERS):
+    if session is not None:
+        yield session
+        return
+    aiohttp = _import_aiohttp()
+    connector = aiohttp.TCPConnector(limit=limit)
+    timeout = aiohttp.ClientTimeout(total=None)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        yield session
+
+
+def _ensure_login():
+    if is_notebook():
+        notebook_login()
+    else:
+        login()
+
+
+def _relogin():
+    if is_notebook():
+        notebook_login(new_session=True)
+    else:
+        login(new_session=True)
+
+
+def _check_branch(repo_id, repo_type, branch):
+    if not is_branch_exist(repo_id, repo_type, branch):
+        raise ValueError(f"仓库 {repo_id} 不存在分支 {branch}")
+
+
+async def _afetch_file_metadata(session, url):
+    async with session.head(url, headers=HEADERS, allow_redirects=True) as res:
+        if res.status < 400 and "Content-Length" in res.headers:
+            return file_metadata_from_headers(url, res.status, res.headers)
+
+    headers = deepcopy(HEADERS)
+    headers["Range"] = "bytes=0-0"
+    async with session.get(url, headers=headers) as res:
+        res.raise_for_status()
+        return file_metadata_from_headers(url, res.status, res.headers)
+
+
+def _incomplete_size(path):
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+async def _adownload_stream(session, url, cache_path, metadata, semaphore, file_name=None):
+    incomplete_path = cache_path + ".incomplete"
+    os.makedirs(os.path.dirname(incomplete_path), exist_ok=True)
+    # 连接中断时从 .incomplete 当前的大小继续
+    policy = get_retry_policy()
+    initial = min(_incomplete_size(incomplete_path), metadata.size)
+    with Transfer(file_name or url, metadata.size, initial) as transfer:
+        hasher = await policy.acall(
+            _adownload_stream_once,
+            session,
+            url,
+            incomplete_path,
+            metadata,
+            semaphore,
+            transfer,
+            budget=policy.new_budget(),
+            progress=lambda: _incomplete_size(incomplete_path),
+            description=f"Download of {url}",
+        )
+
+        try:
+            hasher.verify(cache_path)
+        except IntegrityError:
+            os.remove(incomplete_path)
+            raise
+    store_file(incomplete_path, cache_path, hasher.hexdigest(), hasher.expected)
+
+
+async def _adownload_stream_once(session, url, incomplete_path, metadata, semaphore, transfer):
+    resume_size = _incomplete_size(incomplete_path)
+    if resume_size > metadata.size:
+        resume_size = 0
+    hasher = StreamHasher(expected_digests(metadata))
+    if resume_size and resume_size == metadata.size:
+        await _run_sync(hasher.catch_up, incomplete_path, resume_size)
+        return hasher
+
+    headers = deepcopy(HEADERS)
+    if resume_size:
+        headers["Range"] = f"bytes={resume_size}-"
+
+    mirrors = get_mirror_pool()
+    endpoint = mirrors.best()
+    started = time.monotonic()
+    limiter = get_limiter("download")
+    with mirrors.use(endpoint):
+        async with semaphore, limiter.aconnection(), session.get(mirrors.url_for(url, endpoint), headers=headers) as r:
+            r.raise_for_status()
+            if r.status != 206:
+                # The server ignored the Range header and sent the whole file
+                resume_size = 0
+            check_range_response(r.status, r.headers, resume_size, metadata.size, metadata.size, metadata.etag)
+            if resume_size:
+                await _run_sync(hasher.catch_up, incomplete_path, resume_size)
+            transfer.reset(resume_size)
+            with open(incomplete_path, "ab" if resume_size else "wb") as f:
+                async for chunk in r.content.iter_chunked(CHUNK_SIZE):
+                    await limiter.athrottle(len(chunk))
+                    f.write(chunk)
+                    hasher.update(chunk)
+                    transfer.update(len(chunk))
+        if _incomplete_size(incomplete_path) < metadata.size:
+            raise RetryableError(f"Connection closed before {url} was fully downloaded.")
+    mirrors.record_success(endpoint, metadata.size - resume_size, time.monotonic() - started)
+    return hasher
+
+
+async def _adownload_range(session, downloader, index, semaphore):
+    # 与 LFSDownload.download_range 相同，失败时只重试该范围尚未写入的部分
+    await downloader.retry_policy.acall(
+        _adownload_range_once,
+        session,
+        downloader,
+        index,
+        semaphore,
+        budget=downloader.retry_budget,
+        progress=lambda: downloader.range_scheduler.ranges[index][1],
+        description=f"Range {index} of {downloader.file_name}",
+    )
+
+
+async def _adownload_range_once(session, downloader, index, semaphore):
+    _, cursor, end = downloader.range_scheduler.ranges[index]
+    if cursor >= end:
+        return
+    start = cursor
+    received = 0
+    started = time.monotonic()
+    limiter = get_limiter("download")
+    headers = downloader.range_headers(cursor, end)
+    mirrors = downloader.mirrors
+    endpoint = mirrors.choose()
+    url = mirrors.url_for(downloader.url, endpoint)
+    with mirrors.use(endpoint):
+        # 等待重试时不占用并发名额
+        async with semaphore, limiter.aconnection(), session.get(url, headers=headers) as response:
+            ttfb = time.monotonic() - started
+            response.raise_for_status()
+            check_range_response(
+                response.status, response.headers, cursor, end, downloader.total_size, downloader.metadata.etag
+            )
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                await limiter.athrottle(len(chunk))
+                # 写入、计算校验和以及保存进度都是阻塞的文件操作
+                size = await _run_sync(downloader.write_range_chunk, index, cursor, chunk)
+                if size == 0:
+                    break
+                cursor += size
+                received += size
+        await _run_sync(downloader.finish_range, index, received, time.monotonic() - started, endpoint, start, ttfb)
+
+
+async def _adownload_worker(session, downloader, semaphore):
+    # 与 LFSDownload.download_worker 相同的领取/切分逻辑，只是每个范围由协程下载
+    while True:
+        index = downloader.range_scheduler.acquire()
+        if index is None:
+            return
+        try:
+            await _adownload_range(session, downloader, index, semaphore)
+        finally:
+            downloader.range_scheduler.release(index)
+
+
+async def _adownload_lfs(session, downloader, semaphore):
+    await _run_sync(downloader.prepare)
+    try:
+        await asyncio.gather(*(_adownload_worker(session, downloader, semaphore) for _ in downloader.tasks()))
+    except BaseException as e:
+        downloader.close(e)
+        raise
+    await _run_sync(downloader.finalize)
+
+
+async def _adownload(
+    session,
+    repo_id,
+    file_name,
+    revision,
+    local_dir,
+    num_parts,
+    force_download,
+    metadata=None,
+    semaphore=None,
+    link_mode=LINK_MODE,
+):
+    cache_path = get_snapshot_path(repo_id, revision, file_name)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(max(1, num_parts))
+
+    if metadata is None and (force_download or not os.path.exists(cache_path)):
+        metadata = await _afetch_file_metadata(session, get_file_url(repo_id, file_name, revision))
+    cached = os.path.exists(cache_path) and (
+        metadata is None or (os.path.getsize(cache_path) == metadata.size and snapshot_matches(cache_path, metadata))
+    )
+
+    if cached and not force_download:
+        emit(CACHE_HIT, file=file_name, reason="snapshot")
+    elif not force_download and await _run_sync(link_cached_blob, cache_path, metadata):
+        emit(CACHE_HIT, file=file_name, reason="checksum")
+    elif metadata.size > TEN_MB and num_parts > 1 and hasattr(os, "pwrite"):
+        emit(CACHE_MISS, file=file_name)
+        downloader = LFSDownload(
+            repo_id,
+            file_name,
+            revision=revision,
+            num_parts=num_parts,
+            force_download=force_download,
+            metadata=metadata,
+        )
+        await _adownload_lfs(session, downloader, semaphore)
+    else:
+        emit(CACHE_MISS, file=file_name)
+        await _adownload_stream(session, metadata.url, cache_path, metadata, semaphore, file_name)
+
+    return await _run_sync(export_file, cache_path, local_dir, file_name, link_mode)
+
+
+async def afile_download(
+    repo_id,
+    file_name,
+    repo_type="models",
+    local_dir=None,
+    branch="main",
+    num_parts=8,
+    force_download=False,
+    session=None,
+    link_mode=LINK_MODE,
+    offline=None,
+):
+    """
+    afile_download 异步下载单个文件
+    ----------------------------------
+
+    file_download / lfs_file_download 的协程版本，使用 aiohttp 在事件循环中下载，缓存、
+    断点续传和分块规则与同步接口一致：超过10MB且 num_parts 大于1时按范围并发下载。
+
+    参数：
+    ::::::::::
+    - **repo_id** - 仓库ID
+    - **file_name** - 文件名
+    - **repo_type** - 仓库类型，可选值：'models'、'datasets'、'codes'
+    - **local_dir** - 本地文件夹路径，默认为None，即下载到默认缓存目录
+    - **branch** - 分支名，默认为"main"
+    - **num_parts** - 大文件的并发范围数，默认为8
+    - **force_download** - 是否强制下载，如果本地已存在，则重新下载，默认为False
+    - **session** - 可选的 aiohttp.ClientSession，多个任务共享同一个会话时传入
+    - **link_mode** - 把缓存中的文件放到 local_dir 的方式，默认为'auto'，参见 snapshot_download
+    - **offline** - 是否离线使用，默认为None，即由环境变量 WM_OFFLINE 决定，参见 snapshot_download
+
+    返回值：
+    ::::::::::
+        str: 文件的本地路径
+    """
+    if _is_offline(offline):
+        return await _run_sync(_offline_file, repo_id, file_name, branch, local_dir, link_mode)
+    await _run_sync(_check_branch, repo_id, repo_type, branch)
+    async with _client_session(session) as session:
+        return await _adownload(
+            session, repo_id, file_name, branch, local_dir, num_parts, force_download, link_mode=link_mode
+        )
+
+
+async def asnapshot_download(
+    repo_id,
+    repo_type="models",
+    local_dir=None,
+    branch="main",
+    pattern=None,
+    num_parts=8,
+    force_download=False,
+    max_workers=MAX_WORKERS,
+    session=None,
+    link_mode=LINK_MODE,
+    offline=None,
+):
+    """
+    asnapshot_download 异步下载指定仓库的指定版本
+    ------------------------------------------------
+
+    snapshot_download 的协程版本。所有文件在同一个事件循环中并发下载，
+    小文件和大文件的范围请求共享 max_workers 个连接，大文件先开始。
+
+    参数：
+    ::::::::::
+    - **repo_id** - 仓库ID
+    - **repo_type** - 仓库类型，可选值：'models'、'datasets'、'codes'
+    - **local_dir** - 本地文件夹路径，默认为None，即下载到默认缓存目录
+    - **branch** - 分支名，默认为"main"
+    - **pattern** - fnmatch格式的匹配字符串，用于过滤文件名，默认为None，即不过滤
+    - **num_parts** - 大文件的并发范围数，默认为8
+    - **force_download** - 是否强制下载，如果本地已存在，则重新下载，默认为False
+    - **max_workers** - 全局并发连接数，默认为32
+    - **session** - 可选的 aiohttp.ClientSession
+    - **link_mode** - 把缓存中的文件放到 local_dir 的方式，默认为'auto'，参见 snapshot_download
+    - **offline** - 是否离线使用，默认为None，即由环境变量 WM_OFFLINE 决定，参见 snapshot_download
+
+    返回值：
+    ::::::::::
+        str: 快照所在的目录，指定 local_dir 时为 local_dir；下载失败的文件以警告的形式输出
+    """
+    if _is_offline(offline):
+        return await _run_sync(_offline_snapshot, repo_id, branch, pattern, local_dir, link_mode)
+
+    commit, all_file_names, cached, file_names = await _run_sync(
+        _resolve_snapshot, repo_id, repo_type, branch, pattern, force_download
+    )
+    for file_name in cached:
+        await _run_sync(export_file, get_snapshot_path(repo_id, branch, file_name), local_dir, file_name, link_mode)
+
+    async with _client_session(session, limit=max_workers) as session:
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def probe(file_name):
+            async with semaphore:
+                return await _afetch_file_metadata(session, get_file_url(repo_id, file_name, branch))
+
+        # 每个文件只探测一次元数据，后续判断和下载都复用
+        metadatas = await asyncio.gather(*(probe(file_name) for file_name in file_names))
+
+        failed = []
+
+        async def download(file_name, metadata):
+            # 网络错误已经在请求内部按范围重试过，只有校验失败才需要重新下载整个文件
+            for try_times in range(RETRY_TIMES + 1):
+                try:
+                    return await _adownload(
+                        session,
+                        repo_id,
+                        file_name,
+                        branch,
+                        local_dir,
+                        num_parts,
+                        force_download,
+                        metadata=metadata,
+                        semaphore=semaphore,
+                        link_mode=link_mode,
+                    )
+                except IntegrityError as e:
+                    log(f"Failed to download {file_name}: {e}", level="warning")
+                    if try_times < RETRY_TIMES:
+                        log(f"Retrying {try_times + 1}...")
+                except Exception as e:
+                    log(f"Failed to download {file_name}: {e}", level="warning")
+                    break
+            else:
+                log(f"Failed to download {file_name} after {RETRY_TIMES} retries.", level="warning")
+            failed.append(file_name)
+
+        # 大文件先开始，避免最后只剩一个大分片在下载
+        jobs = sorted(zip(file_names, metadatas), key=lambda job: job[1].size, reverse=True)
+        await asyncio.gather(*(download(file_name, metadata) for file_name, metadata in jobs))
+
+    if failed:
+        log(f"Failed to download {len(failed)} files: {failed}", level="warning")
+
+    index = get_cache_index()
+    if commit is not None:
+        await _run_sync(record_downloaded_files, repo_id, branch, commit, file_names, metadatas, failed)
+        await _run_sync(index.set_revision, repo_id, branch, commit, all_file_names)
+    await _run_sync(index.touch_revision, repo_id, branch)
+    await _run_sync(enforce_cache_budget, [(repo_id, branch)])
+    return local_dir or get_snapshot_dir(repo_id, branch)
+
+
+async def _apost_json(session, url, **kwargs):
+    async with session.post(url, **kwargs) as response:
+        return await response.json(content_type=None)
+
+
+async def _aupload_chunk(session, file_name, file_md5, index, chunk_data, timeout, headers):
+    aiohttp = _import_aiohttp()
+    # FormData 只能发送一次，每次重试重新构造
+    form = aiohttp.FormData()
+    form.add_field("md5", file_md5)
+    form.add_field("dir", "")
+    form.add_field("chunk", str(index))
+    form.add_field("file", chunk_data, filename=file_name)
+    limiter = get_limiter("upload")
+    await limiter.athrottle(len(chunk_data))
+    async with limiter.aconnection():
+        async with session.post(WM_URL_UPLOAD, data=form, timeout=timeout, headers=headers) as response:
+            response.raise_for_status()
+            upload_response = await response.json(content_type=None)
+    if upload_response["code"] != 0:
+        raise RetryableError(f"分块 {index} 上传失败: {upload_response.get('message')}")
+
+
+async def _aupload_file(
+    session, file_path, repo_id, repo_type, branch, commit_message, chunk_size, retries, timeout, repo_dir
+):
+    aiohttp = _import_aiohttp()
+    token = get_local_token()
+    file_name = os.path.basename(file_path)
+    file_md5 = await _run_sync(calculate_md5, file_path)
+    remote_project_url = f"{WM_URL_BASE}/{repo_type}/{repo_id}"
+    request_timeout = aiohttp.ClientTimeout(total=timeout) if timeout else None
+
+    # Step 1: Check the file chunk status
+    check_data = {"fileName": file_name, "fileMd5": file_md5, "dir": "", "project_path": remote_project_url}
+    headers = {"Authorization": f"Bearer {token}"}
+    check_response = await _apost_json(session, WM_URL_CHECK, data=check_data, headers=headers)
+
+    # 如果提示token失败，则重新登录后再检查一次
+    if check_response["code"] == "B2002":
+        await _run_sync(_relogin)
+        token = get_local_token()
+        headers = {"Authorization": f"Bearer {token}"}
+        check_response = await _apost_json(session, WM_URL_CHECK, data=check_data, headers=headers)
+
+    if check_response["code"] != 0:
+        log(f"文件检查失败: {check_response['message']}", level="warning")
+        return
+
+    existing_chunks = check_response["data"]["chunks"]
+    if "resultCode" in check_response["data"] and check_response["data"]["resultCode"] == -1:
+        existing_chunks = []
+
+    # Step 2: Upload file chunks
+    file_size = os.path.getsize(file_path)
+    num_chunks = (file_size + chunk_size - 1) // chunk_size
+    policy = get_retry_policy().with_max_retries(retries)
+
+    def read_chunk(index):
+        with open(file_path, "rb") as f:
+            f.seek(index * chunk_size)
+            return f.read(chunk_size)
+
+    with Transfer(file_name, file_size, direction="upload") as transfer:
+        for i in range(num_chunks):
+            if str(i) in existing_chunks:
+                transfer.update(chunk_size)  # 跳过已存在的块，并更新进度
+                continue
+
+            chunk_data = await _run_sync(read_chunk, i)
+            await policy.acall(
+                _aupload_chunk,
+                session,
+                file_name,
+                file_md5,
+                i,
+                chunk_data,
+                request_timeout,
+                headers,
+                description=f"Upload of chunk {i} of {file_name}",
+            )
+            transfer.update(len(chunk_data))
+
+    # Step 3: Check again the file chunk status after uploading all chunks
+    check_response = await _apost_json(session, WM_URL_CHECK, data=check_data, headers=headers)
+    if (
+        check_response["code"] != 0
+        or "resultCode" in check_response["data"]
+        and check_response["data"]["resultCode"] != num_chunks
+    ):
+        log(f"文件检查失败或文件块数量不匹配: {check_response['message']}", level="warning")
+        return
+    log("所有文件块已成功上传并验证")
+
+    # Step 4: Merge file chunks
+    merge_data = {"fileName": file_name, "fileMd5": file_md5, "dir": "", "project_path": remote_project_url}
+    merge_response = await _apost_json(session, WM_URL_MERGE, data=merge_data, headers=headers)
+    if merge_response["code"] != 0:
+        log(f"文件合并失败: {merge_response['message']}", level="warning")
+        return
+
+    merged_file_path = merge_response["data"]["filepath"]
+    log(f"文件合并成功: {merged_file_path}")
+
+    # Step 5: Add merged file to repository
+    addfiles_data = {
+        "project_path": remote_project_url,
+        "branch": branch,
+        "files": [merged_file_path],
+        "commit": commit_message,
+        "wangpan_url": "",
+        "git_folder": repo_dir or "",
+    }
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    addfiles_response = await _apost_json(session, WM_URL_ADDFILES, json=addfiles_data, headers=headers)
+    if addfiles_response["code"] != 0:
+        log(f"添加文件到仓库失败: {addfiles_response['message']}", level="warning")
+        return
+
+    log(f"{file_name},文件上传并添加到仓库成功")
+
+
+async def aupload_file(
+    file_path,
+    repo_id,
+    repo_type="models",
+    branch="main",
+    commit_message="添加文件",
+    chunk_size=5 * 1024 * 1024,
+    retries=3,
+    timeout=None,
+    repo_dir=None,
+    session=None,
+):
+    """
+    aupload_file 异步上传单个文件
+    --------------------------------
+
+    upload_file 的协程版本，参数含义与 upload_file 相同。
+
+    参数：
+    :::::::::::::
+    - **file_path** - 要上传文件的全路径
+    - **repo_id** - 仓库id，格式为 'owner/repo_name'
+    - **repo_type** - 仓库类型，可选值：'models'、'datasets'、'codes'
+    - **branch** - wisemodel使用git管理仓库，此参数是git分支名
+    - **commit_message** - 仓库提交信息
+    - **chunk_size** - 上传时使用的分段大小，默认为5MB
+    - **retries** - 上传失败重试次数
+    - **timeout** - 调用主站api的超时时间，默认为None
+    - **repo_dir** - 远程仓库的相对路径，默认为None，即上传到仓库根目录
+    - **session** - 可选的 aiohttp.ClientSession
+    """
+    await _run_sync(_ensure_login)
+    await _run_sync(_check_branch, repo_id, repo_type, branch)
+    async with _client_session(session) as session:
+        await _aupload_file(
+            session, file_path, repo_id, repo_type, branch, commit_message, chunk_size, retries, timeout, repo_dir
+        )
+
+
+async def apush_to_hub(
+    dir_path,
+    repo_id,
+    repo_type="models",
+    pattern=None,
+    branch="main",
+    commit_message="上传文件夹",
+    chunk_size=5 * 1024 * 1024,
+    retries=3,
+    timeout=None,
+    resumable=True,
+    workers=5,
+    session=None,
+):
+    """
+    apush_to_hub 异步上传文件夹到主站仓库
+    ----------------------------------------
+
+    push_to_hub 的协程版本，最多 workers 个文件同时上传。
+
+    参数：
+    ::::::::::
+    - **dir_path** - 要上传文件的全路径
+    - **repo_id** - 仓库id，格式为 'owner/repo_name'
+    - **repo_type** - 仓库类型，可选值：'models'、'datasets'、'codes'
+    - **pattern** - fnmatch格式的匹配字符串，用于过滤文件名，默认为None，即不过滤
+    - **branch** - wisemodel使用git管理仓库，此参数是git分支名
+    - **commit_message** - 仓库提交信息
+    - **chunk_size** - 上传时使用的分段大小，默认为5MB
+    - **retries** - 上传失败重试次数
+    - **timeout** - 调用主站api的超时时间，默认为None
+    - **resumable** - 是否开启文件夹级别的断点续传。默认为True。
+    - **workers** - 同时上传的文件数，默认为5
+    - **session** - 可选的 aiohttp.ClientSession
+
+    抛出异常：
+    ::::::::::
+    ValueError - dir_path 路径不是文件夹
+    """
+    await _run_sync(_ensure_login)
+    await _run_sync(_check_branch, repo_id, repo_type, branch)
+    files_to_upload = await _run_sync(
+        _collect_files_to_upload, dir_path, repo_id, repo_type, pattern, branch, resumable
+    )
+    if not files_to_upload:
+        return
+
+    semaphore = asyncio.Semaphore(workers)
+    async with _client_session(session) as session:
+
+        async def upload(rel_path, full_path):
+            async with semaphore:
+                await _aupload_file(
+                    session,
+                    full_path,
+                    repo_id,
+                    repo_type,
+                    branch,
+                    commit_message,
+                    chunk_size,
+                    retries,
+                    timeout,
+                    os.path.dirname(rel_path),
+                )
+
+        await asyncio.gather(*(upload(rel_path, full_path) for rel_path, full_path in files_to_upload))
@@ -0,0 +1,173 @@
+import hashlib
+import io
+import os
+import posixpath
+import re
+import tarfile
+
+from gitlab.exceptions import GitlabError
+
+from .cache import get_snapshot_path, store_file, temp_path
+from .constants import ARCHIVE_CHUNK_SIZE, LFS_POINTER_MAX_SIZE
+from .events import CACHE_MISS, Transfer, emit, log
+from .integrity import IntegrityError
+from .retry import get_retry_policy
+from .utils import FileMetadata, get_file_url, get_gitlab_client, list_repo_files
+
+
+_LFS_POINTER_PREFIX = b"version https://git-lfs.github.com/spec/v1"
+_LFS_OID = re.compile(rb"^oid sha256:([0-9a-f]{64})$", re.MULTILINE)
+_LFS_SIZE = re.compile(rb"^size (\d+)$", re.MULTILINE)
+
+
+def parse_lfs_pointer(data):
+    """解析 LFS 指针文件，返回 (sha256, 大小)；不是指针时返回 None。"""
+    if len(data) > LFS_POINTER_MAX_SIZE or not data.startswith(_LFS_POINTER_PREFIX):
+        return None
+    oid, size = _LFS_OID.search(data), _LFS_SIZE.search(data)
+    if oid is None or size is None:
+        return None
+    return oid.group(1).decode(), int(size.group(1))
+
+
+def _git_blob_hasher(size):
+    # git 对象 id 为 sha1("blob <大小>\0" + 内容)，与目录树中的 blob id 直接比较
+    return hashlib.sha1(b"blob %d\0" % size)
+
+
+class _ChunkReader(io.RawIOBase):
+    """把响应的分块迭代器包装为 tarfile 流式读取需要的文件对象，同时更新传输进度。"""
+
+    def __init__(self, chunks, transfer):
+        self._chunks = chunks
+        self._transfer = transfer
+        self._chunk = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._chunk:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._chunk = memoryview(chunk)
+            self._transfer.update(len(chunk))
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+
+def _archive_path(file_names):
+    # 只请求包含所有文件的最深目录，按 pattern 只下载某个子目录时可以少传输很多内容
+    return posixpath.commonpath([posixpath.dirname(name) for name in file_names])
+
+
+def _archive_chunks(repo_id, revision, path):
+    project = get_gitlab_client().projects.get(repo_id, lazy=True)
+    # LFS 文件在归档中只保留指针，实际内容仍按范围并发下载
+    return project.repository_archive(
+        sha=revision,
+        format="tar.gz",
+        path=path or None,
+        streamed=True,
+        iterator=True,
+        chunk_size=ARCHIVE_CHUNK_SIZE,
+        include_lfs_blobs="false",
+    )
+
+
+def _store_member(fileobj, size, file_name, cache_path, blob_id):
+    """把归档中的一个文件写入缓存，按 blob id 校验，返回内容的 sha256。"""
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = temp_path(cache_path)
+    sha256 = hashlib.sha256()
+    blob_hasher = _git_blob_hasher(size)
+    with open(tmp_path, "wb") as f:
+        for chunk in iter(lambda: fileobj.read(ARCHIVE_CHUNK_SIZE), b""):
+            f.write(chunk)
+            sha256.update(chunk)
+            blob_hasher.update(chunk)
+    if blob_id is not None and blob_hasher.hexdigest() != blob_id:
+        os.remove(tmp_path)
+        raise IntegrityError(
+            f"Checksum mismatch for {file_name}: expected blob {blob_id}, got {blob_hasher.hexdigest()}"
+        )
+    store_file(tmp_path, cache_path, sha256.hexdigest())
+    return sha256.hexdigest()
+
+
+def _extract_archive(repo_id, branch, revision, path, pending, blob_ids, transfer, extracted, pointers):
+    # 重试时归档从头传输，已经写入缓存的文件直接跳过
+    transfer.reset(0)
+    reader = _ChunkReader(_archive_chunks(repo_id, revision, path), transfer)
+    with tarfile.open(fileobj=reader, mode="r|gz") as archive:
+        for member in archive:
+            # 归档中的路径以 <项目名>-<commit>/ 开头
+            file_name = member.name.partition("/")[2]
+            if not member.isfile() or file_name not in pending or file_name in extracted or file_name in pointers:
+                continue
+            fileobj = archive.extractfile(member)
+            url = get_file_url(repo_id, file_name, branch)
+            if member.size <= LFS_POINTER_MAX_SIZE:
+                data = fileobj.read()
+                pointer = parse_lfs_pointer(data)
+                if pointer is not None:
+                    blob_hasher = _git_blob_hasher(len(data))
+                    blob_hasher.update(data)
+                    if blob_ids.get(file_name) not in (None, blob_hasher.hexdigest()):
+                        raise IntegrityError(f"Checksum mismatch for the LFS pointer of {file_name}")
+                    oid, size = pointer
+                    pointers[file_name] = FileMetadata(
+                        url=url, size=size, etag=oid, accept_ranges=True, last_modified=None
+                    )
+                    continue
+                fileobj = io.BytesIO(data)
+            emit(CACHE_MISS, file=file_name, reason="archive")
+            cache_path = get_snapshot_path(repo_id, branch, file_name)
+            sha256 = _store_member(fileobj, member.size, file_name, cache_path, blob_ids.get(file_name))
+            extracted[file_name] = FileMetadata(
+                url=url, size=member.size, etag=sha256, accept_ranges=True, last_modified=None
+            )
+
+
+def archive_snapshot(repo_id, branch, commit, file_names):
+    """
+    以一个 tar.gz 流下载 file_names 中的普通文件并存入缓存，返回 {文件名: 元数据}。
+
+    每个文件按目录树中的 blob id 校验后才存入缓存，元数据的 ETag 为内容的 sha256，之后的判断直接命中缓存；
+    LFS 指针只解析出 sha256 和大小，实际内容由调用方按元数据下载。
+    归档中没有的文件，以及归档下载失败时还没有写入的文件不在返回值中，由调用方逐个探测元数据。
+    """
+    revision = commit or branch
+    blob_ids = {entry.path: entry.blob_id for entry in list_repo_files(repo_id, branch, commit=commit)}
+    pending = set(file_names)
+    extracted, pointers = {}, {}
+    policy = get_retry_policy()
+    try:
+        with Transfer(f"{repo_id}@{revision[:12]}.tar.gz") as transfer:
+            policy.call(
+                _extract_archive,
+                repo_id,
+                branch,
+                revision,
+                _archive_path(file_names),
+                pending,
+                blob_ids,
+                transfer,
+                extracted,
+                pointers,
+                budget=policy.new_budget(),
+                progress=lambda: len(extracted) + len(pointers),
+                description=f"Archive download of {repo_id}",
+            )
+    except (OSError, tarfile.TarError, GitlabError, IntegrityError) as e:
+        log(f"Failed to download the archive of {repo_id}: {e}", level="warning")
+    remaining = len(pending) - len(extracted) - len(pointers)
+    log(
+        f"Extracted {len(extracted)} files of {repo_id} from the archive, "
+        f"{len(pointers)} LFS files and {remaining} other files to download separately."
+    )
+    extracted.update(pointers)
+    return extracted
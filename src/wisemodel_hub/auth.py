@@ -4,9 +4,8 @@ import json
 import logging
 import os
 
-import requests
-
 from .constants import CACHE_PATH, NOTEBOOK_LOGIN_HTML_END, NOTEBOOK_LOGIN_HTML_START, WM_URL_LOGIN
+from .session import get_session
 
 
 logger = logging.getLogger(__name__)
@@ -17,7 +16,7 @@ def _login_with_url(username, password):
     # 请求获取 token
     payload = {"username": username, "password": password, "way": "normal"}
     headers = {"Content-Type": "application/json"}
-    response = requests.post(WM_URL_LOGIN, data=json.dumps(payload), headers=headers)
+    response = get_session().post(WM_URL_LOGIN, data=json.dumps(payload), headers=headers)
     response_data = response.json()
 
     if response_data["code"] == 0:
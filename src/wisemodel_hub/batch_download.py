@@ -0,0 +1,172 @@
+import json
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import export_file, get_snapshot_dir, get_snapshot_path
+from .cache_manager import enforce_cache_budget
+from .constants import LINK_MODE, MAX_WORKERS
+from .downloader import (
+    _probe_metadatas,
+    _record_snapshot,
+    _resolve_locked_snapshot,
+    _resolve_snapshot,
+    _schedule_snapshot,
+)
+from .events import log
+from .lockfile import read_lockfile
+from .snapshot_scheduler import SnapshotScheduler
+
+
+DownloadResult = namedtuple("DownloadResult", ["repo_id", "revision", "path", "failed"])
+
+_ENTRY_KEYS = {"repo_id", "repo_type", "revision", "branch", "pattern", "local_dir", "lockfile"}
+
+
+def _import_yaml():
+    try:
+        import yaml  # type: ignore
+    except ImportError:
+        raise ImportError("YAML manifests need the `pyyaml` module: `pip install wisemodel_hub[yaml]`.")
+    return yaml
+
+
+def _normalize_entry(entry):
+    if isinstance(entry, str):
+        entry = {"repo_id": entry}
+    elif isinstance(entry, (list, tuple)):
+        entry = dict(zip(("repo_id", "repo_type", "revision", "pattern"), entry))
+    else:
+        entry = dict(entry)
+    unknown = set(entry) - _ENTRY_KEYS
+    if unknown:
+        raise ValueError(f"清单中有未知的字段 {sorted(unknown)}，可用的字段为 {sorted(_ENTRY_KEYS)}")
+    if not entry.get("repo_id"):
+        raise ValueError(f"清单中的条目缺少 repo_id：{entry}")
+    entry["revision"] = entry.pop("branch", None) or entry.get("revision") or "main"
+    entry.setdefault("repo_type", "models")
+    entry.setdefault("pattern", None)
+    entry.setdefault("local_dir", None)
+    entry.setdefault("lockfile", None)
+    return entry
+
+
+def load_manifest(path):
+    """
+    读取下载清单（JSON 或 YAML），返回条目列表。
+
+    清单可以是条目列表，也可以是带 repos 字段的对象；每个条目为仓库ID字符串，
+    或包含 repo_id、repo_type、revision（或 branch）、pattern、local_dir、lockfile 的对象。
+    """
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            manifest = _import_yaml().safe_load(f)
+        else:
+            manifest = json.load(f)
+    if isinstance(manifest, dict):
+        manifest = manifest.get("repos")
+    if not isinstance(manifest, list):
+        raise ValueError(f"清单 {path} 应为条目列表，或包含 repos 列表的对象")
+    return [_normalize_entry(entry) for entry in manifest]
+
+
+def _resolve_entry(entry, force_download, max_workers):
+    repo_id, revision = entry["repo_id"], entry["revision"]
+    if entry["lockfile"]:
+        lock = read_lockfile(entry["lockfile"], repo_id)
+        resolved, metadatas = _resolve_locked_snapshot(repo_id, lock, entry["pattern"], force_download)
+        # 锁定的快照按 commit 存放
+        return lock["commit"], resolved, [metadatas[name] for name in resolved[3]]
+    resolved = _resolve_snapshot(repo_id, entry["repo_type"], revision, entry["pattern"], force_download)
+    return revision, resolved, _probe_metadatas(repo_id, revision, resolved[3], max_workers)
+
+
+def download_many(
+    entries,
+    num_parts=8,
+    force_download=False,
+    max_workers=MAX_WORKERS,
+    link_mode=LINK_MODE,
+    transport=None,
+):
+    """
+    download_many 一次下载多个仓库
+    --------------------------------
+
+    并发确定所有仓库的文件列表和元数据，再把所有文件放入同一个调度器下载，
+    共享连接池、并发预算、限速和缓存；比逐个调用 snapshot_download 少了重复的登录、列目录和线程池开销。
+    同一仓库同一版本的文件出现在多个条目中时只下载一次，完成后再放到各条目的 local_dir 中。
+
+    参数：
+    ::::::::::
+    - **entries** - 条目列表或清单文件路径（见 load_manifest）；每个条目为仓库ID字符串、
+      (repo_id, repo_type, revision, pattern) 元组，或包含 repo_id、repo_type、revision、pattern、local_dir、lockfile 的 dict
+    - **num_parts** - 大文件的下载分块数，默认为8
+    - **force_download** - 是否强制重新下载，默认为False
+    - **max_workers** - 所有仓库共享的并发连接数，默认为32
+    - **link_mode** - 把缓存中的文件放到 local_dir 的方式，默认为'auto'，参见 snapshot_download
+    - **transport** - 传输后端，可选值：'requests'、'http2'，默认为None，参见 snapshot_download
+
+    返回值：
+    ::::::::::
+        list: 与 entries 一一对应的 DownloadResult(repo_id, revision, path, failed)，failed 为下载失败的文件名列表
+    """
+    if isinstance(entries, str):
+        entries = load_manifest(entries)
+    else:
+        entries = [_normalize_entry(entry) for entry in entries]
+    if not entries:
+        return []
+
+    # 各仓库的元数据请求同时进行，每个仓库内部再按文件并发
+    per_repo_workers = max(1, max_workers // len(entries))
+    with ThreadPoolExecutor(max_workers=min(len(entries), max_workers)) as executor:
+        plans = list(executor.map(lambda entry: _resolve_entry(entry, force_download, per_repo_workers), entries))
+
+    scheduler = SnapshotScheduler(max_workers=max_workers, transport=transport)
+    # (repo_id, revision, 文件名) -> 负责下载它的条目；其他条目等下载完成后再导出到自己的 local_dir
+    owners = {}
+    shared = []
+    for index, (entry, (revision, resolved, metadatas)) in enumerate(zip(entries, plans)):
+        repo_id = entry["repo_id"]
+        commit, all_file_names, cached, file_names = resolved
+        pending = [
+            (file_name, metadata)
+            for file_name, metadata in zip(file_names, metadatas)
+            if (repo_id, revision, file_name) not in owners
+        ]
+        shared.extend((index, file_name) for file_name in file_names if (repo_id, revision, file_name) in owners)
+        scheduled = _schedule_snapshot(
+            scheduler,
+            repo_id,
+            revision,
+            (commit, all_file_names, cached, [file_name for file_name, _ in pending]),
+            entry["local_dir"],
+            num_parts,
+            force_download,
+            link_mode,
+            [metadata for _, metadata in pending],
+            key=lambda file_name, index=index: (index, file_name),
+        )
+        owners.update(((repo_id, revision, file_name), index) for file_name in scheduled)
+    failed_keys = set(scheduler.run())
+
+    for index, file_name in shared:
+        entry, revision = entries[index], plans[index][0]
+        owner = owners[(entry["repo_id"], revision, file_name)]
+        if (owner, file_name) in failed_keys:
+            failed_keys.add((index, file_name))
+        else:
+            cache_path = get_snapshot_path(entry["repo_id"], revision, file_name)
+            export_file(cache_path, entry["local_dir"], file_name, link_mode)
+
+    results = []
+    for index, (entry, (revision, resolved, metadatas)) in enumerate(zip(entries, plans)):
+        repo_id = entry["repo_id"]
+        failed = sorted(file_name for failed_index, file_name in failed_keys if failed_index == index)
+        if failed:
+            log(f"Failed to download {len(failed)} files of {repo_id}: {failed}", level="warning")
+        _record_snapshot(repo_id, revision, resolved, metadatas, failed)
+        path = entry["local_dir"] or get_snapshot_dir(repo_id, revision)
+        results.append(DownloadResult(repo_id, revision, path, failed))
+    enforce_cache_budget(keep=[(result.repo_id, result.revision) for result in results])
+    return results
@@ -0,0 +1,204 @@
+import os
+import shutil
+import threading
+from urllib.parse import quote
+
+from .constants import CACHE_PATH, LINK_MODE
+from .integrity import expected_digests
+
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+# 缓存目录结构：
+#
+#   CACHE_PATH/blobs/sha256/<sha256>                      文件内容，按 sha256 寻址，所有仓库共享
+#   CACHE_PATH/blobs/md5/<md5>                            指向 sha256 blob 的别名，用于按服务端 md5 ETag 查找
+#   CACHE_PATH/repos/<owner>--<name>/snapshots/<revision>/<path>   指向 blob 的符号链接
+#
+# 同一仓库的不同分支、不同仓库（如 fork）中相同的文件只保存一份。
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+LINK_MODES = ("reflink", "hardlink", "symlink", "copy")
+
+
+def get_repo_cache_dir(repo_id):
+    return os.path.join(CACHE_PATH, "repos", repo_id.replace("/", "--"))
+
+
+def get_snapshot_dir(repo_id, revision):
+    # 分支名中可能带有 "/"，编码后作为单层目录名
+    return os.path.join(get_repo_cache_dir(repo_id), "snapshots", quote(revision, safe=""))
+
+
+def get_snapshot_path(repo_id, revision, file_name):
+    return os.path.join(get_snapshot_dir(repo_id, revision), file_name)
+
+
+def get_blob_path(digest, algorithm="sha256"):
+    return os.path.join(CACHE_PATH, "blobs", algorithm, digest)
+
+
+def find_blob(digests):
+    """按摘要查找已缓存的 blob，返回 sha256 blob 的路径，找不到返回 None。"""
+    for algorithm, digest in digests.items():
+        path = get_blob_path(digest, algorithm)
+        if os.path.exists(path):
+            return os.path.realpath(path)
+    return None
+
+
+def temp_path(path):
+    """path 同目录下的临时文件路径；同一进程中的多个线程（调度器、download_many、异步接口）各不相同。"""
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def _replace_with_link(target, link_path, fallback_copy=True):
+    # 先在同目录下建好链接，再原子替换，避免中途出现缺失的文件
+    tmp_path = temp_path(link_path)
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.symlink(os.path.relpath(target, os.path.dirname(link_path)), tmp_path)
+    except (OSError, NotImplementedError):
+        # 不支持符号链接（如未开启开发者模式的 Windows）时退回到硬链接，最后才复制
+        try:
+            os.link(target, tmp_path)
+        except OSError:
+            if not fallback_copy:
+                raise
+            shutil.copyfile(target, tmp_path)
+    os.replace(tmp_path, link_path)
+
+
+def commit_blob(tmp_path, sha256, digests=None):
+    """
+    把下载完成的文件移入 blob 存储，返回 blob 路径。
+
+    相同内容的 blob 已存在时直接丢弃新文件。digests 中的其他摘要（如 md5）会建立指向该 blob 的别名。
+    """
+    blob_path = get_blob_path(sha256)
+    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+    if os.path.exists(blob_path):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, blob_path)
+
+    for algorithm, digest in (digests or {}).items():
+        if algorithm == "sha256":
+            continue
+        alias_path = get_blob_path(digest, algorithm)
+        if not os.path.exists(alias_path):
+            os.makedirs(os.path.dirname(alias_path), exist_ok=True)
+            _replace_with_link(blob_path, alias_path, fallback_copy=False)
+    return blob_path
+
+
+def link_snapshot_file(blob_path, snapshot_path):
+    os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+    _replace_with_link(blob_path, snapshot_path)
+    return snapshot_path
+
+
+def store_file(tmp_path, snapshot_path, sha256, digests=None):
+    """把下载完成的临时文件存为 blob，并在快照目录中链接到它。"""
+    blob_path = commit_blob(tmp_path, sha256, digests)
+    return link_snapshot_file(blob_path, snapshot_path)
+
+
+def blob_digest(snapshot_path):
+    """返回快照文件链接到的 blob 的 sha256；不是链接到 blob 存储时返回 None。"""
+    blob_path = os.path.realpath(snapshot_path)
+    if os.path.dirname(blob_path) != os.path.realpath(os.path.join(CACHE_PATH, "blobs", "sha256")):
+        return None
+    return os.path.basename(blob_path)
+
+
+def snapshot_matches(snapshot_path, metadata):
+    """判断快照中的文件是否就是远程文件的当前内容；分支更新后同名文件可能指向旧的 blob。"""
+    digests = expected_digests(metadata)
+    if not digests:
+        return True
+    blob_path = find_blob(digests)
+    if blob_path is None:
+        return False
+    # 退回到复制时快照中是普通文件，无法比较，只能认为一致
+    return os.path.samefile(snapshot_path, blob_path) or not os.path.islink(snapshot_path)
+
+
+def link_cached_blob(snapshot_path, metadata):
+    """
+    如果缓存中已有与远程文件内容相同的 blob（按 ETag 中的 sha256/md5 判断），
+    直接把快照路径链接过去，无需下载。返回是否命中。
+    """
+    blob_path = find_blob(expected_digests(metadata))
+    if blob_path is None:
+        return False
+    if os.path.realpath(snapshot_path) != blob_path:
+        link_snapshot_file(blob_path, snapshot_path)
+    return True
+
+
+def _reflink(src, dst):
+    # 写时复制（btrfs、xfs 等），不占用额外空间，修改 local_dir 中的文件也不会影响缓存
+    if fcntl is None or not hasattr(fcntl, "ioctl"):
+        raise OSError("reflink is not supported on this platform")
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+
+_MATERIALIZERS = {
+    "reflink": _reflink,
+    "hardlink": os.link,
+    "symlink": os.symlink,
+    "copy": shutil.copyfile,
+}
+
+
+def materialize(src, dst, link_mode=LINK_MODE):
+    """
+    把缓存中的文件放到 dst，返回实际使用的方式。
+
+    link_mode 为 "auto" 时依次尝试 reflink、硬链接、符号链接，都不可用时才复制；
+    指定某种方式时从该方式开始尝试，例如 "symlink" 失败时退回到复制。
+    硬链接和符号链接与缓存共享同一份数据，原地修改 dst 会同时修改缓存中的文件。
+    """
+    if link_mode == "auto":
+        modes = LINK_MODES
+    elif link_mode in LINK_MODES:
+        modes = LINK_MODES[LINK_MODES.index(link_mode) :]
+    else:
+        raise ValueError(f"Unknown link_mode {link_mode!r}, expected 'auto' or one of {LINK_MODES}")
+
+    # 快照中的文件本身是符号链接，直接指向 blob，不形成链接链
+    src = os.path.realpath(src)
+    os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return "symlink" if os.path.islink(dst) else "hardlink"
+
+    tmp_path = temp_path(dst)
+    for mode in modes:
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            _MATERIALIZERS[mode](src, tmp_path)
+        except (OSError, NotImplementedError):
+            continue
+        os.replace(tmp_path, dst)
+        return mode
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    raise OSError(f"Failed to materialize {src} to {dst}")
+
+
+def export_file(cache_path, local_dir, file_name, link_mode=LINK_MODE):
+    """把缓存中的文件放到 local_dir 下，返回最终路径；未指定 local_dir 时返回缓存路径。"""
+    if not local_dir:
+        return cache_path
+    local_path = os.path.join(local_dir, file_name)
+    materialize(cache_path, local_path, link_mode)
+    return local_path
@@ -0,0 +1,267 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from .cache import blob_digest, get_snapshot_path
+from .constants import CACHE_PATH
+
+
+IndexedFile = namedtuple("IndexedFile", ["path", "commit_sha", "size", "etag", "sha256", "mtime", "last_access"])
+IndexedRevision = namedtuple("IndexedRevision", ["commit_sha", "file_list", "updated_at"])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS revisions (
+    repo_id TEXT NOT NULL,
+    revision TEXT NOT NULL,
+    commit_sha TEXT,
+    file_list TEXT,
+    updated_at REAL,
+    PRIMARY KEY (repo_id, revision)
+);
+CREATE TABLE IF NOT EXISTS files (
+    repo_id TEXT NOT NULL,
+    revision TEXT NOT NULL,
+    path TEXT NOT NULL,
+    commit_sha TEXT,
+    size INTEGER,
+    etag TEXT,
+    sha256 TEXT,
+    mtime REAL,
+    last_access REAL,
+    PRIMARY KEY (repo_id, revision, path)
+);
+CREATE TABLE IF NOT EXISTS snapshot_usage (
+    repo_id TEXT NOT NULL,
+    revision TEXT NOT NULL,
+    last_access REAL,
+    access_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (repo_id, revision)
+);
+CREATE TABLE IF NOT EXISTS pins (
+    repo_id TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS trees (
+    repo_id TEXT NOT NULL,
+    commit_sha TEXT NOT NULL,
+    entries TEXT NOT NULL,
+    updated_at REAL,
+    PRIMARY KEY (repo_id, commit_sha)
+);
+"""
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index_path():
+    return os.path.join(CACHE_PATH, "index.db")
+
+
+def get_cache_index():
+    """返回当前缓存目录对应的索引，同一进程内共享一个连接。"""
+    path = get_index_path()
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = CacheIndex(path)
+        return _indexes[path]
+
+
+class CacheIndex:
+    """
+    记录缓存中每个仓库、每个分支已下载文件的 SQLite 索引。
+
+    分支当前指向的 commit 与索引中记录的一致时，文件列表和每个文件的大小、校验和都可以直接从索引得到，
+    只需用 os.stat 确认本地文件还在，不必再逐个请求服务端。
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 多个线程共用一个连接，由 lock 串行化；多个进程之间依靠 SQLite 自身的文件锁
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.executescript(_SCHEMA)
+
+    def get_revision(self, repo_id, revision):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT commit_sha, file_list, updated_at FROM revisions WHERE repo_id = ? AND revision = ?",
+                (repo_id, revision),
+            ).fetchone()
+        if row is None:
+            return None
+        commit_sha, file_list, updated_at = row
+        return IndexedRevision(commit_sha, json.loads(file_list) if file_list else None, updated_at)
+
+    def set_revision(self, repo_id, revision, commit_sha, file_list):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO revisions (repo_id, revision, commit_sha, file_list, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (repo_id, revision, commit_sha, json.dumps(file_list), time.time()),
+            )
+            self._drop_unused_trees(repo_id)
+
+    def get_files(self, repo_id, revision):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT path, commit_sha, size, etag, sha256, mtime, last_access FROM files "
+                "WHERE repo_id = ? AND revision = ?",
+                (repo_id, revision),
+            ).fetchall()
+        return {row[0]: IndexedFile(*row) for row in rows}
+
+    def record_files(self, repo_id, revision, entries):
+        """entries 中每一项为 (path, commit_sha, size, etag, sha256, mtime)。"""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO files "
+                "(repo_id, revision, path, commit_sha, size, etag, sha256, mtime, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(repo_id, revision, *entry, now) for entry in entries],
+            )
+
+    def touch_revision(self, repo_id, revision):
+        """记录一次对快照的访问，用于缓存淘汰。"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO snapshot_usage (repo_id, revision, last_access, access_count) VALUES (?, ?, ?, 1) "
+                "ON CONFLICT (repo_id, revision) "
+                "DO UPDATE SET last_access = excluded.last_access, access_count = access_count + 1",
+                (repo_id, revision, time.time()),
+            )
+
+    def get_usage(self):
+        """返回 {(repo_id, revision): (last_access, access_count)}。"""
+        with self.lock:
+            rows = self.conn.execute("SELECT repo_id, revision, last_access, access_count FROM snapshot_usage")
+            return {(repo_id, revision): (last_access, count) for repo_id, revision, last_access, count in rows}
+
+    def remove_revision(self, repo_id, revision):
+        with self.lock, self.conn:
+            for table in ("files", "revisions", "snapshot_usage"):
+                self.conn.execute(f"DELETE FROM {table} WHERE repo_id = ? AND revision = ?", (repo_id, revision))
+            self._drop_unused_trees(repo_id)
+
+    def remove_files(self, repo_id, revision, paths):
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "DELETE FROM files WHERE repo_id = ? AND revision = ? AND path = ?",
+                [(repo_id, revision, path) for path in paths],
+            )
+            self._drop_unused_trees(repo_id)
+
+    def _drop_unused_trees(self, repo_id):
+        # 不再被任何分支或已缓存文件引用的 commit 的文件列表一并删除
+        self.conn.execute(
+            "DELETE FROM trees WHERE repo_id = ? "
+            "AND commit_sha NOT IN (SELECT commit_sha FROM revisions WHERE repo_id = ? AND commit_sha IS NOT NULL) "
+            "AND commit_sha NOT IN (SELECT commit_sha FROM files WHERE repo_id = ? AND commit_sha IS NOT NULL)",
+            (repo_id, repo_id, repo_id),
+        )
+
+    def get_tree(self, repo_id, commit_sha):
+        """返回 commit 的完整文件列表 [(path, blob_id, size), ...]，没有记录时返回 None。"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT entries FROM trees WHERE repo_id = ? AND commit_sha = ?", (repo_id, commit_sha)
+            ).fetchone()
+        return [tuple(entry) for entry in json.loads(row[0])] if row is not None else None
+
+    def set_tree(self, repo_id, commit_sha, entries):
+        # commit 的内容不会变，文件列表可以一直使用
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO trees (repo_id, commit_sha, entries, updated_at) VALUES (?, ?, ?, ?)",
+                (repo_id, commit_sha, json.dumps([list(entry) for entry in entries]), time.time()),
+            )
+
+    def get_pins(self):
+        with self.lock:
+            return {row[0] for row in self.conn.execute("SELECT repo_id FROM pins")}
+
+    def pin(self, repo_id):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO pins (repo_id) VALUES (?)", (repo_id,))
+
+    def unpin(self, repo_id):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM pins WHERE repo_id = ?", (repo_id,))
+
+
+def is_indexed_file_valid(entry, commit_sha, cache_path):
+    """索引记录属于当前 commit，且本地文件的大小和修改时间与记录一致。"""
+    if entry is None or commit_sha is None or entry.commit_sha != commit_sha:
+        return False
+    try:
+        stat = os.stat(cache_path)
+    except OSError:
+        return False
+    return stat.st_size == entry.size and stat.st_mtime == entry.mtime
+
+
+def split_indexed_files(repo_id, revision, commit_sha, file_names):
+    """把文件分为索引中已确认在当前 commit 下缓存完好的，和需要向服务端确认的两部分。"""
+    if commit_sha is None:
+        return [], list(file_names)
+    indexed = get_cache_index().get_files(repo_id, revision)
+    cached, missing = [], []
+    for file_name in file_names:
+        cache_path = get_snapshot_path(repo_id, revision, file_name)
+        if is_indexed_file_valid(indexed.get(file_name), commit_sha, cache_path):
+            cached.append(file_name)
+        else:
+            missing.append(file_name)
+    return cached, missing
+
+
+def split_unchanged_files(repo_id, revision, commit_sha, file_names, blob_ids):
+    """
+    分支指向新的 commit 后，找出内容没有变化的文件：在旧 commit 下缓存完好，且 blob id 与 blob_ids
+    （新 commit 中的 {路径: blob id}）相同。这些文件的索引记录改为新 commit，不必再向服务端确认。
+
+    返回 (unchanged, remaining)。
+    """
+    index = get_cache_index()
+    indexed = index.get_files(repo_id, revision)
+    old_blob_ids = {}
+    unchanged, remaining, entries = [], [], []
+    for file_name in file_names:
+        entry = indexed.get(file_name)
+        old_commit = entry.commit_sha if entry is not None else None
+        if old_commit is not None and old_commit not in old_blob_ids:
+            tree = index.get_tree(repo_id, old_commit) or ()
+            old_blob_ids[old_commit] = {path: blob_id for path, blob_id, _ in tree}
+        old_blob_id = old_blob_ids.get(old_commit, {}).get(file_name)
+        cache_path = get_snapshot_path(repo_id, revision, file_name)
+        if (
+            old_blob_id is not None
+            and old_blob_id == blob_ids.get(file_name)
+            and is_indexed_file_valid(entry, old_commit, cache_path)
+        ):
+            unchanged.append(file_name)
+            entries.append((file_name, commit_sha, entry.size, entry.etag, entry.sha256, entry.mtime))
+        else:
+            remaining.append(file_name)
+    if entries:
+        index.record_files(repo_id, revision, entries)
+    return unchanged, remaining
+
+
+def record_downloaded_files(repo_id, revision, commit_sha, file_names, metadatas, failed=()):
+    """下载结束后把成功的文件写入索引。"""
+    entries = []
+    for file_name, metadata in zip(file_names, metadatas):
+        if file_name in failed:
+            continue
+        cache_path = get_snapshot_path(repo_id, revision, file_name)
+        try:
+            stat = os.stat(cache_path)
+        except OSError:
+            continue
+        entries.append((file_name, commit_sha, stat.st_size, metadata.etag, blob_digest(cache_path), stat.st_mtime))
+    get_cache_index().record_files(repo_id, revision, entries)
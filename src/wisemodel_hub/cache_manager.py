@@ -0,0 +1,244 @@
+import os
+import re
+import shutil
+import time
+from collections import namedtuple
+from urllib.parse import unquote
+
+from .cache_index import get_cache_index
+from .constants import CACHE_MAX_SIZE, CACHE_PATH, GC_MIN_AGE
+from .events import log
+from .utils import format_size, parse_size
+
+
+SnapshotInfo = namedtuple(
+    "SnapshotInfo", ["repo_id", "revision", "path", "num_files", "size", "last_access", "access_count", "inodes"]
+)
+CacheReport = namedtuple("CacheReport", ["snapshots", "total_size", "orphan_blobs", "partial_files"])
+
+# 中断的下载留下的临时文件：.incomplete、.incomplete.json、.partN，以及原子替换时使用的 .<pid>.tmp
+_PARTIAL_PATTERN = re.compile(r"\.(incomplete|incomplete\.json|part\d+)$")
+_TMP_PATTERN = re.compile(r"\.\d+\.tmp$|\.json\.tmp$")
+
+
+def _blobs_dir():
+    return os.path.join(CACHE_PATH, "blobs")
+
+
+def _repos_dir():
+    return os.path.join(CACHE_PATH, "repos")
+
+
+def _scandir(path):
+    try:
+        return list(os.scandir(path))
+    except FileNotFoundError:
+        return []
+
+
+def _is_partial(path, name):
+    # 快照中正常的文件是指向 blob 的链接，未完成的下载才是普通文件
+    return bool(_TMP_PATTERN.search(name)) or (bool(_PARTIAL_PATTERN.search(name)) and not os.path.islink(path))
+
+
+def _scan_blobs(partial_files=None):
+    """返回 {(st_dev, st_ino): (path, size, mtime)}，只调用 stat，不读取文件内容。"""
+    blobs = {}
+    for entry in _scandir(os.path.join(_blobs_dir(), "sha256")):
+        if _TMP_PATTERN.search(entry.name):
+            if partial_files is not None:
+                partial_files.append(entry.path)
+        elif entry.is_file(follow_symlinks=False):
+            stat = entry.stat(follow_symlinks=False)
+            blobs[(stat.st_dev, stat.st_ino)] = (entry.path, stat.st_size, stat.st_mtime)
+    return blobs
+
+
+def _scan_snapshot(path, partial_files):
+    inodes = {}
+    num_files = 0
+    newest = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            file_path = os.path.join(root, name)
+            if _is_partial(file_path, name):
+                partial_files.append(file_path)
+                continue
+            try:
+                # 快照中是指向 blob 的链接，按 blob 的 inode 统计，同一 blob 只计算一次
+                stat = os.stat(file_path)
+                newest = max(newest, os.lstat(file_path).st_mtime)
+            except OSError:
+                # 指向已删除 blob 的失效链接
+                partial_files.append(file_path)
+                continue
+            inodes[(stat.st_dev, stat.st_ino)] = stat.st_size
+            num_files += 1
+    return inodes, num_files, newest
+
+
+def list_snapshot_files(snapshot_dir):
+    """列出快照目录中已下载完成的文件（相对路径），跳过临时文件和失效的链接。"""
+    file_names = []
+    for root, _, files in os.walk(snapshot_dir):
+        for name in files:
+            file_path = os.path.join(root, name)
+            if not _is_partial(file_path, name) and os.path.exists(file_path):
+                file_names.append(os.path.relpath(file_path, snapshot_dir).replace(os.sep, "/"))
+    return sorted(file_names)
+
+
+def scan_cache():
+    """
+    扫描缓存目录，统计每个快照引用的文件、未被引用的 blob 和中断下载留下的临时文件。
+
+    只遍历目录并调用 stat，耗时与缓存中的文件数成正比，与文件大小无关。
+    """
+    usage = get_cache_index().get_usage()
+    partial_files = []
+    snapshots = []
+    for repo_entry in _scandir(_repos_dir()):
+        repo_id = repo_entry.name.replace("--", "/", 1)
+        for revision_entry in _scandir(os.path.join(repo_entry.path, "snapshots")):
+            revision = unquote(revision_entry.name)
+            inodes, num_files, newest = _scan_snapshot(revision_entry.path, partial_files)
+            last_access, access_count = usage.get((repo_id, revision), (None, 0))
+            snapshots.append(
+                SnapshotInfo(
+                    repo_id,
+                    revision,
+                    revision_entry.path,
+                    num_files,
+                    sum(inodes.values()),
+                    last_access or newest,
+                    access_count,
+                    inodes,
+                )
+            )
+
+    blobs = _scan_blobs(partial_files)
+    sizes = {inode: size for inode, (_, size, _) in blobs.items()}
+    referenced = set()
+    for snapshot in snapshots:
+        sizes.update(snapshot.inodes)
+        referenced.update(snapshot.inodes)
+    orphan_blobs = [path for inode, (path, _, _) in blobs.items() if inode not in referenced]
+    return CacheReport(snapshots, sum(sizes.values()), orphan_blobs, partial_files)
+
+
+def _is_old(path, min_age):
+    try:
+        return time.time() - os.lstat(path).st_mtime >= min_age
+    except OSError:
+        return False
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _remove_broken_aliases():
+    # blob 删除后，指向它的 md5 别名也随之失效
+    for entry in _scandir(os.path.join(_blobs_dir(), "md5")):
+        if entry.is_symlink() and not os.path.exists(entry.path):
+            _remove(entry.path)
+
+
+def gc_cache(min_age=GC_MIN_AGE, dry_run=False):
+    """
+    清理中断的下载留下的 .partN、.incomplete 等临时文件、失效的链接和未被任何快照引用的 blob。
+
+    只清理超过 min_age 秒未修改的文件，避免误删正在进行的下载。返回 (被删除的路径列表, 释放的字节数)。
+    """
+    report = scan_cache()
+    removed, freed = [], 0
+    for path in report.partial_files + report.orphan_blobs:
+        if not _is_old(path, min_age):
+            continue
+        freed += os.lstat(path).st_size
+        removed.append(path)
+        if not dry_run:
+            _remove(path)
+    if not dry_run:
+        _remove_broken_aliases()
+    return removed, freed
+
+
+def _eviction_order(snapshot, policy):
+    if policy == "lfu":
+        return (snapshot.access_count, snapshot.last_access)
+    return snapshot.last_access
+
+
+def prune_cache(max_size, policy="lru", keep=(), min_age=GC_MIN_AGE, dry_run=False):
+    """
+    淘汰快照直到缓存总大小不超过 max_size。
+
+    policy 为 "lru" 时先淘汰最久未使用的快照，为 "lfu" 时先淘汰使用次数最少的快照。
+    被 pin 的仓库和 keep 中列出的 (repo_id, revision) 不会被淘汰。只有不再被任何快照引用的 blob 才会被删除。
+    返回 (被淘汰的快照列表, 释放的字节数)。
+    """
+    if policy not in ("lru", "lfu"):
+        raise ValueError(f"Unknown eviction policy {policy!r}, expected 'lru' or 'lfu'")
+    max_size = parse_size(max_size)
+    index = get_cache_index()
+    pins = index.get_pins()
+    report = scan_cache()
+
+    refcount = {}
+    for snapshot in report.snapshots:
+        for inode in snapshot.inodes:
+            refcount[inode] = refcount.get(inode, 0) + 1
+
+    # 没有被引用的 blob 先算作可释放的空间
+    total = report.total_size
+    blobs = _scan_blobs()
+    unreferenced = [inode for inode in blobs if inode not in refcount and _is_old(blobs[inode][0], min_age)]
+    total -= sum(blobs[inode][1] for inode in unreferenced)
+
+    evicted = []
+    for snapshot in sorted(report.snapshots, key=lambda s: _eviction_order(s, policy)):
+        if total <= max_size:
+            break
+        if snapshot.repo_id in pins or (snapshot.repo_id, snapshot.revision) in keep:
+            continue
+        evicted.append(snapshot)
+        for inode, size in snapshot.inodes.items():
+            refcount[inode] -= 1
+            if refcount[inode] == 0:
+                total -= size
+                if inode in blobs:
+                    unreferenced.append(inode)
+
+    freed = report.total_size - total
+    if dry_run:
+        return evicted, freed
+
+    for snapshot in evicted:
+        shutil.rmtree(snapshot.path, ignore_errors=True)
+        index.remove_revision(snapshot.repo_id, snapshot.revision)
+    for inode in unreferenced:
+        _remove(blobs[inode][0])
+    _remove_broken_aliases()
+    return evicted, freed
+
+
+def enforce_cache_budget(keep=()):
+    """设置了 WM_CACHE_MAX_SIZE 时，在下载结束后把缓存淘汰到预算以内。"""
+    if not CACHE_MAX_SIZE:
+        return
+    evicted, freed = prune_cache(CACHE_MAX_SIZE, keep=keep)
+    if evicted:
+        log(f"Evicted {len(evicted)} snapshots from cache, freed {format_size(freed)}.")
+
+
+def pin_repo(repo_id):
+    """固定仓库，淘汰缓存时跳过它的所有快照。"""
+    get_cache_index().pin(repo_id)
+
+
+def unpin_repo(repo_id):
+    get_cache_index().unpin(repo_id)
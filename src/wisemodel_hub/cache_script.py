@@ -0,0 +1,69 @@
+import argparse
+import time
+
+from wisemodel_hub.cache_manager import gc_cache, pin_repo, prune_cache, scan_cache, unpin_repo
+from wisemodel_hub.constants import CACHE_PATH, GC_MIN_AGE
+from wisemodel_hub.utils import format_size
+
+
+def _print_report():
+    report = scan_cache()
+    print(f"缓存目录：{CACHE_PATH}")
+    for snapshot in sorted(report.snapshots, key=lambda s: s.last_access, reverse=True):
+        last_access = time.strftime("%Y-%m-%d %H:%M", time.localtime(snapshot.last_access))
+        print(
+            f"{snapshot.repo_id}@{snapshot.revision}  {snapshot.num_files} 个文件  "
+            f"{format_size(snapshot.size)}  最近使用：{last_access}"
+        )
+    print(f"共 {len(report.snapshots)} 个快照，占用 {format_size(report.total_size)}（相同文件只计算一次）")
+    print(f"未被引用的 blob：{len(report.orphan_blobs)} 个，临时文件：{len(report.partial_files)} 个")
+
+
+def wm_cache():
+    parser = argparse.ArgumentParser(description="管理 wisemodel hub 的本地缓存。")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("scan", help="列出缓存中的快照和占用空间")
+
+    prune_parser = subparsers.add_parser("prune", help="按使用情况淘汰快照，直到缓存不超过指定大小")
+    prune_parser.add_argument("max_size", type=str, help="缓存大小上限，如 200G、512M。必填")
+    prune_parser.add_argument(
+        "--policy", type=str, default="lru", choices=["lru", "lfu"], help="淘汰策略。默认值：lru（最久未使用）"
+    )
+    prune_parser.add_argument("--dry_run", action="store_true", help="只显示将被淘汰的快照，不删除。默认值：False")
+
+    gc_parser = subparsers.add_parser("gc", help="清理中断下载留下的临时文件和未被引用的 blob")
+    gc_parser.add_argument(
+        "--min_age", type=float, default=GC_MIN_AGE / 3600, help="只清理超过该时长（小时）未修改的文件。默认值：24"
+    )
+    gc_parser.add_argument("--dry_run", action="store_true", help="只显示将被清理的文件，不删除。默认值：False")
+
+    pin_parser = subparsers.add_parser("pin", help="固定仓库，淘汰缓存时跳过")
+    pin_parser.add_argument("repo_id", type=str, help="仓库 ID。必填")
+    unpin_parser = subparsers.add_parser("unpin", help="取消固定仓库")
+    unpin_parser.add_argument("repo_id", type=str, help="仓库 ID。必填")
+
+    args = parser.parse_args()
+
+    if args.command == "scan":
+        _print_report()
+    elif args.command == "prune":
+        evicted, freed = prune_cache(args.max_size, policy=args.policy, dry_run=args.dry_run)
+        for snapshot in evicted:
+            print(f"{'将淘汰' if args.dry_run else '已淘汰'} {snapshot.repo_id}@{snapshot.revision}")
+        print(f"释放空间：{format_size(freed)}")
+    elif args.command == "gc":
+        removed, freed = gc_cache(min_age=args.min_age * 3600, dry_run=args.dry_run)
+        for path in removed:
+            print(f"{'将删除' if args.dry_run else '已删除'} {path}")
+        print(f"释放空间：{format_size(freed)}")
+    elif args.command == "pin":
+        pin_repo(args.repo_id)
+        print(f"已固定 {args.repo_id}")
+    elif args.command == "unpin":
+        unpin_repo(args.repo_id)
+        print(f"已取消固定 {args.repo_id}")
+
+
+if __name__ == "__main__":
+    wm_cache()
@@ -18,6 +18,61 @@ HEADERS["Cookie"] = (
 )
 TEN_MB = 10 * 1024 * 1024
 SLEEP_TIME = 5
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 32
+METADATA_CACHE_TTL = 60
+MAX_WORKERS = 32
+STATE_SAVE_INTERVAL = 16 * 1024 * 1024
+MIN_RANGE_SIZE = 4 * 1024 * 1024
+RANGE_TARGET_SECONDS = 2
+HASH_BLOCK_SIZE = 1024 * 1024
+# 归档下载模式每次从响应中读取的字节数
+ARCHIVE_CHUNK_SIZE = 1024 * 1024
+# 不超过该大小、以 LFS 规范开头的文件视为 LFS 指针，实际内容另行下载
+LFS_POINTER_MAX_SIZE = 1024
+# 把缓存中的文件放到 local_dir 的方式："auto"、"reflink"、"hardlink"、"symlink"、"copy"
+LINK_MODE = "auto"
+# 缓存大小上限，如 "200G"，未设置时不限制；超出后按最近最少使用的顺序淘汰快照
+CACHE_MAX_SIZE = os.environ.get("WM_CACHE_MAX_SIZE")
+# 超过这个时间（秒）仍未完成的临时文件和未被引用的 blob 才会被清理，避免误删正在进行的下载
+GC_MIN_AGE = 24 * 3600
+# 离线模式：只使用本地缓存中已记录的快照，不访问网络
+OFFLINE_MODE = os.environ.get("WM_OFFLINE", "").lower() in ("1", "true", "yes", "on")
+# 进程内所有下载/上传共享的限速（每秒字节数，如 "100M"）和同时传输的连接数上限，未设置时不限制
+DOWNLOAD_RATE_LIMIT = os.environ.get("WM_DOWNLOAD_RATE_LIMIT")
+UPLOAD_RATE_LIMIT = os.environ.get("WM_UPLOAD_RATE_LIMIT")
+DOWNLOAD_MAX_CONNECTIONS = int(os.environ.get("WM_DOWNLOAD_MAX_CONNECTIONS", 0)) or None
+UPLOAD_MAX_CONNECTIONS = int(os.environ.get("WM_UPLOAD_MAX_CONNECTIONS", 0)) or None
+RATE_LIMIT_POLL_INTERVAL = 0.01
+# 大文件范围下载和上传分块使用的传输后端："requests"（HTTP/1.1，每个并发请求一个连接）或 "http2"（多路复用，需要 httpx）
+TRANSPORT = os.environ.get("WM_TRANSPORT", "requests")
+# 传输失败时的重试：退避时间从 RETRY_BACKOFF 秒开始按指数增长，不超过 RETRY_MAX_BACKOFF 秒；
+# 单个文件所有范围加起来最多重试 RETRY_BUDGET 次，避免在不可用的链路上无限重试
+RETRY_BACKOFF = 1.0
+RETRY_MAX_BACKOFF = 30.0
+RETRY_BUDGET = 50
+RETRY_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+# 额外的下载镜像，逗号分隔，目录结构与 WM_ENDPOINT 相同；大文件的各个范围会分配到多个端点上下载
+WM_MIRRORS = [mirror.strip() for mirror in os.environ.get("WM_MIRRORS", "").split(",") if mirror.strip()]
+# 重新探测各端点延迟的间隔（秒）、探测超时（秒），以及连续失败后暂停使用某个端点的最长时间（秒）
+MIRROR_PROBE_INTERVAL = 300
+MIRROR_PROBE_TIMEOUT = 5
+MIRROR_MAX_COOLDOWN = 60
+# open_remote 按块读取远程文件：每块的大小、缓存的总大小，以及顺序读取时预读的块数
+REMOTE_BLOCK_SIZE = 1024 * 1024
+REMOTE_CACHE_SIZE = 64 * 1024 * 1024
+REMOTE_READAHEAD = 4
+# 从远程 safetensors 文件中读取部分张量：间隔小于 SAFETENSORS_COALESCE_GAP 的张量合并为一个范围请求，
+# 超过 SAFETENSORS_MAX_RANGE 的范围再切分后并发读取
+SAFETENSORS_COALESCE_GAP = 1024 * 1024
+SAFETENSORS_MAX_RANGE = 64 * 1024 * 1024
+# 按需下载的快照（LazySnapshot）：后台预取的并发文件数，以及创建时就预取的小文件（仓库根目录下匹配的文件）
+LAZY_PREFETCH_WORKERS = 4
+LAZY_PREFETCH_PATTERNS = ["*.json", "*.model", "*.tiktoken", "*.py", "vocab.txt", "merges.txt"]
+# 下载、上传过程的输出方式，逗号分隔："progress"（控制台汇总进度）、"quiet"、"jsonl" 或 "jsonl:<路径>"
+EVENT_SINKS = os.environ.get("WM_EVENTS", "progress")
+# 进度事件和控制台进度行的最短间隔（秒）
+PROGRESS_INTERVAL = 0.5
 
 WM_URL_BASE = "https://www.wisemodel.cn"
 WM_URL_UPLOAD_BASE = "https://uploadfile.wisemodel.cn"
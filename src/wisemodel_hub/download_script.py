@@ -1,13 +1,21 @@
 import argparse
 
-from wisemodel_hub import download_with_git, file_download, lfs_file_download, snapshot_download
+from wisemodel_hub import (
+    download_many,
+    download_with_git,
+    file_download,
+    lfs_file_download,
+    snapshot_download,
+    sync_snapshot,
+)
+from wisemodel_hub.constants import MAX_WORKERS
 
 
 def wm_download():
     parser = argparse.ArgumentParser(
         description="从 wisemodel hub 下载文件或目录。如果提示输入用户名和密码，请输入登录wisemodel.cn的用户名和密码。"
     )
-    parser.add_argument("repo_id", type=str, help="仓库 ID。必填")
+    parser.add_argument("repo_id", type=str, nargs="?", help="仓库 ID。不使用 --manifest 时必填")
     parser.add_argument("--file_name", type=str, default=None, help="要下载的文件名（若下载目录则留空）。", nargs="?")
     parser.add_argument(
         "--repo_type", type=str, default="models", help="仓库类型（models, datasets, codes）。默认值：models"
@@ -17,16 +25,77 @@ def wm_download():
     parser.add_argument(
         "--num_parts", type=int, default=1, help="并行下载线程数。默认值：1。设置值超过1 则使用分块下载"
     )
+    parser.add_argument(
+        "--max_workers",
+        type=int,
+        default=MAX_WORKERS,
+        help=f"下载目录时的全局并发连接数，小文件和大文件分块共享。默认值：{MAX_WORKERS}",
+    )
     parser.add_argument("--force_download", action="store_true", help="强制下载。默认值：False")
+    parser.add_argument(
+        "--link_mode",
+        type=str,
+        default="auto",
+        choices=["auto", "reflink", "hardlink", "symlink", "copy"],
+        help="把缓存中的文件放到 local_dir 的方式。auto 依次尝试 reflink、硬链接、符号链接，最后才复制。默认值：auto",
+    )
+    parser.add_argument(
+        "--offline", action="store_true", help="离线模式，只使用本地缓存中已下载的文件，不访问网络。默认值：False"
+    )
     parser.add_argument("--pattern", type=str, default=None, help="用于过滤文件名的匹配字符串。默认值：None")
+    parser.add_argument(
+        "--sync", action="store_true", help="增量同步目录，只下载上次同步后新增和修改的文件。默认值：False"
+    )
+    parser.add_argument(
+        "--prune", action="store_true", help="增量同步时删除远程已删除的文件，隐含 --sync。默认值：False"
+    )
+    parser.add_argument(
+        "--archive",
+        action="store_true",
+        help="以一个 tar.gz 归档流下载仓库中的普通文件，适合有大量小文件的仓库；LFS 文件仍单独下载。默认值：False",
+    )
+    parser.add_argument(
+        "--lockfile",
+        type=str,
+        default=None,
+        help="按锁文件中记录的 commit 和文件下载或校验目录，忽略 --branch。默认值：None",
+    )
+    parser.add_argument(
+        "--save_lockfile", type=str, default=None, help="下载目录后把 commit 和文件校验和写入该锁文件。默认值：None"
+    )
+    parser.add_argument(
+        "--transport",
+        choices=["requests", "http2"],
+        default=None,
+        help="传输后端，http2 多路复用少数几个连接（需要 httpx）。默认值：环境变量 WM_TRANSPORT 或 requests",
+    )
     parser.add_argument(
         "--use_git", action="store_true", help="使用 git 下载。默认值：False。如果使用git，则必须提供 access_token"
     )
     parser.add_argument("--access_token", help="请到主站->用户中心->Token与Key 页面中查找。")
+    parser.add_argument(
+        "--manifest",
+        type=str,
+        default=None,
+        help="下载清单（JSON 或 YAML），一次下载其中列出的所有仓库，共享连接和并发预算。默认值：None",
+    )
 
     args = parser.parse_args()
+    if args.manifest is None and args.repo_id is None:
+        parser.error("需要指定 repo_id 或 --manifest")
 
-    if args.use_git:
+    if args.manifest:
+        results = download_many(
+            args.manifest,
+            num_parts=args.num_parts,
+            force_download=args.force_download,
+            max_workers=args.max_workers,
+            link_mode=args.link_mode,
+            transport=args.transport,
+        )
+        if any(result.failed for result in results):
+            raise SystemExit(1)
+    elif args.use_git:
         download_with_git(
             access_token=args.access_token,
             repo_id=args.repo_id,
@@ -46,6 +115,9 @@ def wm_download():
                     branch=args.branch,
                     num_parts=args.num_parts,
                     force_download=args.force_download,
+                    link_mode=args.link_mode,
+                    offline=args.offline or None,
+                    transport=args.transport,
                 )
             else:
                 file_download(
@@ -55,7 +127,23 @@ def wm_download():
                     local_dir=args.local_dir,
                     branch=args.branch,
                     force_download=args.force_download,
+                    link_mode=args.link_mode,
+                    offline=args.offline or None,
+                    transport=args.transport,
                 )
+        elif args.sync or args.prune:
+            sync_snapshot(
+                repo_id=args.repo_id,
+                repo_type=args.repo_type,
+                local_dir=args.local_dir,
+                branch=args.branch,
+                pattern=args.pattern,
+                prune=args.prune,
+                num_parts=args.num_parts,
+                max_workers=args.max_workers,
+                link_mode=args.link_mode,
+                transport=args.transport,
+            )
         else:
             snapshot_download(
                 repo_id=args.repo_id,
@@ -65,6 +153,13 @@ def wm_download():
                 pattern=args.pattern,
                 num_parts=args.num_parts,
                 force_download=args.force_download,
+                max_workers=args.max_workers,
+                link_mode=args.link_mode,
+                offline=args.offline or None,
+                lockfile=args.lockfile,
+                save_lockfile=args.save_lockfile,
+                archive=args.archive,
+                transport=args.transport,
             )
 
 
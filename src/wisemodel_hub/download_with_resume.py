@@ -1,73 +1,133 @@
 import os
-import shutil
+import time
 from copy import deepcopy
 
-import requests
-from tqdm import tqdm
-
-from .constants import CACHE_PATH, HEADERS, WM_ENDPOINT
-from .utils import get_remote_file_size_with_url
+from .cache import export_file, get_snapshot_path, link_cached_blob, snapshot_matches, store_file
+from .constants import HEADERS, LINK_MODE
+from .events import CACHE_HIT, CACHE_MISS, Transfer, emit
+from .integrity import IntegrityError, StreamHasher, expected_digests
+from .mirrors import get_mirror_pool
+from .rate_limit import get_limiter
+from .retry import RetryableError, check_range_response, get_retry_policy
+from .transport import get_transport
+from .utils import get_file_metadata, get_file_url
 
 
 class GitFileDownload:
-    def __init__(self, repo_id):
+    def __init__(self, repo_id, transport=None):
         self.repo_id = repo_id
-        self.cache_dir = os.path.join(CACHE_PATH, repo_id.replace("/", "_"))
+        self.sha256 = None
+        self.transport = get_transport(transport)
 
-    def download_file(self, file_name, revision="main", local_dir=None, force_download=False):
-        repo_id = self.repo_id
-        file_url = WM_ENDPOINT + f"/file-proxy/{repo_id}/-/raw/{revision}/{file_name}"
+    def download_file(
+        self, file_name, revision="main", local_dir=None, force_download=False, metadata=None, link_mode=LINK_MODE
+    ):
+        # 元数据中的 URL 可能固定到某个 commit，与缓存所在的 revision 不同
+        file_url = metadata.url if metadata is not None else get_file_url(self.repo_id, file_name, revision)
 
         # Get cache path and incomplete path
-        os.makedirs(self.cache_dir, exist_ok=True)
-        cache_path = os.path.join(self.cache_dir, file_name)
-        if os.path.exists(cache_path) and not force_download:
-            print(f"{file_name} already exists in cache.")
-            return cache_path
+        cache_path = get_snapshot_path(self.repo_id, revision, file_name)
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # 调用方给出元数据时（如快照下载），同名文件还要与远程内容一致，分支更新后它可能是旧版本
+        cached = os.path.exists(cache_path) and (
+            metadata is None
+            or (os.path.getsize(cache_path) == metadata.size and snapshot_matches(cache_path, metadata))
+        )
+        if cached and not force_download:
+            emit(CACHE_HIT, file=file_name, reason="snapshot")
+            return export_file(cache_path, local_dir, file_name, link_mode)
         incomplete_path = cache_path + ".incomplete"
 
-        # Check for incomplete download and get resume size
-        resume_size = 0
-        if os.path.exists(incomplete_path):
-            resume_size = os.path.getsize(incomplete_path)
+        if not force_download:
+            if metadata is None:
+                metadata = get_file_metadata(file_url)
+            # The same content may already be cached for another revision or repository
+            if link_cached_blob(cache_path, metadata):
+                emit(CACHE_HIT, file=file_name, reason="checksum")
+                return export_file(cache_path, local_dir, file_name, link_mode)
 
         # Download with resume support
-        print(f"Downloading from {file_url}")
-        print(f"Cache path: {cache_path}")
-        self._download_with_resume(file_url, cache_path, incomplete_path, resume_size)
-
-        # Copy to local directory or return cached path
-        if local_dir:
-            local_path = os.path.join(local_dir, file_name)
-            os.makedirs(os.path.dirname(local_path), exist_ok=True)
-            shutil.copyfile(cache_path, local_path)
-            return local_path
-        else:
-            return cache_path
-
-    def _download_with_resume(self, url, cache_path, incomplete_path, resume_size):
+        emit(CACHE_MISS, file=file_name, url=file_url)
+        self._download_with_resume(file_url, cache_path, incomplete_path, metadata, file_name)
+
+        # Link into local directory or return cached path
+        return export_file(cache_path, local_dir, file_name, link_mode)
+
+    def _download_with_resume(self, url, cache_path, incomplete_path, metadata=None, file_name=None):
+        if metadata is None:
+            metadata = get_file_metadata(url)
+        # 连接中断时从 .incomplete 当前的大小继续，不重新下载整个文件
+        policy = get_retry_policy()
+        initial = os.path.getsize(incomplete_path) if os.path.exists(incomplete_path) else 0
+        with Transfer(file_name or url, metadata.size, min(initial, metadata.size)) as transfer:
+            hasher = policy.call(
+                self._download_stream,
+                url,
+                incomplete_path,
+                metadata,
+                transfer,
+                budget=policy.new_budget(),
+                progress=lambda: os.path.getsize(incomplete_path) if os.path.exists(incomplete_path) else 0,
+                description=f"Download of {url}",
+            )
+
+            try:
+                hasher.verify(cache_path)
+            except IntegrityError:
+                os.remove(incomplete_path)
+                raise
+        self.sha256 = hasher.hexdigest()
+        store_file(incomplete_path, cache_path, self.sha256, hasher.expected)
+
+    def _download_stream(self, url, incomplete_path, metadata, transfer):
+        total_size = metadata.size
+        resume_size = os.path.getsize(incomplete_path) if os.path.exists(incomplete_path) else 0
+        if resume_size > total_size:
+            resume_size = 0
+        hasher = StreamHasher(expected_digests(metadata))
+        if resume_size and resume_size == total_size:
+            # 上一次已经收到了全部内容
+            hasher.catch_up(incomplete_path, resume_size)
+            return hasher
+
         # headers = {"Range": f"bytes={resume_size}-"} if resume_size else None
         headers = deepcopy(HEADERS)
         if resume_size:
             headers["Range"] = f"bytes={resume_size}-"
 
-        with requests.get(url, stream=True, headers=headers) as r:
-            r.raise_for_status()
-
-            total_size = get_remote_file_size_with_url(url)
-            print(f"file total_size:{total_size}")
-
-            progress_bar = tqdm(total=total_size, unit="iB", unit_scale=True, initial=resume_size)
-
-            # Create incomplete file if it doesn't exist
-            os.makedirs(os.path.dirname(incomplete_path), exist_ok=True)
-            with open(incomplete_path, "ab") as f:
-                for chunk in r.iter_content(chunk_size=1024):
-                    if chunk:
-                        f.write(chunk)
-                        progress_bar.update(len(chunk))
-
-        os.replace(incomplete_path, cache_path)
+        # 单连接下载选择预计最快的端点，失败后重试时会换到其他端点
+        mirrors = get_mirror_pool()
+        endpoint = mirrors.best()
+        started = time.monotonic()
+        limiter = get_limiter("download")
+        with mirrors.use(endpoint), limiter.connection():
+            with self.transport.get(mirrors.url_for(url, endpoint), stream=True, headers=headers) as r:
+                r.raise_for_status()
+
+                if resume_size and r.status_code != 206:
+                    # The server ignored the Range header and sent the whole file
+                    resume_size = 0
+                check_range_response(r.status_code, r.headers, resume_size, total_size, total_size, metadata.etag)
+
+                # Hash the bytes already on disk first, then the rest as it arrives
+                if resume_size:
+                    hasher.catch_up(incomplete_path, resume_size)
+                transfer.reset(resume_size)
+
+                # Create incomplete file if it doesn't exist
+                os.makedirs(os.path.dirname(incomplete_path), exist_ok=True)
+                with open(incomplete_path, "ab" if resume_size else "wb") as f:
+                    for chunk in r.iter_content(chunk_size=1024):
+                        if chunk:
+                            limiter.throttle(len(chunk))
+                            f.write(chunk)
+                            hasher.update(chunk)
+                            transfer.update(len(chunk))
+        if os.path.getsize(incomplete_path) < total_size:
+            mirrors.record_failure(endpoint)
+            raise RetryableError(f"Connection closed before {url} was fully downloaded.")
+        mirrors.record_success(endpoint, total_size - resume_size, time.monotonic() - started)
+        return hasher
 
 
 if __name__ == "__main__":
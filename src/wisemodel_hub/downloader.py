@@ -1,18 +1,292 @@
-from .constants import CACHE_PATH, RETRY_TIMES
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .archive_download import archive_snapshot
+from .cache import export_file, get_snapshot_dir, get_snapshot_path, link_cached_blob
+from .cache_index import get_cache_index, record_downloaded_files, split_indexed_files, split_unchanged_files
+from .cache_manager import enforce_cache_budget, list_snapshot_files
+from .constants import CACHE_PATH, LINK_MODE, MAX_WORKERS, OFFLINE_MODE
 from .download_with_resume import GitFileDownload
+from .events import CACHE_HIT, CACHE_MISS, emit, log
 from .git_downloader import GitDownloader
+from .integrity import IntegrityError
+from .lazy_snapshot import LazySnapshot
+from .lockfile import lock_metadata, matches_lock, read_lockfile, write_lockfile
 from .parallel_download_with_resume import LFSDownload
-from .utils import filter_files_with_fnmatch, get_file_names, is_branch_exist, is_file_downloaded, is_greater_than_10mb
+from .snapshot_scheduler import SnapshotScheduler
+from .utils import (
+    filter_files_with_fnmatch,
+    format_size,
+    get_remote_file_metadata,
+    get_revision_commit,
+    is_branch_exist,
+    is_file_downloaded,
+    is_greater_than_10mb,
+    list_repo_files,
+)
+
+
+SyncReport = namedtuple(
+    "SyncReport",
+    [
+        "path",
+        "commit",
+        "previous_commit",
+        "added",
+        "modified",
+        "deleted",
+        "unchanged",
+        "failed",
+        "bytes_downloaded",
+        "bytes_reused",
+    ],
+)
+
+
+def _resolve_snapshot(repo_id, repo_type, branch, pattern, force_download):
+    """
+    确定要下载的文件，返回 (commit, 仓库全部文件, 索引中已缓存的文件, 需要向服务端确认的文件)。
+    """
+    # 能查到 commit 说明分支存在，查不到时才走登录后查询分支列表的流程
+    commit = get_revision_commit(repo_id, branch)
+    if commit is None and not is_branch_exist(repo_id, repo_type, branch):
+        raise ValueError(f"仓库 {repo_id} 不存在分支 {branch}")
+
+    # commit 没变时文件列表也不会变，不必再遍历仓库目录
+    indexed = get_cache_index().get_revision(repo_id, branch) if commit else None
+    tree = None
+    if indexed is not None and indexed.commit_sha == commit and indexed.file_list is not None:
+        all_file_names = indexed.file_list
+    else:
+        tree = list_repo_files(repo_id, branch, commit=commit)
+        all_file_names = [file.path for file in tree]
+    file_names = filter_files_with_fnmatch(all_file_names, pattern)
+
+    cached = []
+    if not force_download:
+        cached, file_names = split_indexed_files(repo_id, branch, commit, file_names)
+        if file_names and commit is not None:
+            # commit 变化后，blob id 没变的文件内容也没变，同样不必向服务端确认
+            if tree is None:
+                tree = list_repo_files(repo_id, branch, commit=commit)
+            blob_ids = {file.path: file.blob_id for file in tree}
+            unchanged, file_names = split_unchanged_files(repo_id, branch, commit, file_names, blob_ids)
+            cached.extend(unchanged)
+    return commit, all_file_names, cached, file_names
+
+
+def _is_offline(offline):
+    return OFFLINE_MODE if offline is None else offline
+
+
+def _resolve_offline_snapshot(repo_id, branch, pattern):
+    """
+    只根据本地缓存确定快照中的文件：优先使用索引中记录的文件列表，没有记录时使用快照目录中已有的文件。
+    """
+    indexed = get_cache_index().get_revision(repo_id, branch)
+    if indexed is not None and indexed.file_list is not None:
+        file_names = indexed.file_list
+    else:
+        file_names = list_snapshot_files(get_snapshot_dir(repo_id, branch))
+    file_names = filter_files_with_fnmatch(file_names, pattern)
+    if not file_names:
+        raise FileNotFoundError(f"仓库 {repo_id} 的分支 {branch} 不在本地缓存中，无法离线使用")
+
+    missing = [name for name in file_names if not os.path.exists(get_snapshot_path(repo_id, branch, name))]
+    if missing:
+        raise FileNotFoundError(f"仓库 {repo_id} 的分支 {branch} 有 {len(missing)} 个文件不在本地缓存中：{missing}")
+    return file_names
+
+
+def _offline_snapshot(repo_id, branch, pattern, local_dir, link_mode, lazy=False, file_names=None):
+    if file_names is None:
+        file_names = _resolve_offline_snapshot(repo_id, branch, pattern)
+    get_cache_index().touch_revision(repo_id, branch)
+    if lazy:
+        return LazySnapshot(repo_id, branch, cached=file_names, local_dir=local_dir, link_mode=link_mode, offline=True)
+    for file_name in file_names:
+        export_file(get_snapshot_path(repo_id, branch, file_name), local_dir, file_name, link_mode)
+    return local_dir or get_snapshot_dir(repo_id, branch)
+
+
+def _offline_file(repo_id, file_name, branch, local_dir, link_mode):
+    cache_path = get_snapshot_path(repo_id, branch, file_name)
+    if not os.path.exists(cache_path):
+        raise FileNotFoundError(f"文件 {file_name} 不在仓库 {repo_id} 分支 {branch} 的本地缓存中，无法离线使用")
+    return export_file(cache_path, local_dir, file_name, link_mode)
+
+
+def _lazy_snapshot(
+    repo_id, branch, resolved, local_dir, num_parts, force_download, link_mode, metadatas=None, transport=None
+):
+    commit, all_file_names, cached, file_names = resolved
+    index = get_cache_index()
+    if commit is not None:
+        index.set_revision(repo_id, branch, commit, all_file_names)
+    index.touch_revision(repo_id, branch)
+    return LazySnapshot(
+        repo_id,
+        branch,
+        file_names,
+        cached,
+        commit,
+        local_dir=local_dir,
+        num_parts=num_parts,
+        force_download=force_download,
+        link_mode=link_mode,
+        metadatas=metadatas,
+        transport=transport,
+    )
+
+
+def _schedule_snapshot(
+    scheduler, repo_id, branch, resolved, local_dir, num_parts, force_download, link_mode, metadatas, key=None
+):
+    """
+    把 _resolve_snapshot 确定的文件中需要下载的加入 scheduler，本地已有的直接使用。
+
+    metadatas 与 resolved 中需要确认的文件一一对应；key 为调度器中区分文件的键（多个仓库同时下载时文件名可能重复）。
+    返回 {要下载的文件: 大小}。
+    """
+    commit, all_file_names, cached, file_names = resolved
+    for file_name in cached:
+        export_file(get_snapshot_path(repo_id, branch, file_name), local_dir, file_name, link_mode)
+        emit(CACHE_HIT, file=file_name, reason="index")
+    if cached:
+        log(f"{len(cached)} files of {repo_id} are up to date in cache.")
+
+    scheduled = {}
+    for file_name, metadata in zip(file_names, metadatas):
+        cache_path = get_snapshot_path(repo_id, branch, file_name)
+        if is_file_downloaded(repo_id, file_name, branch, metadata=metadata) and not force_download:
+            emit(CACHE_HIT, file=file_name, reason="snapshot")
+            export_file(cache_path, local_dir, file_name, link_mode)
+            continue
+        # 其他分支或仓库已下载过相同内容时，只需建立链接
+        if not force_download and link_cached_blob(cache_path, metadata):
+            emit(CACHE_HIT, file=file_name, reason="checksum")
+            export_file(cache_path, local_dir, file_name, link_mode)
+            continue
+        scheduled[file_name] = metadata.size
+        job_key = key(file_name) if key is not None else None
+        if is_greater_than_10mb(repo_id, file_name, branch, metadata=metadata):
+            # 小文件由 GitFileDownload 记录缓存未命中，大文件的分块由调度器直接执行
+            emit(CACHE_MISS, file=file_name)
+            scheduler.add_lfs_download(
+                LFSDownload(
+                    repo_id,
+                    file_name,
+                    local_dir=local_dir,
+                    revision=branch,
+                    num_parts=num_parts,
+                    force_download=force_download,
+                    metadata=metadata,
+                    link_mode=link_mode,
+                    transport=scheduler.transport,
+                ),
+                key=job_key,
+            )
+        else:
+            scheduler.add_file_download(
+                repo_id,
+                file_name,
+                revision=branch,
+                local_dir=local_dir,
+                force_download=force_download,
+                metadata=metadata,
+                link_mode=link_mode,
+                key=job_key,
+            )
+    return scheduled
+
+
+def _record_snapshot(repo_id, branch, resolved, metadatas, failed):
+    """下载结束后更新索引。"""
+    commit, all_file_names, _, file_names = resolved
+    index = get_cache_index()
+    if commit is not None:
+        record_downloaded_files(repo_id, branch, commit, file_names, metadatas, failed)
+        index.set_revision(repo_id, branch, commit, all_file_names)
+    index.touch_revision(repo_id, branch)
+
+
+def _probe_metadatas(repo_id, branch, file_names, max_workers):
+    # 每个文件只探测一次元数据，后续判断和下载都复用
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(
+            executor.map(lambda name: get_remote_file_metadata(repo_id, name, branch, use_cache=False), file_names)
+        )
+
+
+def _download_snapshot(
+    repo_id,
+    branch,
+    resolved,
+    local_dir,
+    num_parts,
+    force_download,
+    max_workers,
+    link_mode,
+    metadatas=None,
+    archive=False,
+    transport=None,
+):
+    """
+    下载 _resolve_snapshot 确定的文件并更新索引，返回 ({实际下载的文件: 大小}, 下载失败的文件)。
+
+    metadatas 为 {文件名: 元数据} 时（如来自锁文件）直接使用，不再逐个探测。
+    archive 为 True 时先从仓库归档中一次取出普通文件，其余文件再逐个下载。
+    """
+    file_names = resolved[3]
+    if metadatas is not None:
+        metadatas = [metadatas[name] for name in file_names]
+    elif archive and file_names:
+        metadatas = archive_snapshot(repo_id, branch, resolved[0], file_names)
+        missing = [name for name in file_names if name not in metadatas]
+        metadatas.update(zip(missing, _probe_metadatas(repo_id, branch, missing, max_workers)))
+        metadatas = [metadatas[name] for name in file_names]
+        # 归档中的文件刚刚写入缓存；LFS 文件按 sha256 查找缓存，内容相同时不必重新下载
+        force_download = False
+    else:
+        metadatas = _probe_metadatas(repo_id, branch, file_names, max_workers)
+
+    scheduler = SnapshotScheduler(max_workers=max_workers, transport=transport)
+    scheduled = _schedule_snapshot(
+        scheduler, repo_id, branch, resolved, local_dir, num_parts, force_download, link_mode, metadatas
+    )
+    failed = scheduler.run()
+    if failed:
+        log(f"Failed to download {len(failed)} files: {failed}", level="warning")
+    _record_snapshot(repo_id, branch, resolved, metadatas, failed)
+    return {name: size for name, size in scheduled.items() if name not in failed}, failed
 
 
 def snapshot_download(
-    repo_id, repo_type="models", local_dir=None, branch="main", pattern=None, num_parts=8, force_download=False
+    repo_id,
+    repo_type="models",
+    local_dir=None,
+    branch="main",
+    pattern=None,
+    num_parts=8,
+    force_download=False,
+    max_workers=MAX_WORKERS,
+    link_mode=LINK_MODE,
+    offline=None,
+    lazy=False,
+    lockfile=None,
+    save_lockfile=None,
+    archive=False,
+    transport=None,
 ):
     """
     snapshot_download 下载指定仓库的指定版本。
     ------------------------------------------
 
     下载指定仓库的指定版本。如果指定本地文件夹，则下载到本地文件夹；否则，下载到默认缓存目录。
+    分支指向的 commit 没有变化时，直接使用本地缓存索引中的记录，不再逐个文件请求服务端。
 
     参数：
     ::::::::::
@@ -23,45 +297,270 @@ def snapshot_download(
     - **pattern**: fnmatch格式的匹配字符串，用于过滤文件名，默认为None，即不过滤
     - **num_parts**: 下载分块数，默认为8
     - **force_download**: 是否强制下载，如果本地已存在，则重新下载，默认为False
+    - **max_workers**: 全局并发连接数，小文件和大文件分块共享，默认为32
+    - **link_mode**: 指定 local_dir 时，把缓存中的文件放到 local_dir 的方式，可选值：'auto'、'reflink'、'hardlink'、'symlink'、'copy'，
+      默认为'auto'，即依次尝试 reflink、硬链接、符号链接，都不支持时才复制
+    - **offline**: 是否离线使用，为 True 时只从本地缓存中已下载的快照查找文件，不访问网络；
+      默认为None，即由环境变量 WM_OFFLINE 决定
+    - **lazy**: 是否按需下载，为 True 时只确定文件列表，不下载文件，返回 LazySnapshot；
+      每个文件在第一次访问时才下载，并在后台预取配置文件和同组的其他分片。默认为False，即立即下载全部文件
+    - **lockfile**: 锁文件路径，指定时下载或校验锁文件中记录的 commit 和文件，忽略 branch；
+      不查询分支、不列目录，也不探测文件元数据，快照按 commit 存放在缓存中。默认为None
+    - **save_lockfile**: 下载完成后把 commit 和每个文件的大小、sha256 写入该路径的锁文件，供之后的 lockfile 参数使用；
+      lazy=True 或离线时不支持。默认为None
+    - **archive**: 是否以归档方式下载，为 True 时通过一个 tar.gz 流取得所有普通文件，适合有大量小文件的仓库；
+      LFS 文件仍按范围并发下载。lazy=True 时不适用。默认为False
+    - **transport**: 传输后端，可选值：'requests'、'http2'（多路复用少数几个连接，需要 httpx）；
+      默认为None，即由 configure_transport 或环境变量 WM_TRANSPORT 决定
+
+    返回值：
+    ::::::::::
+        str: 快照所在的目录，指定 local_dir 时为 local_dir；lazy=True 时为 LazySnapshot
     """
-    if not is_branch_exist(repo_id, repo_type, branch):
-        raise ValueError(f"仓库 {repo_id} 不存在分支 {branch}")
+    if lockfile is not None:
+        lock = read_lockfile(lockfile, repo_id)
+        return _locked_snapshot(
+            repo_id,
+            lock,
+            local_dir,
+            pattern,
+            num_parts,
+            force_download,
+            max_workers,
+            link_mode,
+            offline,
+            lazy,
+            transport,
+        )
+    if save_lockfile is not None and (lazy or _is_offline(offline)):
+        raise ValueError("save_lockfile 需要联网下载全部文件，不能与 lazy=True 或离线模式同时使用")
+    if _is_offline(offline):
+        return _offline_snapshot(repo_id, branch, pattern, local_dir, link_mode, lazy)
 
-    file_names = get_file_names(repo_id, revision=branch)
-    file_names = filter_files_with_fnmatch(file_names, pattern)
-    for file_name in file_names:
-        try_times = 0
-        while try_times < RETRY_TIMES + 1:
-            if is_file_downloaded(repo_id, file_name, branch) and not force_download:
-                print(f"{file_name} already exists in cache.")
-                break
-            try:
-                try_times += 1
-                print(f"Downloading {file_name}...")
-                if is_greater_than_10mb(repo_id, file_name, branch):
-                    lfs_file_download(
-                        repo_id,
-                        file_name,
-                        local_dir=local_dir,
-                        branch=branch,
-                        num_parts=num_parts,
-                        force_download=force_download,
-                    )
-                else:
-                    file_download(
-                        repo_id, file_name, local_dir=local_dir, branch=branch, force_download=force_download
-                    )
-                break
-            except Exception as e:
-                print(f"Failed to download {file_name}: {e}")
-                if try_times < RETRY_TIMES + 1:
-                    print(f"Retrying {try_times}...")
-                else:
-                    print(f"Failed to download {file_name} after {try_times-1} retries.")
+    try:
+        resolved = _resolve_snapshot(repo_id, repo_type, branch, pattern, force_download)
+    except requests.exceptions.ConnectionError as e:
+        # 网络不可用时，如果本地已有完整的快照，直接使用
+        log(f"Failed to connect to the server: {e}", level="warning")
+        log(f"Trying the cached snapshot of {repo_id}@{branch}.")
+        return _offline_snapshot(repo_id, branch, pattern, local_dir, link_mode, lazy)
+    if lazy:
+        return _lazy_snapshot(
+            repo_id, branch, resolved, local_dir, num_parts, force_download, link_mode, transport=transport
+        )
+    _download_snapshot(
+        repo_id,
+        branch,
+        resolved,
+        local_dir,
+        num_parts,
+        force_download,
+        max_workers,
+        link_mode,
+        archive=archive,
+        transport=transport,
+    )
+    if save_lockfile is not None:
+        commit, all_file_names = resolved[0], resolved[1]
+        file_names = filter_files_with_fnmatch(all_file_names, pattern)
+        indexed = get_cache_index().get_files(repo_id, branch)
+        write_lockfile(save_lockfile, repo_id, repo_type, branch, commit, file_names, indexed)
+    enforce_cache_budget(keep=[(repo_id, branch)])
+    return local_dir or get_snapshot_dir(repo_id, branch)
+
+
+def _resolve_locked_snapshot(repo_id, lock, pattern, force_download):
+    """与 _resolve_snapshot 相同，但文件列表和元数据 {文件名: 元数据} 都取自锁文件，不访问网络。"""
+    commit = lock["commit"]
+    entries = {entry["path"]: entry for entry in lock["files"]}
+    file_names = filter_files_with_fnmatch(list(entries), pattern)
+    cached = []
+    if not force_download:
+        cached, file_names = split_indexed_files(repo_id, commit, commit, file_names)
+        # 索引中记录的内容与锁文件不一致时，按锁文件重新下载
+        indexed = get_cache_index().get_files(repo_id, commit)
+        stale = [name for name in cached if not _indexed_matches_lock(indexed[name], entries[name])]
+        cached = [name for name in cached if name not in stale]
+        file_names.extend(stale)
+    metadatas = {name: lock_metadata(repo_id, commit, entries[name]) for name in file_names}
+    return (commit, list(entries), cached, file_names), metadatas
+
+
+def _indexed_matches_lock(indexed, entry):
+    return indexed.size == entry["size"] and (not entry.get("sha256") or indexed.sha256 == entry["sha256"])
+
+
+def _offline_locked_snapshot(repo_id, lock, pattern, local_dir, link_mode, lazy):
+    """离线使用锁文件：文件列表取自锁文件，缓存中的每个文件都要与锁文件记录的大小和 sha256 一致。"""
+    commit = lock["commit"]
+    entries = {entry["path"]: entry for entry in lock["files"]}
+    file_names = filter_files_with_fnmatch(list(entries), pattern)
+    missing = [name for name in file_names if not os.path.exists(get_snapshot_path(repo_id, commit, name))]
+    if missing:
+        raise FileNotFoundError(f"仓库 {repo_id} 的 commit {commit} 有 {len(missing)} 个文件不在本地缓存中：{missing}")
+    mismatched = [
+        name for name in file_names if not matches_lock(get_snapshot_path(repo_id, commit, name), entries[name])
+    ]
+    if mismatched:
+        raise IntegrityError(
+            f"仓库 {repo_id} 的 commit {commit} 有 {len(mismatched)} 个文件与锁文件不一致：{mismatched}"
+        )
+    return _offline_snapshot(repo_id, commit, pattern, local_dir, link_mode, lazy, file_names)
+
+
+def _locked_snapshot(
+    repo_id, lock, local_dir, pattern, num_parts, force_download, max_workers, link_mode, offline, lazy, transport=None
+):
+    """
+    按锁文件下载或校验快照。快照按 commit 存放，内容不会再变化；不查询分支、不列目录，
+    也不探测文件元数据，大小和 sha256 都取自锁文件。
+    """
+    commit = lock["commit"]
+    if _is_offline(offline):
+        return _offline_locked_snapshot(repo_id, lock, pattern, local_dir, link_mode, lazy)
+
+    resolved, metadatas = _resolve_locked_snapshot(repo_id, lock, pattern, force_download)
+    if lazy:
+        return _lazy_snapshot(
+            repo_id, commit, resolved, local_dir, num_parts, force_download, link_mode, metadatas, transport
+        )
+    _download_snapshot(
+        repo_id,
+        commit,
+        resolved,
+        local_dir,
+        num_parts,
+        force_download,
+        max_workers,
+        link_mode,
+        metadatas,
+        transport=transport,
+    )
+    enforce_cache_budget(keep=[(repo_id, commit)])
+    return local_dir or get_snapshot_dir(repo_id, commit)
+
+
+def _prune_files(repo_id, branch, file_names, local_dir):
+    # 删除快照目录（和 local_dir）中远程已删除的文件，以及因此变空的目录；blob 由 gc_cache 清理
+    roots = [get_snapshot_dir(repo_id, branch)] + ([local_dir] if local_dir else [])
+    for root in roots:
+        for file_name in file_names:
+            path = os.path.join(root, file_name)
+            if os.path.lexists(path):
+                os.remove(path)
+            directory = os.path.dirname(path)
+            while directory != root and os.path.isdir(directory) and not os.listdir(directory):
+                os.rmdir(directory)
+                directory = os.path.dirname(directory)
+    get_cache_index().remove_files(repo_id, branch, file_names)
+
+
+def sync_snapshot(
+    repo_id,
+    repo_type="models",
+    local_dir=None,
+    branch="main",
+    pattern=None,
+    prune=False,
+    num_parts=8,
+    max_workers=MAX_WORKERS,
+    link_mode=LINK_MODE,
+    transport=None,
+):
+    """
+    sync_snapshot 把本地快照增量更新到分支的最新版本
+    ------------------------------------------------
+
+    比较分支当前 commit 与本地上次记录的 commit 的文件列表（blob id），只下载新增和修改的文件，
+    内容没有变化的文件不再向服务端确认；可选删除远程已删除的文件。适合定期刷新模型的任务。
+
+    参数：
+    ::::::::::
+    - **repo_id**: 仓库ID
+    - **repo_type**: 仓库类型，可选值：'models'、'datasets'、'codes'
+    - **local_dir**: 本地文件夹路径，默认为None，即下载到默认缓存目录
+    - **branch**: 分支名，默认为"main"
+    - **pattern**: fnmatch格式的匹配字符串，只同步匹配的文件，默认为None，即不过滤
+    - **prune**: 是否删除远程已删除的文件，默认为False
+    - **num_parts**: 下载分块数，默认为8
+    - **max_workers**: 全局并发连接数，默认为32
+    - **link_mode**: 把缓存中的文件放到 local_dir 的方式，默认为'auto'，参见 snapshot_download
+    - **transport**: 传输后端，默认为None，参见 snapshot_download
+
+    返回值：
+    ::::::::::
+        SyncReport: path（快照目录）、commit、previous_commit（上次同步的 commit）、
+        added、modified、deleted、unchanged（文件名列表）、failed（下载失败的文件）、
+        bytes_downloaded（实际下载的字节数）、bytes_reused（直接使用本地缓存、节省下载的字节数）
+    """
+    index = get_cache_index()
+    previous = index.get_revision(repo_id, branch)
+    previous_commit = previous.commit_sha if previous is not None else None
+    previous_names = set(filter_files_with_fnmatch(previous.file_list or [], pattern)) if previous else set()
+    # 下载结束后旧 commit 的文件列表可能已被清理，先取出来
+    previous_tree = index.get_tree(repo_id, previous_commit) if previous_commit else None
+    previous_blob_ids = {path: blob_id for path, blob_id, _ in previous_tree or ()}
+
+    resolved = _resolve_snapshot(repo_id, repo_type, branch, pattern, False)
+    commit, all_file_names = resolved[0], resolved[1]
+    transferred, failed = _download_snapshot(
+        repo_id, branch, resolved, local_dir, num_parts, False, max_workers, link_mode, transport=transport
+    )
+
+    blob_ids = {file.path: file.blob_id for file in list_repo_files(repo_id, branch, commit=commit)}
+    names = filter_files_with_fnmatch(all_file_names, pattern)
+    added = [name for name in names if name not in previous_names]
+
+    def is_modified(name):
+        old_blob_id, blob_id = previous_blob_ids.get(name), blob_ids.get(name)
+        if old_blob_id is None or blob_id is None:
+            # 没有记录旧 commit 的 blob id 时，以是否重新下载为准
+            return name in transferred
+        return old_blob_id != blob_id
+
+    modified = [name for name in names if name in previous_names and is_modified(name)]
+    changed = set(added) | set(modified)
+    unchanged = [name for name in names if name not in changed]
+    deleted = sorted(previous_names - set(names))
+    if prune and deleted:
+        _prune_files(repo_id, branch, deleted, local_dir)
+
+    indexed = index.get_files(repo_id, branch)
+    bytes_reused = sum(
+        indexed[name].size for name in names if name in indexed and name not in transferred and name not in failed
+    )
+    report = SyncReport(
+        path=local_dir or get_snapshot_dir(repo_id, branch),
+        commit=commit,
+        previous_commit=previous_commit,
+        added=added,
+        modified=modified,
+        deleted=deleted,
+        unchanged=unchanged,
+        failed=list(failed),
+        bytes_downloaded=sum(transferred.values()),
+        bytes_reused=bytes_reused,
+    )
+    log(
+        f"Synced {repo_id}@{branch}: {len(added)} added, {len(modified)} modified, "
+        f"{len(deleted)} deleted{' (pruned)' if prune else ''}, {len(unchanged)} unchanged; "
+        f"downloaded {format_size(report.bytes_downloaded)}, reused {format_size(bytes_reused)} from cache."
+    )
+    enforce_cache_budget(keep=[(repo_id, branch)])
+    return report
 
 
 def lfs_file_download(
-    repo_id, file_name, repo_type="models", local_dir=None, branch="main", num_parts=8, force_download=False
+    repo_id,
+    file_name,
+    repo_type="models",
+    local_dir=None,
+    branch="main",
+    num_parts=8,
+    force_download=False,
+    link_mode=LINK_MODE,
+    offline=None,
+    transport=None,
 ):
     """
     lfs_file_download 下载大文件
@@ -78,17 +577,43 @@ def lfs_file_download(
     - **revision**: 版本号，默认为"main"
     - **num_parts:** 下载分块数，默认为8
     - **force_download**: 是否强制下载，如果本地已存在，则重新下载，默认为False
+    - **link_mode**: 把缓存中的文件放到 local_dir 的方式，默认为'auto'，参见 snapshot_download
+    - **offline**: 是否离线使用，默认为None，即由环境变量 WM_OFFLINE 决定，参见 snapshot_download
+    - **transport**: 传输后端，'http2' 时各分块多路复用少数几个连接，默认为None，参见 snapshot_download
+
+    返回值：
+    ::::::::::
+        str: 文件的本地路径
     """
+    if _is_offline(offline):
+        return _offline_file(repo_id, file_name, branch, local_dir, link_mode)
     if not is_branch_exist(repo_id, repo_type, branch):
         raise ValueError(f"仓库 {repo_id} 不存在分支 {branch}")
 
     downloader = LFSDownload(
-        repo_id, file_name, local_dir=local_dir, revision=branch, num_parts=num_parts, force_download=force_download
+        repo_id,
+        file_name,
+        local_dir=local_dir,
+        revision=branch,
+        num_parts=num_parts,
+        force_download=force_download,
+        link_mode=link_mode,
+        transport=transport,
     )
-    downloader.download()
+    return downloader.download()
 
 
-def file_download(repo_id, file_name, repo_type="models", local_dir=None, branch="main", force_download=False):
+def file_download(
+    repo_id,
+    file_name,
+    repo_type="models",
+    local_dir=None,
+    branch="main",
+    force_download=False,
+    link_mode=LINK_MODE,
+    offline=None,
+    transport=None,
+):
     """
     file_download 下载单个文件
     ----------------------------
@@ -103,11 +628,22 @@ def file_download(repo_id, file_name, repo_type="models", local_dir=None, branch
     - **local_dir** - 本地文件夹路径，默认为None，即下载到默认缓存目录
     - **revision** - 版本号，默认为"main"
     - **force_download** - 是否强制下载，如果本地已存在，则重新下载，默认为False
+    - **link_mode** - 把缓存中的文件放到 local_dir 的方式，默认为'auto'，参见 snapshot_download
+    - **offline** - 是否离线使用，默认为None，即由环境变量 WM_OFFLINE 决定，参见 snapshot_download
+    - **transport** - 传输后端，默认为None，参见 snapshot_download
+
+    返回值：
+    ::::::::::
+        str: 文件的本地路径
     """
+    if _is_offline(offline):
+        return _offline_file(repo_id, file_name, branch, local_dir, link_mode)
     if not is_branch_exist(repo_id, repo_type, branch):
         raise ValueError(f"仓库 {repo_id} 不存在分支 {branch}")
-    downloader = GitFileDownload(repo_id)
-    downloader.download_file(file_name, revision=branch, local_dir=local_dir, force_download=force_download)
+    downloader = GitFileDownload(repo_id, transport)
+    return downloader.download_file(
+        file_name, revision=branch, local_dir=local_dir, force_download=force_download, link_mode=link_mode
+    )
 
 
 def download_with_git(access_token, repo_id, repo_type="models", pattern=None, local_dir=None, branch="main"):
@@ -0,0 +1,387 @@
+import itertools
+import json
+import logging
+import sys
+import threading
+import time
+
+from .constants import EVENT_SINKS, PROGRESS_INTERVAL
+from .utils import format_size
+
+
+logger = logging.getLogger(__name__)
+
+# 事件类型；每个事件是一个 dict，"event" 为类型，"time" 为 time.time()，其余字段见各处的 emit 调用
+FILE_STARTED = "file_started"
+FILE_PROGRESS = "file_progress"
+FILE_COMPLETED = "file_completed"
+FILE_FAILED = "file_failed"
+RANGE_COMPLETED = "range_completed"
+RETRY = "retry"
+CACHE_HIT = "cache_hit"
+CACHE_MISS = "cache_miss"
+MESSAGE = "message"
+
+# 只在替换整个元组时加锁，emit 读取时不加锁；没有 sink 时 emit 立即返回
+_sinks = ()
+_sinks_lock = threading.Lock()
+
+# 每次传输的编号，同名文件（如多个仓库或分支中的 config.json）同时传输时用于区分
+_transfer_ids = itertools.count(1)
+
+
+def emit(event, **fields):
+    sinks = _sinks
+    if not sinks:
+        return
+    record = {"event": event, "time": time.time()}
+    record.update(fields)
+    for sink in sinks:
+        try:
+            sink(record)
+        except Exception:
+            # 事件处理出错不能影响传输本身
+            pass
+
+
+def log(message, level="info"):
+    """
+    输出一条文字消息；level 为 "debug" 的消息只写入 JSON 日志，不显示在控制台。
+
+    "warning" 和 "error" 的消息同时写入 logging，WM_EVENTS=quiet 时也不会丢失；控制台上由 logging 输出。
+    """
+    emit(MESSAGE, level=level, message=message)
+    if level in ("warning", "error"):
+        logger.log(logging.WARNING if level == "warning" else logging.ERROR, message)
+
+
+class Transfer:
+    """
+    一个文件的传输进度，替代原来的 tqdm 进度条（接口同样是 update/close）。
+
+    update 只累加字节数，每 PROGRESS_INTERVAL 秒最多发出一次 file_progress 事件，
+    因此多个线程按小块频繁调用时开销很小。
+    """
+
+    def __init__(self, name, total=None, initial=0, direction="download"):
+        self.name = name
+        self.total = total
+        self.direction = direction
+        self.position = initial
+        self.transferred = 0
+        self.started = time.monotonic()
+        self.closed = False
+        self._reported_at = self.started
+        self._lock = threading.Lock()
+        self.id = next(_transfer_ids)
+        emit(FILE_STARTED, file=name, transfer=self.id, direction=direction, total=total, initial=initial)
+
+    def update(self, size):
+        with self._lock:
+            self.position += size
+            self.transferred += size
+            now = time.monotonic()
+            if now - self._reported_at < PROGRESS_INTERVAL:
+                return
+            self._reported_at = now
+            position = self.position
+        emit(
+            FILE_PROGRESS, file=self.name, transfer=self.id, direction=self.direction, bytes=position, total=self.total
+        )
+
+    def reset(self, position):
+        """服务端忽略了续传请求、从头发送时，把进度退回到 position。"""
+        with self._lock:
+            self.position = position
+
+    def close(self, error=None):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+        elapsed = time.monotonic() - self.started
+        if error is not None:
+            emit(FILE_FAILED, file=self.name, transfer=self.id, direction=self.direction, error=str(error))
+            return
+        emit(
+            FILE_COMPLETED,
+            file=self.name,
+            transfer=self.id,
+            direction=self.direction,
+            bytes=self.position,
+            transferred=self.transferred,
+            elapsed=elapsed,
+            throughput=self.transferred / elapsed if elapsed > 0 else None,
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(exc)
+
+
+class JSONLinesSink:
+    """把每个事件写为一行 JSON，用于日志采集或导入监控系统。file 为路径或文件对象，默认为标准错误输出。"""
+
+    def __init__(self, file=None):
+        self._own = isinstance(file, str)
+        self.file = open(file, "a", encoding="utf-8") if self._own else (file or sys.stderr)
+        self.lock = threading.Lock()
+
+    def __call__(self, event):
+        line = json.dumps(event, ensure_ascii=False, default=str)
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    def close(self):
+        if self._own:
+            self.file.close()
+
+
+class ProgressSink:
+    """
+    控制台输出：所有正在进行的传输汇总为一行进度（文件数、字节数、速度），每 PROGRESS_INTERVAL 秒最多刷新一次；
+    消息、重试和失败单独占一行。输出不是终端时，每 10 个刷新周期输出一行进度。
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stderr
+        self.interactive = hasattr(self.stream, "isatty") and self.stream.isatty()
+        self.lock = threading.Lock()
+        self._line_width = 0
+        self._reset()
+
+    def _reset(self):
+        # {传输编号: [已传输字节数, 总字节数]}
+        self.active = {}
+        self.started = 0
+        self.completed = 0
+        self.failed = 0
+        self.cached = 0
+        self.done_bytes = 0
+        self.total_bytes = 0
+        self.speed = None
+        self._last_bytes = 0
+        self._rendered_at = time.monotonic()
+
+    def __call__(self, event):
+        kind = event["event"]
+        with self.lock:
+            if kind == MESSAGE:
+                # 警告和错误已经由 logging 输出
+                if event.get("level") not in ("debug", "warning", "error"):
+                    self._write_line(event["message"])
+            elif kind == RETRY:
+                self._write_line(
+                    f"{event['description']} failed: {event['error']}. "
+                    f"Retrying in {event['delay']:.1f}s ({event['attempt']}/{event['max_retries']})..."
+                )
+            elif kind == CACHE_HIT:
+                self.cached += 1
+            elif kind == FILE_STARTED:
+                self.started += 1
+                total = event.get("total") or 0
+                initial = event.get("initial") or 0
+                self.active[event["transfer"]] = [initial, total]
+                self.total_bytes += total
+                self.done_bytes += initial
+                self._last_bytes += initial
+            elif kind == FILE_PROGRESS:
+                self._advance(event, event["bytes"])
+            elif kind == FILE_COMPLETED:
+                self._advance(event, event["bytes"])
+                self.active.pop(event["transfer"], None)
+                self.completed += 1
+            elif kind == FILE_FAILED:
+                if self.active.pop(event["transfer"], None) is not None:
+                    self.failed += 1
+                self._write_line(f"Failed to transfer {event['file']}: {event['error']}")
+            else:
+                return
+            finished = kind in (FILE_COMPLETED, FILE_FAILED) and not self.active
+            self._render(force=finished)
+            if finished:
+                # 一批传输全部结束，下一批重新计数
+                self._reset()
+
+    def _advance(self, event, position):
+        entry = self.active.get(event["transfer"])
+        if entry is not None:
+            self.done_bytes += position - entry[0]
+            entry[0] = position
+
+    def _status(self):
+        status = f"{self.completed}/{self.started} files"
+        status += f", {format_size(self.done_bytes)}/{format_size(self.total_bytes)}"
+        if self.speed:
+            status += f", {format_size(int(self.speed))}/s"
+        if self.cached:
+            status += f", {self.cached} cached"
+        if self.failed:
+            status += f", {self.failed} failed"
+        return status
+
+    def _render(self, force=False):
+        now = time.monotonic()
+        elapsed = now - self._rendered_at
+        interval = PROGRESS_INTERVAL if self.interactive else PROGRESS_INTERVAL * 10
+        if not force and elapsed < interval:
+            return
+        if elapsed > 0:
+            speed = (self.done_bytes - self._last_bytes) / elapsed
+            self.speed = speed if self.speed is None else 0.7 * self.speed + 0.3 * speed
+        self._last_bytes = self.done_bytes
+        self._rendered_at = now
+        status = self._status()
+        if self.interactive:
+            self.stream.write("\r" + status.ljust(self._line_width))
+            self._line_width = len(status)
+            if not self.active:
+                self.stream.write("\n")
+                self._line_width = 0
+        else:
+            self.stream.write(status + "\n")
+        self.stream.flush()
+
+    def _write_line(self, text):
+        if self._line_width:
+            # 先清除当前的进度行
+            self.stream.write("\r" + " " * self._line_width + "\r")
+            self._line_width = 0
+        self.stream.write(f"{text}\n")
+        self.stream.flush()
+
+
+class MetricsSink:
+    """
+    累计传输指标，供监控系统定期读取（snapshot）。
+
+    包括上传/下载的字节数、完成和失败的文件数、重试次数、缓存命中/未命中次数，
+    以及范围请求的首字节时间（TTFB）和速度的累计值。
+    """
+
+    _COUNTERS = (
+        "bytes_downloaded",
+        "bytes_uploaded",
+        "files_completed",
+        "files_failed",
+        "ranges_completed",
+        "retries",
+        "cache_hits",
+        "cache_misses",
+        "ttfb_total",
+        "range_seconds_total",
+        "range_bytes_total",
+    )
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = dict.fromkeys(self._COUNTERS, 0)
+
+    def __call__(self, event):
+        kind = event["event"]
+        with self.lock:
+            counters = self.counters
+            if kind == FILE_COMPLETED:
+                counters["files_completed"] += 1
+                key = "bytes_uploaded" if event["direction"] == "upload" else "bytes_downloaded"
+                counters[key] += event["transferred"]
+            elif kind == FILE_FAILED:
+                counters["files_failed"] += 1
+            elif kind == RANGE_COMPLETED:
+                counters["ranges_completed"] += 1
+                counters["ttfb_total"] += event.get("ttfb") or 0
+                counters["range_seconds_total"] += event["elapsed"]
+                counters["range_bytes_total"] += event["bytes"]
+            elif kind == RETRY:
+                counters["retries"] += 1
+            elif kind == CACHE_HIT:
+                counters["cache_hits"] += 1
+            elif kind == CACHE_MISS:
+                counters["cache_misses"] += 1
+
+    def snapshot(self):
+        """返回当前各项指标的副本，另外给出范围请求的平均 TTFB（秒）和平均速度（字节/秒）。"""
+        with self.lock:
+            snapshot = dict(self.counters)
+        ranges = snapshot["ranges_completed"]
+        snapshot["ttfb_avg"] = snapshot["ttfb_total"] / ranges if ranges else None
+        seconds = snapshot["range_seconds_total"]
+        snapshot["range_throughput_avg"] = snapshot["range_bytes_total"] / seconds if seconds else None
+        return snapshot
+
+
+def _make_sink(spec):
+    if callable(spec):
+        return spec
+    if spec == "progress":
+        return ProgressSink()
+    if spec == "jsonl":
+        return JSONLinesSink()
+    if spec.startswith("jsonl:"):
+        return JSONLinesSink(spec[len("jsonl:") :])
+    raise ValueError(f"Invalid event sink {spec!r}, expected 'quiet', 'progress', 'jsonl' or 'jsonl:<path>'")
+
+
+def _parse_sinks(sinks):
+    if isinstance(sinks, str):
+        sinks = [spec.strip() for spec in sinks.split(",") if spec.strip()]
+    return tuple(_make_sink(spec) for spec in sinks if spec != "quiet")
+
+
+def configure_events(sinks="progress"):
+    """
+    configure_events 设置下载、上传过程的输出方式
+    ----------------------------------------------
+
+    下载和上传过程产生结构化的事件（文件开始/完成/失败、进度、范围请求的字节数、首字节时间和速度、重试、
+    缓存命中/未命中、文字消息），依次交给各个 sink 处理。也可以通过环境变量 WM_EVENTS（逗号分隔）设置。
+
+    参数：
+    ::::::::::
+    - **sinks** - sink 列表或逗号分隔的字符串，每一项可以是：
+      'progress'（控制台汇总进度，默认）、'quiet'（不输出）、'jsonl'（JSON 行输出到标准错误）、
+      'jsonl:<路径>'（JSON 行追加写入文件），或接受一个事件 dict 的可调用对象（如 MetricsSink()）
+    """
+    global _sinks
+    sinks = _parse_sinks(sinks)
+    with _sinks_lock:
+        _sinks = sinks
+
+
+def add_event_sink(sink):
+    """
+    add_event_sink 增加一个事件处理函数
+    ------------------------------------
+
+    在现有输出方式之外增加一个 sink，如把 MetricsSink 接入监控系统。
+
+    参数：
+    ::::::::::
+    - **sink** - 接受一个事件 dict 的可调用对象，会在传输线程中调用，应当尽快返回
+
+    返回值：
+    ::::::::::
+        sink 本身，便于之后 remove_event_sink
+    """
+    global _sinks
+    with _sinks_lock:
+        _sinks = _sinks + (sink,)
+    return sink
+
+
+def remove_event_sink(sink):
+    """移除 add_event_sink 增加的 sink。"""
+    global _sinks
+    with _sinks_lock:
+        _sinks = tuple(s for s in _sinks if s is not sink)
+
+
+try:
+    configure_events(EVENT_SINKS)
+except (ValueError, OSError) as e:
+    # 环境变量写错不应导致 import wisemodel_hub 失败
+    logger.warning(f"Invalid WM_EVENTS={EVENT_SINKS!r}: {e}. Falling back to 'progress'.")
+    configure_events("progress")
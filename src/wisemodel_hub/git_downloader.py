@@ -1,10 +1,13 @@
 import os
 import subprocess
 
-import gitlab
-
-from .constants import WM_GITLAB_ENDPOINT
-from .utils import ensure_git_lfs_installed, filter_files_with_fnmatch, is_git_repository, is_sparse_checkout
+from .utils import (
+    ensure_git_lfs_installed,
+    filter_files_with_fnmatch,
+    is_git_repository,
+    is_sparse_checkout,
+    list_repo_tree,
+)
 
 
 class GitDownloader:
@@ -90,16 +93,4 @@ class GitDownloader:
         print(f"Files matching pattern {pattern} downloaded successfully from {repo_id} to {local_dir}.")
 
     def get_all_files(self, repo_id, path="", revision="main"):
-        gl = gitlab.Gitlab(WM_GITLAB_ENDPOINT, private_token=self.access_token)
-        project = gl.projects.get(repo_id)
-        files = []
-
-        # 遍历文件树
-        items = project.repository_tree(path=path, ref=revision, all=True)
-        for item in items:
-            if item["type"] == "tree":  # 如果是目录，递归获取子目录内容
-                files.extend(self.get_all_files(repo_id, path=item["path"], revision=revision))
-            elif item["type"] == "blob":  # 如果是文件，添加到文件列表
-                files.append(item["path"])
-
-        return files
+        return [file.path for file in list_repo_tree(repo_id, revision, path=path, private_token=self.access_token)]
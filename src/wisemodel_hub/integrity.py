@@ -0,0 +1,91 @@
+import hashlib
+import re
+import threading
+
+from .constants import HASH_BLOCK_SIZE
+
+
+_HEX_PATTERN = re.compile(r"^[0-9a-f]+$")
+
+
+class IntegrityError(ValueError):
+    """下载内容的校验和与服务端给出的不一致。"""
+
+
+def expected_digests(metadata):
+    """
+    从文件元数据中取出可用于校验的摘要。
+
+    LFS 文件的 ETag 通常是 sha256 oid（64位十六进制），普通文件可能是 md5（32位十六进制）；
+    其他格式（如分片上传生成的 ETag）无法用于校验，忽略。
+    """
+    digests = {}
+    if metadata is None:
+        return digests
+    etag = (metadata.etag or "").lower()
+    if _HEX_PATTERN.match(etag):
+        if len(etag) == 64:
+            digests["sha256"] = etag
+        elif len(etag) == 32:
+            digests["md5"] = etag
+    return digests
+
+
+class StreamHasher:
+    """
+    在下载过程中按文件顺序增量计算校验和。
+
+    按顺序到达的数据直接在内存中计算；并发范围下载时，排在前面的范围尚未完成，
+    后面范围的数据先写入磁盘，等前面连续部分完成后再从磁盘补算（此时多半还在页缓存中）。
+    始终计算 sha256，供缓存按内容寻址使用。
+    """
+
+    def __init__(self, expected=None):
+        self.expected = expected or {}
+        self.hashers = {"sha256": hashlib.sha256()}
+        for name in self.expected:
+            self.hashers.setdefault(name, hashlib.new(name))
+        self.position = 0
+        self.lock = threading.Lock()
+
+    def _update(self, data):
+        for hasher in self.hashers.values():
+            hasher.update(data)
+        self.position += len(data)
+
+    def update(self, data):
+        with self.lock:
+            self._update(data)
+
+    def feed(self, offset, data):
+        """数据正好接在已计算部分之后时才计算，否则留给 catch_up 从磁盘补算。"""
+        with self.lock:
+            if offset != self.position:
+                return False
+            self._update(data)
+            return True
+
+    def catch_up(self, path, frontier):
+        """从磁盘补算到 frontier（已连续写入的字节数）为止。"""
+        if self.position >= frontier:
+            return
+        with open(path, "rb") as f:
+            while True:
+                # 每次只在锁内读一块，不长时间阻塞按顺序到达的数据
+                with self.lock:
+                    if self.position >= frontier:
+                        return
+                    f.seek(self.position)
+                    data = f.read(min(HASH_BLOCK_SIZE, frontier - self.position))
+                    if not data:
+                        return
+                    self._update(data)
+
+    def hexdigest(self, name="sha256"):
+        return self.hashers[name].hexdigest()
+
+    def verify(self, file_name):
+        for name, expected in self.expected.items():
+            actual = self.hexdigest(name)
+            if actual != expected:
+                raise IntegrityError(f"Checksum mismatch for {file_name}: expected {name} {expected}, got {actual}")
@@ -0,0 +1,267 @@
+import fnmatch
+import json
+import os
+import posixpath
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .cache import export_file, get_snapshot_dir, get_snapshot_path, link_cached_blob
+from .cache_index import record_downloaded_files
+from .cache_manager import enforce_cache_budget
+from .constants import LAZY_PREFETCH_PATTERNS, LAZY_PREFETCH_WORKERS, LINK_MODE
+from .download_with_resume import GitFileDownload
+from .events import log
+from .parallel_download_with_resume import LFSDownload
+from .transport import get_transport
+from .utils import get_remote_file_metadata, is_file_downloaded, is_greater_than_10mb
+
+
+_SHARD_SUFFIX = re.compile(r"^(.*)-(\d+)-of-(\d+)((?:\.[^.]+)*)$")
+
+
+def _shard_group(file_name):
+    """
+    分片所属的组：(目录, 前缀, 分片总数, 扩展名)，不是分片时返回 None。
+
+    只看文件名末尾的 -<编号>-of-<总数>，model.fp16-00001-of-00002.safetensors 和 model.fp32-00001-of-00002.safetensors、
+    checkpoint-100/model.safetensors 和 checkpoint-200/model.safetensors 都不属于同一组。
+    """
+    directory, base = posixpath.split(file_name)
+    match = _SHARD_SUFFIX.match(base)
+    if match is None:
+        return None
+    prefix, _, total, extension = match.groups()
+    return directory, prefix, int(total), extension
+
+
+class LazySnapshot(os.PathLike):
+    """
+    按需下载的仓库快照，由 snapshot_download(lazy=True) 返回。
+
+    创建时只确定文件列表，每个文件在第一次访问（fetch、open 或 snapshot / "文件名"）时才下载，
+    并在后台预取接下来可能用到的文件：根目录下的配置文件、与刚访问的文件同组的其他分片，
+    以及 *.index.json 中列出的分片。只用到仓库一部分文件（如只加载一种精度的权重）时，不会下载其余文件。
+
+    os.fspath(snapshot) 是快照所在的目录，其中只有已经下载的文件。
+    """
+
+    def __init__(
+        self,
+        repo_id,
+        branch="main",
+        file_names=(),
+        cached=(),
+        commit=None,
+        local_dir=None,
+        num_parts=8,
+        force_download=False,
+        link_mode=LINK_MODE,
+        offline=False,
+        prefetch=True,
+        prefetch_workers=LAZY_PREFETCH_WORKERS,
+        metadatas=None,
+        transport=None,
+    ):
+        self.repo_id = repo_id
+        self.branch = branch
+        self.files = sorted(set(file_names) | set(cached))
+        self.commit = commit
+        self.local_dir = local_dir
+        self.num_parts = num_parts
+        self.force_download = force_download
+        self.link_mode = link_mode
+        self.offline = offline
+        self.prefetch_enabled = prefetch
+        self.metadatas = metadatas or {}
+        self.transport = get_transport(transport)
+        self._file_set = set(self.files)
+        self._cached = set(cached)
+        self._futures = {}
+        self._accessed = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=prefetch_workers) if prefetch else None
+        if prefetch:
+            self.prefetch(
+                name
+                for name in self.files
+                if "/" not in name and any(fnmatch.fnmatch(name, pattern) for pattern in LAZY_PREFETCH_PATTERNS)
+            )
+
+    @property
+    def path(self):
+        return self.local_dir or get_snapshot_dir(self.repo_id, self.branch)
+
+    def __fspath__(self):
+        return self.path
+
+    def __str__(self):
+        return self.path
+
+    def __repr__(self):
+        return f"LazySnapshot({self.repo_id!r}, branch={self.branch!r}, path={self.path!r})"
+
+    def __iter__(self):
+        return iter(self.files)
+
+    def __len__(self):
+        return len(self.files)
+
+    def __contains__(self, file_name):
+        return file_name in self._file_set
+
+    def __truediv__(self, file_name):
+        """snapshot / "config.json" 下载该文件并返回本地路径；目录则下载其中所有文件后返回目录路径。"""
+        file_name = str(file_name).strip("/")
+        if file_name in self._file_set:
+            return self.fetch(file_name)
+        prefix = file_name + "/"
+        names = [name for name in self.files if name.startswith(prefix)]
+        if not names:
+            raise FileNotFoundError(f"仓库 {self.repo_id} 分支 {self.branch} 中没有 {file_name}")
+        self.fetch_all(names)
+        return os.path.join(self.path, file_name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def is_fetched(self, file_name):
+        future = self._futures.get(file_name)
+        return future is not None and future.done() and future.exception() is None
+
+    def fetch(self, file_name):
+        """下载单个文件（已下载或正在后台预取时直接复用），返回本地路径。"""
+        if file_name not in self._file_set:
+            raise FileNotFoundError(f"仓库 {self.repo_id} 分支 {self.branch} 中没有文件 {file_name}")
+        with self._lock:
+            future = self._futures.get(file_name)
+            owner = future is None
+            if owner:
+                future = self._futures[file_name] = Future()
+        if owner:
+            try:
+                future.set_result(self._download(file_name))
+            except BaseException as e:
+                # 失败的文件不保留结果，下次访问时重新下载
+                with self._lock:
+                    self._futures.pop(file_name, None)
+                future.set_exception(e)
+                raise
+        path = future.result()
+        # 第一次访问（而不是后台预取）一个文件时，才预取与它相关的文件
+        with self._lock:
+            first_access = file_name not in self._accessed
+            self._accessed.add(file_name)
+        if first_access:
+            self.prefetch(self._related_files(file_name, path))
+        return path
+
+    def open(self, file_name, mode="rb", **kwargs):
+        """下载文件后以只读方式打开。"""
+        if any(flag in mode for flag in "wax+"):
+            raise ValueError(f"LazySnapshot files are read-only, got mode {mode!r}")
+        return open(self.fetch(file_name), mode, **kwargs)
+
+    def fetch_all(self, file_names=None):
+        """并发下载 file_names（默认为全部文件），返回快照目录。"""
+        file_names = self.files if file_names is None else list(file_names)
+        self.prefetch(file_names)
+        for file_name in file_names:
+            self.fetch(file_name)
+        return self.path
+
+    def prefetch(self, file_names):
+        """在后台下载 file_names 中还没有开始下载的文件。"""
+        if self._executor is None:
+            return
+        with self._lock:
+            for file_name in file_names:
+                if file_name in self._file_set and file_name not in self._futures:
+                    self._futures[file_name] = self._executor.submit(self._prefetch_one, file_name)
+
+    def close(self):
+        """取消还没有开始的预取，等待正在进行的下载结束。"""
+        if self._executor is not None:
+            with self._lock:
+                for file_name, future in list(self._futures.items()):
+                    if future.cancel():
+                        del self._futures[file_name]
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if not self.offline:
+            enforce_cache_budget(keep=[(self.repo_id, self.branch)])
+
+    def _prefetch_one(self, file_name):
+        try:
+            return self._download(file_name)
+        except Exception as e:
+            log(f"Failed to prefetch {file_name}: {e}", level="warning")
+            with self._lock:
+                self._futures.pop(file_name, None)
+            raise
+
+    def _related_files(self, file_name, path):
+        """刚访问 file_name 之后可能用到的文件。"""
+        related = []
+        if file_name.endswith(".index.json"):
+            # 分片索引：预取其中列出的分片
+            try:
+                with open(path, encoding="utf-8") as f:
+                    weight_map = json.load(f).get("weight_map", {})
+            except (OSError, ValueError, AttributeError):
+                weight_map = {}
+            directory = posixpath.dirname(file_name)
+            related.extend(posixpath.join(directory, shard) for shard in sorted(set(weight_map.values())))
+        else:
+            # 同一目录下前缀和总数相同的其他分片，如 model-00002-of-00004.safetensors
+            group = _shard_group(file_name)
+            if group is not None:
+                related.extend(name for name in self.files if _shard_group(name) == group)
+        return [name for name in related if name != file_name]
+
+    def _download(self, file_name):
+        cache_path = get_snapshot_path(self.repo_id, self.branch, file_name)
+        if file_name in self._cached and not self.force_download:
+            return export_file(cache_path, self.local_dir, file_name, self.link_mode)
+        if self.offline:
+            raise FileNotFoundError(
+                f"文件 {file_name} 不在仓库 {self.repo_id} 分支 {self.branch} 的本地缓存中，无法离线使用"
+            )
+
+        # 锁文件给出的元数据直接使用，下载时按其中的 sha256 校验
+        metadata = self.metadatas.get(file_name)
+        if metadata is None:
+            # 分支可能在创建快照之后又有新的提交；已知 commit 时按 commit 探测和下载，记录到索引的内容才属于该 commit
+            metadata = get_remote_file_metadata(self.repo_id, file_name, self.commit or self.branch, use_cache=False)
+        if not self.force_download and (
+            is_file_downloaded(self.repo_id, file_name, self.branch, metadata=metadata)
+            or link_cached_blob(cache_path, metadata)
+        ):
+            path = export_file(cache_path, self.local_dir, file_name, self.link_mode)
+        elif is_greater_than_10mb(self.repo_id, file_name, self.branch, metadata=metadata):
+            path = LFSDownload(
+                self.repo_id,
+                file_name,
+                local_dir=self.local_dir,
+                revision=self.branch,
+                num_parts=self.num_parts,
+                force_download=self.force_download,
+                metadata=metadata,
+                link_mode=self.link_mode,
+                transport=self.transport,
+            ).download()
+        else:
+            path = GitFileDownload(self.repo_id, self.transport).download_file(
+                file_name,
+                revision=self.branch,
+                local_dir=self.local_dir,
+                force_download=self.force_download,
+                metadata=metadata,
+                link_mode=self.link_mode,
+            )
+        if self.commit is not None:
+            record_downloaded_files(self.repo_id, self.branch, self.commit, [file_name], [metadata])
+        return path
@@ -0,0 +1,95 @@
+import json
+import os
+
+from .cache import blob_digest, temp_path
+from .integrity import StreamHasher
+from .utils import FileMetadata, get_file_url
+
+
+# 锁文件格式的版本，格式不兼容地变化时递增
+LOCKFILE_VERSION = 1
+
+
+def write_lockfile(path, repo_id, repo_type, revision, commit, file_names, indexed):
+    """
+    把快照写为锁文件：commit 和每个文件的大小、sha256、ETag。
+
+    indexed 为索引中该快照的文件记录（CacheIndex.get_files 的结果），每个文件都必须已在 commit 下下载完成。
+    """
+    if commit is None:
+        raise ValueError(f"无法确定仓库 {repo_id} 分支 {revision} 的 commit，不能生成锁文件")
+    missing = [name for name in file_names if name not in indexed or indexed[name].commit_sha != commit]
+    if missing:
+        raise ValueError(f"仓库 {repo_id} 有 {len(missing)} 个文件没有下载完成，不能生成锁文件：{missing}")
+
+    lock = {
+        "version": LOCKFILE_VERSION,
+        "repo_id": repo_id,
+        "repo_type": repo_type,
+        "revision": revision,
+        "commit": commit,
+        "files": [
+            {
+                "path": name,
+                "size": indexed[name].size,
+                "sha256": indexed[name].sha256,
+                "etag": indexed[name].etag,
+            }
+            for name in sorted(file_names)
+        ],
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = temp_path(path)
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(lock, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    os.replace(tmp_path, path)
+    return lock
+
+
+def read_lockfile(path, repo_id=None):
+    """读取并检查锁文件；指定 repo_id 时还要求与锁文件中的仓库一致。"""
+    with open(path, encoding="utf-8") as f:
+        lock = json.load(f)
+    if lock.get("version") != LOCKFILE_VERSION:
+        raise ValueError(f"不支持的锁文件版本 {lock.get('version')!r}：{path}")
+    if not lock.get("commit") or not isinstance(lock.get("files"), list):
+        raise ValueError(f"锁文件缺少 commit 或文件列表：{path}")
+    if repo_id is not None and lock.get("repo_id") != repo_id:
+        raise ValueError(f"锁文件 {path} 属于仓库 {lock.get('repo_id')}，不是 {repo_id}")
+    return lock
+
+
+def lock_metadata(repo_id, commit, entry):
+    """
+    由锁文件中的记录构造文件元数据，不必再请求服务端。
+
+    记录中有 sha256 时把它作为 ETag，下载时按 sha256 校验内容；URL 中使用 commit，内容不会随分支变化。
+    """
+    return FileMetadata(
+        url=get_file_url(repo_id, entry["path"], commit),
+        size=entry["size"],
+        etag=entry.get("sha256") or entry.get("etag"),
+        accept_ranges=True,
+        last_modified=None,
+    )
+
+
+def matches_lock(cache_path, entry):
+    """
+    缓存中的文件与锁文件记录的大小和 sha256 是否一致。
+
+    快照文件链接到 blob 时直接比较 blob 的 sha256，退回到复制时才重新计算。
+    """
+    size = os.path.getsize(cache_path)
+    if size != entry["size"]:
+        return False
+    sha256 = entry.get("sha256")
+    if not sha256:
+        return True
+    digest = blob_digest(cache_path)
+    if digest is None:
+        hasher = StreamHasher()
+        hasher.catch_up(cache_path, size)
+        digest = hasher.hexdigest()
+    return digest == sha256
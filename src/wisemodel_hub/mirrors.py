@@ -0,0 +1,189 @@
+import contextlib
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .constants import (
+    HEADERS,
+    MIN_RANGE_SIZE,
+    MIRROR_MAX_COOLDOWN,
+    MIRROR_PROBE_INTERVAL,
+    MIRROR_PROBE_TIMEOUT,
+    WM_ENDPOINT,
+    WM_MIRRORS,
+)
+from .retry import ContentChangedError, RetryableError, http_status
+from .session import get_session
+
+
+class MirrorError(RetryableError):
+    """镜像端点拒绝了请求（如缺少该文件），换一个端点重试。"""
+
+
+class EndpointStats:
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        # 往返延迟（秒）和单个连接的下载速度（字节/秒），均为指数滑动平均
+        self.latency = None
+        self.throughput = None
+        self.failures = 0
+        # 连续失败后，在此时间之前不再选用该端点
+        self.retry_at = 0
+
+
+def _smooth(old, new):
+    return new if old is None else 0.7 * old + 0.3 * new
+
+
+class MirrorPool:
+    """
+    下载端点（主站和镜像）的健康度记录。
+
+    每个端点记录延迟、单连接速度和连续失败次数。大文件的每个范围都重新选择端点，
+    预计完成一个范围越快的端点被选中的概率越大，连续失败的端点会暂停使用一段时间；
+    配合范围调度中的任务切分，慢的端点分到的数据会越来越少，不会拖慢整个文件。
+    """
+
+    def __init__(self, endpoints):
+        self.endpoints = [endpoint.rstrip("/") for endpoint in endpoints]
+        self.stats = {endpoint: EndpointStats(endpoint) for endpoint in self.endpoints}
+        self.lock = threading.Lock()
+        self.probed_at = None
+
+    @property
+    def primary(self):
+        return self.endpoints[0]
+
+    def url_for(self, url, endpoint):
+        """把主站的文件 URL 换成 endpoint 上的同一路径。"""
+        if endpoint == self.primary or not url.startswith(self.primary):
+            return url
+        return endpoint + url[len(self.primary) :]
+
+    def probe(self, url, force=False):
+        """并发向每个端点发送 HEAD 请求，记录往返时间；请求失败的端点暂停使用。"""
+        if len(self.endpoints) < 2:
+            return
+        with self.lock:
+            if not force and self.probed_at is not None and time.monotonic() - self.probed_at < MIRROR_PROBE_INTERVAL:
+                return
+            self.probed_at = time.monotonic()
+
+        def head(endpoint):
+            started = time.monotonic()
+            try:
+                res = get_session().head(
+                    self.url_for(url, endpoint), headers=HEADERS, allow_redirects=True, timeout=MIRROR_PROBE_TIMEOUT
+                )
+                res.close()
+                res.raise_for_status()
+            except requests.exceptions.RequestException:
+                self.record_failure(endpoint)
+                return
+            self.record_latency(endpoint, time.monotonic() - started)
+
+        with ThreadPoolExecutor(max_workers=len(self.endpoints)) as executor:
+            list(executor.map(head, self.endpoints))
+
+    def record_latency(self, endpoint, latency):
+        with self.lock:
+            stats = self.stats[endpoint]
+            stats.latency = _smooth(stats.latency, latency)
+
+    def record_success(self, endpoint, num_bytes, elapsed):
+        with self.lock:
+            stats = self.stats[endpoint]
+            stats.failures = 0
+            stats.retry_at = 0
+            if num_bytes > 0 and elapsed > 0:
+                stats.throughput = _smooth(stats.throughput, num_bytes / elapsed)
+
+    def record_failure(self, endpoint):
+        with self.lock:
+            stats = self.stats[endpoint]
+            stats.failures += 1
+            stats.retry_at = time.monotonic() + min(MIRROR_MAX_COOLDOWN, 2**stats.failures)
+
+    def _expected_times(self):
+        # 预计下载一个最小范围所需的时间；还没测过速度的端点按已知最快的速度估计，保证它会被尝试
+        now = time.monotonic()
+        healthy = [stats for stats in self.stats.values() if stats.retry_at <= now]
+        if not healthy:
+            # 所有端点都在暂停期，选最早恢复的
+            return {min(self.stats.values(), key=lambda stats: stats.retry_at).endpoint: 1}
+        known = [stats.throughput for stats in healthy if stats.throughput]
+        fastest = max(known) if known else None
+        # 没测过延迟的端点按已知最慢的延迟估计，不会因为没有数据而排在前面
+        slowest = max((stats.latency for stats in healthy if stats.latency is not None), default=0)
+        times = {}
+        for stats in healthy:
+            throughput = stats.throughput or fastest
+            transfer = MIN_RANGE_SIZE / throughput if throughput else 0
+            latency = slowest if stats.latency is None else stats.latency
+            # 暂停期已过、但还没有成功过的端点按连续失败次数降低优先级
+            times[stats.endpoint] = max(latency + transfer, 1e-3) * (1 + stats.failures)
+        return times
+
+    def choose(self):
+        """为一个范围选择端点，选中的概率与预计速度成正比。"""
+        if len(self.endpoints) == 1:
+            return self.primary
+        with self.lock:
+            times = self._expected_times()
+        endpoints = list(times)
+        return random.choices(endpoints, [1 / times[endpoint] for endpoint in endpoints])[0]
+
+    def best(self):
+        """为单连接下载选择预计最快的端点，情况相同时优先主站。"""
+        if len(self.endpoints) == 1:
+            return self.primary
+        with self.lock:
+            times = self._expected_times()
+        return min(times, key=lambda endpoint: (times[endpoint], self.endpoints.index(endpoint)))
+
+    @contextlib.contextmanager
+    def use(self, endpoint):
+        """
+        请求 endpoint 期间出错时记为一次失败。镜像返回的 HTTP 错误或旧版本的内容改为可重试，下次换一个端点；
+        主站返回的旧版本内容说明远程文件已经更新，不再重试。
+        """
+        try:
+            yield
+        except Exception as e:
+            self.record_failure(endpoint)
+            if endpoint != self.primary and (http_status(e) is not None or isinstance(e, ContentChangedError)):
+                raise MirrorError(f"Mirror {endpoint} failed: {e}") from e
+            raise
+
+
+_mirror_pool = None
+_mirror_pool_lock = threading.Lock()
+
+
+def get_mirror_pool():
+    global _mirror_pool
+    with _mirror_pool_lock:
+        if _mirror_pool is None:
+            _mirror_pool = MirrorPool([WM_ENDPOINT] + WM_MIRRORS)
+        return _mirror_pool
+
+
+def configure_mirrors(mirrors=None):
+    """
+    configure_mirrors 设置下载镜像
+    --------------------------------
+
+    除主站外，从这些镜像端点下载文件内容。大文件的各个范围会按各端点的延迟、速度和失败情况分配到多个端点上，
+    单个文件选择预计最快的端点。文件元数据和校验和仍以主站为准，镜像返回的内容与主站不一致时会被丢弃并重试。
+    也可以通过环境变量 WM_MIRRORS（逗号分隔）设置。
+
+    参数：
+    ::::::::::
+    - **mirrors** - 镜像地址列表，目录结构与主站相同，如 ["https://mirror.example.com"]，默认为None，即只使用主站
+    """
+    global _mirror_pool
+    with _mirror_pool_lock:
+        _mirror_pool = MirrorPool([WM_ENDPOINT] + list(mirrors or []))
@@ -1,70 +1,328 @@
+import json
 import os
-import shutil
+import threading
+import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from copy import deepcopy
 
-import requests
-from tqdm import tqdm
+from .cache import export_file, get_snapshot_dir, get_snapshot_path, link_cached_blob, snapshot_matches, store_file
+from .constants import HASH_BLOCK_SIZE, HEADERS, LINK_MODE, STATE_SAVE_INTERVAL
+from .events import CACHE_HIT, CACHE_MISS, RANGE_COMPLETED, Transfer, emit, log
+from .integrity import IntegrityError, StreamHasher, expected_digests
+from .mirrors import get_mirror_pool
+from .range_scheduler import RangeScheduler, record_throughput
+from .rate_limit import get_limiter
+from .retry import RetryableError, check_range_response, get_retry_policy
+from .transport import get_transport
+from .utils import get_file_metadata, get_file_url
 
-from .constants import CACHE_PATH, HEADERS, WM_ENDPOINT
-from .utils import get_remote_file_size_with_url
+
+def _preallocate(fd, size):
+    # 预先分配磁盘空间，避免并发写入时产生碎片或中途磁盘写满
+    if size and hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError:
+            pass
+    os.ftruncate(fd, size)
+
+
+def _pwrite_all(fd, data, offset):
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
 
 
 class LFSDownload:
-    def __init__(self, repo_id, file_name, local_dir=None, revision="main", num_parts=8, force_download=False):
+    def __init__(
+        self,
+        repo_id,
+        file_name,
+        local_dir=None,
+        revision="main",
+        num_parts=8,
+        force_download=False,
+        metadata=None,
+        preallocate=True,
+        link_mode=LINK_MODE,
+        transport=None,
+    ):
         self.repo_id = repo_id
-        self.url = WM_ENDPOINT + f"/file-proxy/{repo_id}/-/raw/{revision}/{file_name}"
-        self.cache_dir = os.path.join(CACHE_PATH, repo_id.replace("/", "_"))
-        self.cache_file_name = os.path.join(self.cache_dir, file_name)
+        # 元数据中的 URL 可能固定到某个 commit，与缓存所在的 revision 不同
+        self.url = metadata.url if metadata is not None else get_file_url(repo_id, file_name, revision)
+        self.cache_dir = get_snapshot_dir(repo_id, revision)
+        self.cache_file_name = get_snapshot_path(repo_id, revision, file_name)
+        self.incomplete_path = self.cache_file_name + ".incomplete"
+        self.state_path = self.incomplete_path + ".json"
         self.num_parts = num_parts
         self.total_size = None
         self.parts = []
-        self.progress_bar = None
+        self.range_scheduler = None
+        self.progress = None
         self.headers = deepcopy(HEADERS)
         self.local_dir = local_dir
-        if self.local_dir:
-            self.file_name = os.path.join(self.local_dir, file_name)
+        self.file_name = file_name
+        self.link_mode = link_mode
         self.force_download = force_download
+        self.metadata = metadata
+        self.hasher = None
+        self.sha256 = None
+        # 单文件预分配 + 按偏移写入（pwrite）；不支持 pwrite 的平台退回到分块临时文件再合并
+        self.preallocate = preallocate and hasattr(os, "pwrite")
+        self._fd = None
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self.limiter = get_limiter("download")
+        self.retry_policy = get_retry_policy()
+        self.retry_budget = self.retry_policy.new_budget()
+        self.mirrors = get_mirror_pool()
+        self.transport = get_transport(transport)
 
-    def prepare(self):
-        self.total_size = get_remote_file_size_with_url(self.url)
-
+    def _split(self):
         # Calculate the size of each part
         part_size = self.total_size // self.num_parts
         remaining = self.total_size % self.num_parts
 
-        # Create the parts
         start = 0
         for i in range(self.num_parts):
             size = part_size
             if i == self.num_parts - 1:
                 size += remaining
-            self.parts.append((start, start + size, f"{self.cache_file_name}.part{i+1}"))  # Add temporary file name
+            yield i, start, start + size
             start += size
-        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def prepare(self):
+        if self.metadata is None:
+            self.metadata = get_file_metadata(self.url)
+        self.total_size = self.metadata.size
+        self.hasher = StreamHasher(expected_digests(self.metadata))
+        os.makedirs(os.path.dirname(self.cache_file_name), exist_ok=True)
+        # 配置了镜像时先测一下各端点的延迟，结果在进程内复用一段时间
+        self.mirrors.probe(self.url)
+
+        initial = 0
+        if self.preallocate:
+            self._prepare_target()
+            initial = sum(cursor - start for start, cursor, _ in self.range_scheduler.ranges)
+        else:
+            # Create the parts
+            self.parts = [
+                (start, end, f"{self.cache_file_name}.part{i+1}")  # Add temporary file name
+                for i, start, end in self._split()
+            ]
+
+        self.progress = Transfer(self.file_name, self.total_size, initial)
+
+    def _prepare_target(self):
+        ranges = self._load_state()
+        if ranges is None or self.force_download:
+            # 初始范围大小由文件大小和观测到的带宽决定，小文件不会被切成 num_parts 份
+            ranges = RangeScheduler.split(self.total_size, self.num_parts)
+            self.range_scheduler = RangeScheduler(ranges)
+            fd = os.open(self.incomplete_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                _preallocate(fd, self.total_size)
+            finally:
+                os.close(fd)
+            self._save_state()
+        else:
+            log(f"Resuming download of {self.incomplete_path}")
+            self.range_scheduler = RangeScheduler(ranges)
+        self._fd = os.open(self.incomplete_path, os.O_RDWR)
+
+    def _load_state(self):
+        if not os.path.exists(self.state_path) or not os.path.exists(self.incomplete_path):
+            return None
+        try:
+            with open(self.state_path, "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # 远程文件变化后，已下载的内容不能再续传
+        if state.get("size") != self.total_size or state.get("etag") != self.metadata.etag:
+            return None
+        if os.path.getsize(self.incomplete_path) != self.total_size:
+            return None
+        return state["ranges"]
+
+    def _save_state(self):
+        with self._lock:
+            ranges = self.range_scheduler.snapshot()
+            state = {"size": self.total_size, "etag": self.metadata.etag, "ranges": ranges}
+            tmp_path = self.state_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.state_path)
+
+    def tasks(self):
+        if self.preallocate:
+            num_workers = max(1, min(self.num_parts, self.range_scheduler.pending()))
+            return [(self.download_worker,) for _ in range(num_workers)]
+        return [(self.download_part, start, end, temp_file) for start, end, temp_file in self.parts]
+
+    def download_worker(self):
+        # 完成一个范围后继续领取下一个，没有空闲范围时从最慢的线程那里分走一半
+        while True:
+            index = self.range_scheduler.acquire()
+            if index is None:
+                return
+            try:
+                self.download_range(index)
+            finally:
+                self.range_scheduler.release(index)
+
+    def range_headers(self, start, end):
+        # Each request gets its own headers; the instance headers are shared by all worker threads
+        headers = deepcopy(self.headers)
+        headers["Range"] = f"bytes={start}-{end-1}"
+        return headers
+
+    def write_range_chunk(self, index, cursor, chunk):
+        """把 chunk 写到 cursor 处，返回实际写入的字节数；返回 0 表示该范围剩余部分已被其他线程接手。"""
+        # The tail of this range may have been handed to another worker meanwhile
+        size = self.range_scheduler.clip(index, cursor, len(chunk))
+        if size == 0:
+            return 0
+        _pwrite_all(self._fd, chunk[:size], cursor)
+        self.range_scheduler.advance(index, cursor + size)
+        self.hasher.feed(cursor, chunk[:size])
+        self.progress.update(size)
+        with self._lock:
+            self._unsaved += size
+            save = self._unsaved >= STATE_SAVE_INTERVAL
+            if save:
+                self._unsaved = 0
+        if save:
+            self._save_state()
+        return size
+
+    def finish_range(self, index, received, elapsed, endpoint=None, start=None, ttfb=None):
+        record_throughput(received, elapsed)
+        emit(
+            RANGE_COMPLETED,
+            file=self.file_name,
+            start=start,
+            bytes=received,
+            elapsed=elapsed,
+            ttfb=ttfb,
+            throughput=received / elapsed if elapsed > 0 else None,
+            endpoint=endpoint,
+        )
+        self._save_state()
+        # Hash whatever became contiguous on disk, so the final check does not reread the whole file
+        self.hasher.catch_up(self.incomplete_path, self.range_scheduler.frontier())
+
+        _, cursor, end = self.range_scheduler.ranges[index]
+        if cursor < end:
+            # 由 mirrors.use 记录为失败，不再同时记为成功
+            raise RetryableError(f"Range {cursor}-{end} of {self.cache_file_name} was not fully downloaded.")
+        if endpoint is not None:
+            self.mirrors.record_success(endpoint, received, elapsed)
+
+    def download_range(self, index):
+        # 失败时只重试该范围尚未写入的部分，已写入的数据保留
+        self.retry_policy.call(
+            self._download_range,
+            index,
+            budget=self.retry_budget,
+            progress=lambda: self.range_scheduler.ranges[index][1],
+            description=f"Range {index} of {self.file_name}",
+        )
+
+    def _download_range(self, index):
+        _, cursor, end = self.range_scheduler.ranges[index]
+        if cursor >= end:
+            return
+        start = cursor
+        received = 0
+        started = time.monotonic()
+        # 每个范围（包括重试）都重新选择端点，失败的端点暂停使用
+        endpoint = self.mirrors.choose()
+        url = self.mirrors.url_for(self.url, endpoint)
+        with self.mirrors.use(endpoint):
+            with self.limiter.connection(), self.transport.get(
+                url, headers=self.range_headers(cursor, end), stream=True
+            ) as response:
+                ttfb = time.monotonic() - started
+                response.raise_for_status()
+                check_range_response(
+                    response.status_code, response.headers, cursor, end, self.total_size, self.metadata.etag
+                )
+                for chunk in response.iter_content(chunk_size=8192):
+                    if not chunk:
+                        continue
+                    self.limiter.throttle(len(chunk))
+                    size = self.write_range_chunk(index, cursor, chunk)
+                    if size == 0:
+                        break
+                    cursor += size
+                    received += size
+            self.finish_range(index, received, time.monotonic() - started, endpoint, start, ttfb)
 
     def download_part(self, start, end, temp_file):
-        print(f"Downloading part {temp_file}, range: {start}-{end}")
         resume_size = 0
         # Check if the temporary part file already exists and is complete
         if os.path.exists(temp_file) and os.path.getsize(temp_file) == end - start:
-            self.progress_bar.update(end - start)  # Update progress for already downloaded part
+            self.progress.update(end - start)  # Update progress for already downloaded part
             return  # Skip downloading
         else:
             resume_size = os.path.getsize(temp_file) if os.path.exists(temp_file) else 0
-            self.progress_bar.update(resume_size)  # Update progress for already downloaded part
-            print(f"Resuming download of part {temp_file}, starting from {start + resume_size}")
-
-        self.headers["Range"] = f"bytes={start+resume_size}-{end-1}"
-
-        response = requests.get(self.url, headers=self.headers, stream=True)
+            self.progress.update(resume_size)  # Update progress for already downloaded part
+            if resume_size:
+                log(f"Resuming download of part {temp_file}, starting from {start + resume_size}")
 
         os.makedirs(os.path.dirname(temp_file), exist_ok=True)
-        with open(temp_file, "ab") as f:  # Write to temporary file
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-                    self.progress_bar.update(len(chunk))  # Update progress bar
+        self.retry_policy.call(
+            self._download_part,
+            start,
+            end,
+            temp_file,
+            budget=self.retry_budget,
+            progress=lambda: os.path.getsize(temp_file) if os.path.exists(temp_file) else 0,
+            description=f"Part {temp_file}",
+        )
+
+    def _download_part(self, start, end, temp_file):
+        # 每次重试都从分块文件当前的大小续传
+        offset = start + (os.path.getsize(temp_file) if os.path.exists(temp_file) else 0)
+        if offset >= end:
+            return
+        endpoint = self.mirrors.choose()
+        url = self.mirrors.url_for(self.url, endpoint)
+        started = time.monotonic()
+        with self.mirrors.use(endpoint):
+            with self.limiter.connection(), self.transport.get(
+                url, headers=self.range_headers(offset, end), stream=True
+            ) as response:
+                ttfb = time.monotonic() - started
+                response.raise_for_status()
+                check_range_response(
+                    response.status_code, response.headers, offset, end, self.total_size, self.metadata.etag
+                )
+                with open(temp_file, "ab") as f:  # Write to temporary file
+                    for chunk in response.iter_content(chunk_size=8192):
+                        if chunk:
+                            self.limiter.throttle(len(chunk))
+                            f.write(chunk)
+                            self.progress.update(len(chunk))
+            if os.path.getsize(temp_file) < end - start:
+                raise RetryableError(f"Part {temp_file} was not fully downloaded.")
+        received = start + os.path.getsize(temp_file) - offset
+        elapsed = time.monotonic() - started
+        self.mirrors.record_success(endpoint, received, elapsed)
+        emit(
+            RANGE_COMPLETED,
+            file=self.file_name,
+            start=offset,
+            bytes=received,
+            elapsed=elapsed,
+            ttfb=ttfb,
+            throughput=received / elapsed if elapsed > 0 else None,
+            endpoint=endpoint,
+        )
 
     def merge_parts(self):
         try:
@@ -75,45 +333,100 @@ class LFSDownload:
                     else:
                         raise Exception("Not all parts have been downloaded. ")
 
-            with open(self.cache_file_name, "ab") as outfile:
+            with open(self.incomplete_path, "wb") as outfile:
                 for start, end, temp_file in self.parts:
-                    print(f"Merging part {temp_file}")
+                    log(f"Merging part {temp_file}", level="debug")
                     with open(temp_file, "rb") as infile:
-                        outfile.write(infile.read())
+                        # Hash while merging, the parts are read once anyway
+                        for block in iter(lambda: infile.read(HASH_BLOCK_SIZE), b""):
+                            outfile.write(block)
+                            self.hasher.update(block)
                     os.remove(temp_file)  # Delete temporary file
+            self.hasher.verify(self.cache_file_name)
         except Exception as e:
-            print(f"Error merging parts: {e}")
-            os.remove(self.cache_file_name)  # Delete incomplete file
+            log(f"Error merging parts: {e}", level="warning")
+            if os.path.exists(self.incomplete_path):
+                os.remove(self.incomplete_path)  # Delete incomplete file
             raise e
+        self.store()
+
+    def close(self, error=None):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        if error is not None and self.progress is not None:
+            self.progress.close(error)
+
+    def commit_target(self):
+        self.close()
+        if not self.range_scheduler.is_complete():
+            raise Exception("Not all parts have been downloaded. ")
+        self.hasher.catch_up(self.incomplete_path, self.total_size)
+        try:
+            self.hasher.verify(self.cache_file_name)
+        except IntegrityError:
+            # 无法判断是哪个范围出错，丢弃已下载内容，重试时从头下载
+            os.remove(self.incomplete_path)
+            os.remove(self.state_path)
+            raise
+        # 所有范围都已写入预分配的文件，直接移入 blob 存储，无需合并
+        self.store()
+        os.remove(self.state_path)
+
+    def store(self):
+        store_file(self.incomplete_path, self.cache_file_name, self.hasher.hexdigest(), self.hasher.expected)
 
     def run(self):
+        # Open the connections before the fan-out so the parts don't all handshake at once
+        self.transport.prewarm(self.mirrors.url_for(self.url, self.mirrors.best()), self.num_parts)
         with ThreadPoolExecutor(max_workers=self.num_parts) as executor:
-            futures = [
-                executor.submit(self.download_part, start, end, temp_file) for start, end, temp_file in self.parts
-            ]
+            futures = [executor.submit(*task) for task in self.tasks()]
 
             for future in as_completed(futures):
                 future.result()
 
-        self.merge_parts()  # Merge temporary files into final file
-
-    def download(self):
-        if os.path.exists(self.cache_file_name) and not self.force_download:
-            print(f'File "{self.cache_file_name}" already exists. Skip downloading.')
-            return
-
-        self.prepare()
+    def finalize(self):
+        try:
+            if self.preallocate:
+                self.commit_target()
+            else:
+                self.merge_parts()  # Merge temporary files into final file
+        except Exception as e:
+            self.close(e)
+            raise
+        self.sha256 = self.hasher.hexdigest()
+        self.progress.close()
+        return self.export()
 
-        # Initialize progress bar
-        self.progress_bar = tqdm(total=self.total_size, unit="B", unit_scale=True, desc=self.cache_file_name)
+    def export(self):
+        return export_file(self.cache_file_name, self.local_dir, self.file_name, self.link_mode)
 
-        self.run()
+    def download(self):
+        # 给出元数据时，同名文件还要与远程内容一致，分支更新后它可能是旧版本
+        cached = os.path.exists(self.cache_file_name) and (
+            self.metadata is None
+            or (
+                os.path.getsize(self.cache_file_name) == self.metadata.size
+                and snapshot_matches(self.cache_file_name, self.metadata)
+            )
+        )
+        if cached and not self.force_download:
+            emit(CACHE_HIT, file=self.file_name, reason="snapshot")
+            return self.export()
 
-        self.progress_bar.close()
+        if not self.force_download:
+            if self.metadata is None:
+                self.metadata = get_file_metadata(self.url)
+            # 其他分支或仓库已下载过相同内容时，直接链接已有的 blob
+            if link_cached_blob(self.cache_file_name, self.metadata):
+                emit(CACHE_HIT, file=self.file_name, reason="checksum")
+                return self.export()
 
-        if self.local_dir:
-            os.makedirs(os.path.dirname(self.file_name), exist_ok=True)
-            shutil.copyfile(self.cache_file_name, self.file_name)
-            return self.file_name
-        else:
-            return self.cache_file_name
+        emit(CACHE_MISS, file=self.file_name)
+        self.prepare()
+        try:
+            self.run()
+        except Exception as e:
+            self.close(e)
+            raise
+        return self.finalize()
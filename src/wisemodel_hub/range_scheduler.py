@@ -0,0 +1,117 @@
+import copy
+import threading
+
+from .constants import MIN_RANGE_SIZE, RANGE_TARGET_SECONDS
+
+
+_bandwidth = None
+_bandwidth_lock = threading.Lock()
+
+
+def record_throughput(num_bytes, elapsed):
+    """记录单个连接的下载速度（字节/秒），用指数滑动平均平滑。"""
+    global _bandwidth
+    if elapsed <= 0 or num_bytes <= 0:
+        return
+    speed = num_bytes / elapsed
+    with _bandwidth_lock:
+        _bandwidth = speed if _bandwidth is None else 0.7 * _bandwidth + 0.3 * speed
+
+
+def estimate_range_size():
+    # 单个范围至少要传输 RANGE_TARGET_SECONDS 秒，否则多开一个连接不划算
+    with _bandwidth_lock:
+        bandwidth = _bandwidth
+    if bandwidth is None:
+        return MIN_RANGE_SIZE
+    return max(MIN_RANGE_SIZE, int(bandwidth * RANGE_TARGET_SECONDS))
+
+
+class RangeScheduler:
+    """
+    在多个下载线程之间动态分配文件的字节范围。
+
+    每个范围记录为 [start, cursor, end]。线程先领取尚未分配的范围；没有剩余范围时，
+    从剩余字节最多的正在下载的范围中切走后一半，这样慢连接不会拖住整个文件。
+    """
+
+    def __init__(self, ranges, min_split_size=MIN_RANGE_SIZE):
+        self.ranges = ranges
+        self.min_split_size = min_split_size
+        self.active = set()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def split(total_size, max_parts):
+        num_ranges = max(1, min(max_parts, total_size // estimate_range_size()))
+        part_size = total_size // num_ranges
+        ranges = []
+        start = 0
+        for i in range(num_ranges):
+            end = total_size if i == num_ranges - 1 else start + part_size
+            ranges.append([start, start, end])
+            start = end
+        return ranges
+
+    def pending(self):
+        with self.lock:
+            return sum(1 for _, cursor, end in self.ranges if cursor < end)
+
+    def snapshot(self):
+        with self.lock:
+            return copy.deepcopy(self.ranges)
+
+    def frontier(self):
+        """返回从文件开头起已连续下载完成的字节数。"""
+        with self.lock:
+            position = 0
+            for start, cursor, end in sorted(self.ranges):
+                if start > position:
+                    break
+                position = max(position, cursor)
+                if cursor < end:
+                    break
+            return position
+
+    def is_complete(self):
+        return self.pending() == 0
+
+    def _remaining(self, index):
+        _, cursor, end = self.ranges[index]
+        return end - cursor
+
+    def acquire(self):
+        """领取一个范围的下标，没有可下载的内容时返回 None。"""
+        with self.lock:
+            idle = [i for i in range(len(self.ranges)) if i not in self.active and self._remaining(i) > 0]
+            if idle:
+                index = max(idle, key=self._remaining)
+            else:
+                index = self._steal()
+            if index is not None:
+                self.active.add(index)
+            return index
+
+    def _steal(self):
+        candidates = [i for i in self.active if self._remaining(i) >= 2 * self.min_split_size]
+        if not candidates:
+            return None
+        victim = max(candidates, key=self._remaining)
+        _, cursor, end = self.ranges[victim]
+        middle = cursor + (end - cursor) // 2
+        self.ranges[victim][2] = middle
+        self.ranges.append([middle, middle, end])
+        return len(self.ranges) - 1
+
+    def release(self, index):
+        with self.lock:
+            self.active.discard(index)
+
+    def clip(self, index, cursor, size):
+        """返回从 cursor 开始还能写入的字节数；范围被切走一部分后会变小。"""
+        with self.lock:
+            return max(0, min(size, self.ranges[index][2] - cursor))
+
+    def advance(self, index, cursor):
+        with self.lock:
+            self.ranges[index][1] = cursor
@@ -0,0 +1,144 @@
+import asyncio
+import contextlib
+import threading
+import time
+
+from .constants import (
+    DOWNLOAD_MAX_CONNECTIONS,
+    DOWNLOAD_RATE_LIMIT,
+    RATE_LIMIT_POLL_INTERVAL,
+    UPLOAD_MAX_CONNECTIONS,
+    UPLOAD_RATE_LIMIT,
+)
+from .utils import parse_size
+
+
+class TokenBucket:
+    """
+    令牌桶：每秒补充 rate 个字节的令牌，最多积累 burst 个。
+
+    令牌不足时允许透支，透支的调用者按欠下的令牌数计算需要等待的时间，
+    这样大块数据不会因为超过 burst 而永远拿不到令牌，多个线程之间也按先后顺序排队。
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, num_bytes):
+        """取走 num_bytes 个令牌，返回需要等待的秒数。"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= num_bytes
+            return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class TransferLimiter:
+    """
+    一个传输方向（下载或上传）的进程级限制：每秒字节数和同时进行的传输连接数。
+
+    所有下载、上传循环都从对应方向的限制器取令牌，多个任务共享同一份预算。
+    rate 和 max_connections 为 None 时不限制。
+    """
+
+    def __init__(self, rate=None, max_connections=None):
+        self.bucket = None
+        self.max_connections = None
+        self.active = 0
+        self.condition = threading.Condition()
+        self.configure(rate, max_connections)
+
+    def configure(self, rate=None, max_connections=None):
+        rate = parse_size(rate) if rate else None
+        self.bucket = TokenBucket(rate) if rate else None
+        with self.condition:
+            self.max_connections = max_connections or None
+            self.condition.notify_all()
+
+    def throttle(self, num_bytes):
+        """传输 num_bytes 字节前调用，超出速率时阻塞当前线程。"""
+        bucket = self.bucket
+        if bucket is None:
+            return
+        wait = bucket.reserve(num_bytes)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def athrottle(self, num_bytes):
+        """throttle 的协程版本，等待时不阻塞事件循环。"""
+        bucket = self.bucket
+        if bucket is None:
+            return
+        wait = bucket.reserve(num_bytes)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def _try_acquire(self):
+        with self.condition:
+            if self.max_connections is not None and self.active >= self.max_connections:
+                return False
+            self.active += 1
+            return True
+
+    def _release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify()
+
+    @contextlib.contextmanager
+    def connection(self):
+        """占用一个传输连接名额，名额用完时阻塞等待。"""
+        with self.condition:
+            while self.max_connections is not None and self.active >= self.max_connections:
+                self.condition.wait()
+            self.active += 1
+        try:
+            yield
+        finally:
+            self._release()
+
+    @contextlib.asynccontextmanager
+    async def aconnection(self):
+        """connection 的协程版本。与线程共享名额，因此以轮询方式等待，不阻塞事件循环。"""
+        while not self._try_acquire():
+            await asyncio.sleep(RATE_LIMIT_POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            self._release()
+
+
+_limiters = {
+    "download": TransferLimiter(DOWNLOAD_RATE_LIMIT, DOWNLOAD_MAX_CONNECTIONS),
+    "upload": TransferLimiter(UPLOAD_RATE_LIMIT, UPLOAD_MAX_CONNECTIONS),
+}
+
+
+def get_limiter(direction):
+    return _limiters[direction]
+
+
+def configure_rate_limit(direction="download", rate=None, max_connections=None):
+    """
+    configure_rate_limit 设置进程内所有传输共享的限速
+    ----------------------------------------------------
+
+    同一进程内的所有下载（或上传）共享一个令牌桶和连接数上限，多个并行任务加起来不会超过设定值。
+    也可以通过环境变量 WM_DOWNLOAD_RATE_LIMIT、WM_DOWNLOAD_MAX_CONNECTIONS、
+    WM_UPLOAD_RATE_LIMIT、WM_UPLOAD_MAX_CONNECTIONS 设置。
+
+    参数：
+    ::::::::::
+    - **direction** - 限制的方向，可选值：'download'、'upload'、'both'，默认为'download'
+    - **rate** - 每秒最多传输的字节数，可以写成 "100M"、"1.5G" 的形式，默认为None，即不限速
+    - **max_connections** - 同时进行的传输连接数上限，默认为None，即不限制
+    """
+    if direction not in ("download", "upload", "both"):
+        raise ValueError(f"Unknown direction {direction!r}, expected 'download', 'upload' or 'both'")
+    for name in ("download", "upload") if direction == "both" else (direction,):
+        _limiters[name].configure(rate, max_connections)
@@ -0,0 +1,221 @@
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from copy import deepcopy
+
+from .cache import get_snapshot_path, snapshot_matches
+from .constants import HEADERS, REMOTE_BLOCK_SIZE, REMOTE_CACHE_SIZE, REMOTE_READAHEAD
+from .downloader import _is_offline
+from .mirrors import get_mirror_pool
+from .rate_limit import get_limiter
+from .retry import RetryableError, check_range_response, get_retry_policy
+from .transport import get_transport
+from .utils import get_file_metadata, get_file_url
+
+
+class RemoteFile(io.RawIOBase):
+    """
+    通过 HTTP 范围请求按需读取的只读远程文件。
+
+    文件按 block_size 分块读取，最近使用的块保存在内存中（总大小不超过 cache_size）；
+    检测到顺序读取时，一次请求多取 readahead 个块，相邻的缺失块合并为一个请求。
+    """
+
+    def __init__(
+        self,
+        url,
+        metadata,
+        name=None,
+        block_size=REMOTE_BLOCK_SIZE,
+        cache_size=REMOTE_CACHE_SIZE,
+        readahead=REMOTE_READAHEAD,
+        transport=None,
+    ):
+        super().__init__()
+        self.url = url
+        self.metadata = metadata
+        self.size = metadata.size
+        self.name = name or url
+        self.block_size = block_size
+        self.max_blocks = max(1, cache_size // block_size)
+        self.readahead = readahead
+        self.num_blocks = (self.size + block_size - 1) // block_size
+        self.mirrors = get_mirror_pool()
+        self.limiter = get_limiter("download")
+        self.transport = get_transport(transport)
+        self.retry_policy = get_retry_policy()
+        self.retry_budget = self.retry_policy.new_budget()
+        self._blocks = OrderedDict()
+        self._position = 0
+        self._next_block = 0
+        self._lock = threading.Lock()
+
+    @property
+    def mode(self):
+        return "rb"
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence {whence}")
+        if position < 0:
+            raise ValueError(f"Negative seek position {position}")
+        self._position = position
+        return position
+
+    def readinto(self, buffer):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        size = min(len(buffer), self.size - self._position)
+        if size <= 0:
+            return 0
+        first = self._position // self.block_size
+        last = (self._position + size - 1) // self.block_size
+        blocks = self._get_blocks(first, last)
+
+        offset = self._position - first * self.block_size
+        written = 0
+        view = memoryview(buffer)
+        for block in blocks:
+            chunk = block[offset : offset + size - written]
+            view[written : written + len(chunk)] = chunk
+            written += len(chunk)
+            offset = 0
+        self._position += written
+        return written
+
+    def readall(self):
+        # 默认实现按 DEFAULT_BUFFER_SIZE 循环读取，这里一次读完剩余部分
+        return self.read(max(0, self.size - self._position))
+
+    def close(self):
+        self._blocks.clear()
+        super().close()
+
+    def read_range(self, start, end):
+        """直接读取 [start, end) 的内容，不经过块缓存，也不改变当前位置；可以在多个线程中同时调用。"""
+        end = min(end, self.size)
+        if start >= end:
+            return memoryview(b"")
+        return self.retry_policy.call(
+            self._fetch,
+            start,
+            end,
+            budget=self.retry_budget,
+            description=f"Read of bytes {start}-{end - 1} of {self.name}",
+        )
+
+    def _get_blocks(self, first, last):
+        with self._lock:
+            found = {index: self._blocks[index] for index in range(first, last + 1) if index in self._blocks}
+            for index in found:
+                self._blocks.move_to_end(index)
+            sequential = first == self._next_block
+            self._next_block = last + 1
+
+        missing = [index for index in range(first, last + 1) if index not in found]
+        if missing:
+            end_block = missing[-1]
+            if sequential:
+                end_block = min(end_block + self.readahead, self.num_blocks - 1)
+            # 缺失的块合并为一个请求，中间已缓存的块一并重新读取
+            found.update(self._fetch_blocks(missing[0], end_block))
+        return [found[index] for index in range(first, last + 1)]
+
+    def _fetch_blocks(self, first, last):
+        data = self.read_range(first * self.block_size, (last + 1) * self.block_size)
+        blocks = {}
+        with self._lock:
+            for index in range(first, last + 1):
+                offset = (index - first) * self.block_size
+                blocks[index] = data[offset : offset + self.block_size]
+                self._blocks[index] = blocks[index]
+                self._blocks.move_to_end(index)
+            while len(self._blocks) > self.max_blocks:
+                self._blocks.popitem(last=False)
+        return blocks
+
+    def _fetch(self, start, end):
+        headers = deepcopy(HEADERS)
+        headers["Range"] = f"bytes={start}-{end - 1}"
+        endpoint = self.mirrors.best()
+        started = time.monotonic()
+        with self.mirrors.use(endpoint):
+            with self.limiter.connection():
+                response = self.transport.get(self.mirrors.url_for(self.url, endpoint), headers=headers)
+            response.raise_for_status()
+            check_range_response(response.status_code, response.headers, start, end, self.size, self.metadata.etag)
+            data = response.content
+            self.limiter.throttle(len(data))
+            if len(data) != end - start:
+                raise RetryableError(f"Expected {end - start} bytes from {self.name}, got {len(data)}")
+        self.mirrors.record_success(endpoint, len(data), time.monotonic() - started)
+        return memoryview(data)
+
+
+def open_remote(
+    repo_id,
+    file_name,
+    branch="main",
+    block_size=REMOTE_BLOCK_SIZE,
+    cache_size=REMOTE_CACHE_SIZE,
+    readahead=REMOTE_READAHEAD,
+    offline=None,
+    transport=None,
+):
+    """
+    open_remote 以只读文件对象的方式打开远程文件
+    ----------------------------------------------
+
+    不下载整个文件，而是在 read/seek 时通过范围请求按需读取，适合只需要文件一部分的场景，
+    如 safetensors 的文件头、jsonl 数据集的前几行、大仓库中的一个配置文件。
+    读取过的块缓存在内存中，顺序读取时会预读后面的块。本地缓存中已有相同内容的文件时直接打开本地文件。
+
+    参数：
+    ::::::::::
+    - **repo_id** - 仓库ID
+    - **file_name** - 文件名
+    - **branch** - 分支名，默认为"main"
+    - **block_size** - 每次请求的最小单位（字节），默认为1MB
+    - **cache_size** - 内存中缓存的块的总大小（字节），默认为64MB
+    - **readahead** - 顺序读取时预读的块数，默认为4
+    - **offline** - 是否离线使用，默认为None，即由环境变量 WM_OFFLINE 决定；离线时只能打开本地缓存中的文件
+    - **transport** - 传输后端，可选值：'requests'、'http2'，默认为None，参见 snapshot_download
+
+    返回值：
+    ::::::::::
+        io.BufferedReader: 支持 read、seek、readline 等操作的二进制文件对象
+    """
+    cache_path = get_snapshot_path(repo_id, branch, file_name)
+    if _is_offline(offline):
+        if not os.path.exists(cache_path):
+            raise FileNotFoundError(f"文件 {file_name} 不在仓库 {repo_id} 分支 {branch} 的本地缓存中，无法离线使用")
+        return open(cache_path, "rb")
+
+    url = get_file_url(repo_id, file_name, branch)
+    metadata = get_file_metadata(url)
+    if (
+        os.path.exists(cache_path)
+        and os.path.getsize(cache_path) == metadata.size
+        and snapshot_matches(cache_path, metadata)
+    ):
+        return open(cache_path, "rb")
+
+    raw = RemoteFile(url, metadata, file_name, block_size, cache_size, readahead, transport)
+    return io.BufferedReader(raw, buffer_size=block_size)
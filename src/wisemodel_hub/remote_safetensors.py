@@ -0,0 +1,283 @@
+import json
+import mmap
+import os
+import struct
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .cache import temp_path
+from .constants import MAX_WORKERS, SAFETENSORS_COALESCE_GAP, SAFETENSORS_MAX_RANGE
+from .events import log
+from .remote_file import RemoteFile, open_remote
+
+
+SAFETENSORS_INDEX_NAME = "model.safetensors.index.json"
+SAFETENSORS_NAME = "model.safetensors"
+
+TensorInfo = namedtuple("TensorInfo", ["name", "file_name", "dtype", "shape", "start", "end"])
+TensorData = namedtuple("TensorData", ["dtype", "shape", "data"])
+
+# safetensors 的 dtype 与 numpy 的对应关系；BF16、F8 等 numpy 不支持的类型只能以原始字节返回
+_NUMPY_DTYPES = {
+    "F64": "<f8",
+    "F32": "<f4",
+    "F16": "<f2",
+    "I64": "<i8",
+    "I32": "<i4",
+    "I16": "<i2",
+    "I8": "i1",
+    "U64": "<u8",
+    "U32": "<u4",
+    "U16": "<u2",
+    "U8": "u1",
+    "BOOL": "?",
+}
+
+
+def _import_numpy():
+    try:
+        import numpy  # type: ignore
+    except ImportError:
+        raise ImportError("as_numpy=True needs the `numpy` module: `pip install numpy`.")
+    return numpy
+
+
+class _ShardReader:
+    """按字节范围读取一个分片：远程文件发送范围请求，本地缓存中已有的文件直接读取。"""
+
+    def __init__(self, repo_id, file_name, branch, offline, transport=None):
+        self.file_name = file_name
+        self.file = open_remote(repo_id, file_name, branch, offline=offline, transport=transport)
+        self.lock = threading.Lock()
+
+    def read_range(self, start, end):
+        if isinstance(self.file.raw, RemoteFile):
+            return self.file.raw.read_range(start, end)
+        with self.lock:
+            self.file.seek(start)
+            return memoryview(self.file.read(end - start))
+
+    def read_header(self):
+        (header_size,) = struct.unpack("<Q", bytes(self.read_range(0, 8)))
+        header = json.loads(bytes(self.read_range(8, 8 + header_size)))
+        header.pop("__metadata__", None)
+        data_offset = 8 + header_size
+        return {
+            name: TensorInfo(
+                name,
+                self.file_name,
+                entry["dtype"],
+                tuple(entry["shape"]),
+                data_offset + entry["data_offsets"][0],
+                data_offset + entry["data_offsets"][1],
+            )
+            for name, entry in header.items()
+        }
+
+    def close(self):
+        self.file.close()
+
+
+def _resolve_weight_map(repo_id, file_name, branch, offline, transport=None):
+    """返回 {张量名: 分片文件名}。file_name 为 None 时先找分片索引，没有索引时使用单个 model.safetensors。"""
+    if file_name is None:
+        try:
+            return _resolve_weight_map(repo_id, SAFETENSORS_INDEX_NAME, branch, offline, transport)
+        except (FileNotFoundError, requests.exceptions.HTTPError):
+            file_name = SAFETENSORS_NAME
+    if file_name.endswith(".json"):
+        with open_remote(repo_id, file_name, branch, offline=offline, transport=transport) as f:
+            weight_map = json.load(f)["weight_map"]
+        # 索引中的分片路径相对于索引文件所在目录
+        directory = os.path.dirname(file_name)
+        return {name: f"{directory}/{shard}" if directory else shard for name, shard in weight_map.items()}
+    return {None: file_name}
+
+
+def get_safetensors_header(repo_id, file_name=None, branch="main", offline=None, transport=None):
+    """
+    get_safetensors_header 读取远程 safetensors 文件的张量信息
+    ----------------------------------------------------------
+
+    只读取文件头，不下载张量数据。
+
+    参数：
+    ::::::::::
+    - **repo_id** - 仓库ID
+    - **file_name** - safetensors 文件或分片索引（如 model.safetensors.index.json）的文件名，
+      默认为None，即先找 model.safetensors.index.json，没有时使用 model.safetensors
+    - **branch** - 分支名，默认为"main"
+    - **offline** - 是否离线使用，默认为None，即由环境变量 WM_OFFLINE 决定
+    - **transport** - 传输后端，可选值：'requests'、'http2'，默认为None，参见 snapshot_download
+
+    返回值：
+    ::::::::::
+        dict: 张量名到 TensorInfo(name, file_name, dtype, shape, start, end) 的映射，start、end 为张量在分片中的字节范围
+    """
+    weight_map = _resolve_weight_map(repo_id, file_name, branch, offline, transport)
+    infos = {}
+    for shard in sorted(set(weight_map.values())):
+        reader = _ShardReader(repo_id, shard, branch, offline, transport)
+        try:
+            infos.update(reader.read_header())
+        finally:
+            reader.close()
+    return infos
+
+
+def plan_ranges(infos, coalesce_gap=SAFETENSORS_COALESCE_GAP):
+    """
+    把同一分片中的张量按位置排序，间隔不超过 coalesce_gap 的合并为一个范围。
+
+    返回 [(file_name, start, end, [TensorInfo, ...]), ...]。
+    """
+    ranges = []
+    for info in sorted(infos, key=lambda info: (info.file_name, info.start)):
+        last = ranges[-1] if ranges else None
+        if last is not None and last[0] == info.file_name and info.start - last[2] <= coalesce_gap:
+            last[2] = max(last[2], info.end)
+            last[3].append(info)
+        else:
+            ranges.append([info.file_name, info.start, info.end, [info]])
+    return [tuple(r) for r in ranges]
+
+
+def _split(start, end, max_range):
+    return [(offset, min(end, offset + max_range)) for offset in range(start, end, max_range)] or [(start, end)]
+
+
+def _save_safetensors(save_path, tensors):
+    # 只包含选中张量的 safetensors 文件，文件头按 8 字节对齐
+    header = {}
+    offset = 0
+    for name, (dtype, shape, data) in tensors.items():
+        header[name] = {"dtype": dtype, "shape": list(shape), "data_offsets": [offset, offset + len(data)]}
+        offset += len(data)
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    header_bytes += b" " * (-len(header_bytes) % 8)
+
+    os.makedirs(os.path.dirname(os.path.abspath(save_path)), exist_ok=True)
+    tmp_path = temp_path(save_path)
+    with open(tmp_path, "wb") as f:
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for _, _, data in tensors.values():
+            f.write(data)
+    os.replace(tmp_path, save_path)
+
+    # 返回保存后文件的内存映射，张量数据不必在内存中再保留一份
+    data_offset = 8 + len(header_bytes)
+    with open(save_path, "rb") as f:
+        mapped = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)) if offset else memoryview(b"")
+    saved = {}
+    for name, (dtype, shape, _) in tensors.items():
+        start, end = header[name]["data_offsets"]
+        saved[name] = TensorData(dtype, shape, mapped[data_offset + start : data_offset + end])
+    return saved
+
+
+def _to_numpy(tensor):
+    numpy = _import_numpy()
+    if tensor.dtype not in _NUMPY_DTYPES:
+        raise ValueError(f"numpy does not support dtype {tensor.dtype}, use as_numpy=False to get the raw bytes")
+    return numpy.frombuffer(tensor.data, dtype=_NUMPY_DTYPES[tensor.dtype]).reshape(tensor.shape)
+
+
+def fetch_tensors(
+    repo_id,
+    tensor_names,
+    file_name=None,
+    branch="main",
+    save_path=None,
+    as_numpy=False,
+    max_workers=MAX_WORKERS,
+    coalesce_gap=SAFETENSORS_COALESCE_GAP,
+    offline=None,
+    transport=None,
+):
+    """
+    fetch_tensors 从远程 safetensors 文件中只读取指定的张量
+    --------------------------------------------------------
+
+    先读取各分片的文件头，找到张量所在的字节范围，把相邻的张量合并为较大的范围请求，
+    再并发读取这些范围。只需要少量张量时（如合并 LoRA、逐层检查），不必下载整个模型。
+    本地缓存中已有的分片直接从本地读取。
+
+    参数：
+    ::::::::::
+    - **repo_id** - 仓库ID
+    - **tensor_names** - 要读取的张量名列表
+    - **file_name** - safetensors 文件或分片索引的文件名，默认为None，即先找 model.safetensors.index.json，没有时使用 model.safetensors
+    - **branch** - 分支名，默认为"main"
+    - **save_path** - 可选，把读取的张量保存为一个新的 safetensors 文件，返回的数据是该文件的内存映射，默认为None，即数据保存在内存中
+    - **as_numpy** - 是否返回 numpy 数组（需要安装 numpy），默认为False，即返回 TensorData(dtype, shape, data)，data 为 memoryview
+    - **max_workers** - 并发请求数，默认为32
+    - **coalesce_gap** - 间隔不超过该字节数的张量合并为一个请求，默认为1MB
+    - **offline** - 是否离线使用，默认为None，即由环境变量 WM_OFFLINE 决定
+    - **transport** - 传输后端，可选值：'requests'、'http2'，默认为None，参见 snapshot_download
+
+    返回值：
+    ::::::::::
+        dict: 张量名到 TensorData 或 numpy 数组的映射，顺序与 tensor_names 相同
+    """
+    tensor_names = list(tensor_names)
+    weight_map = _resolve_weight_map(repo_id, file_name, branch, offline, transport)
+    shards = {}
+    for name in tensor_names:
+        # 单个文件时 weight_map 只有 {None: 文件名}
+        shard = weight_map.get(name, weight_map.get(None))
+        if shard is None:
+            raise KeyError(f"Tensor {name!r} not found in {repo_id}")
+        shards.setdefault(shard, []).append(name)
+
+    readers = {shard: _ShardReader(repo_id, shard, branch, offline, transport) for shard in shards}
+    try:
+        infos = []
+        for shard, names in shards.items():
+            header = readers[shard].read_header()
+            missing = [name for name in names if name not in header]
+            if missing:
+                raise KeyError(f"Tensors {missing} not found in {shard}")
+            infos.extend(header[name] for name in names)
+
+        plan = plan_ranges(infos, coalesce_gap)
+        total = sum(end - start for _, start, end, _ in plan)
+        log(f"Fetching {len(infos)} tensors in {len(plan)} ranges ({total} bytes) from {len(shards)} files.")
+
+        # 每个合并后的范围写入一块预先分配的缓冲区，大范围切分后并发读取
+        buffers = [bytearray(end - start) for _, start, end, _ in plan]
+        pieces = [
+            (index, piece_start, piece_end)
+            for index, (_, start, end, _) in enumerate(plan)
+            for piece_start, piece_end in _split(start, end, SAFETENSORS_MAX_RANGE)
+        ]
+
+        def fetch(piece):
+            index, start, end = piece
+            shard, range_start = plan[index][0], plan[index][1]
+            data = readers[shard].read_range(start, end)
+            buffers[index][start - range_start : end - range_start] = data
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pieces)))) as executor:
+            list(executor.map(fetch, pieces))
+    finally:
+        for reader in readers.values():
+            reader.close()
+
+    tensors = {}
+    for (_, range_start, _, range_infos), buffer in zip(plan, buffers):
+        view = memoryview(buffer)
+        for info in range_infos:
+            tensors[info.name] = TensorData(
+                info.dtype, info.shape, view[info.start - range_start : info.end - range_start]
+            )
+    tensors = {name: tensors[name] for name in tensor_names}
+
+    if save_path is not None:
+        tensors = _save_safetensors(save_path, tensors)
+    if as_numpy:
+        return {name: _to_numpy(tensor) for name, tensor in tensors.items()}
+    return tensors
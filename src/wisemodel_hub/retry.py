@@ -0,0 +1,227 @@
+import asyncio
+import random
+import re
+import sys
+import threading
+import time
+
+import requests
+
+from .constants import RETRY_BACKOFF, RETRY_BUDGET, RETRY_MAX_BACKOFF, RETRY_STATUS_CODES, RETRY_TIMES
+from .events import RETRY, emit, log
+from .integrity import IntegrityError
+from .utils import parse_etag
+
+
+_CONTENT_RANGE_PATTERN = re.compile(r"^bytes (\d+)-(\d+)/(\d+|\*)$")
+
+
+class RetryableError(Exception):
+    """传输中可以通过重试恢复的错误，例如连接中断或服务端返回了不符合请求的内容。"""
+
+
+class RangeResponseError(RetryableError):
+    """范围请求的响应状态码或 Content-Range 与请求的范围不一致，响应内容不能写入文件。"""
+
+
+class ContentChangedError(IntegrityError):
+    """响应的 ETag 与文件元数据不一致：远程文件在下载过程中更新了，或者镜像还没有同步。"""
+
+
+def check_range_response(status, headers, start, end, total_size=None, etag=None):
+    """
+    在写入之前确认响应确实是请求的 [start, end) 范围。
+
+    服务端返回 200 时只有请求的正好是整个文件才可以接受；返回 206 时 Content-Range 必须与请求一致。
+    给出 etag 时还要求响应的 ETag（如果有）与之相同，避免从不同步的镜像拼出混合版本的文件。
+    """
+    response_etag = parse_etag(headers.get("ETag"))
+    if etag and response_etag and response_etag != etag:
+        raise ContentChangedError(f"Expected ETag {etag}, got {response_etag}")
+    if status == 200:
+        if start == 0 and total_size is not None and end == total_size:
+            return
+        raise RangeResponseError(f"Expected 206 for bytes {start}-{end - 1}, got 200")
+    if status != 206:
+        raise RangeResponseError(f"Expected 206 for bytes {start}-{end - 1}, got {status}")
+    match = _CONTENT_RANGE_PATTERN.match(headers.get("Content-Range", "").strip())
+    if match is None:
+        raise RangeResponseError(f"Invalid Content-Range {headers.get('Content-Range')!r}")
+    first, last, total = match.groups()
+    if int(first) != start or int(last) != end - 1:
+        raise RangeResponseError(f"Requested bytes {start}-{end - 1}, got {first}-{last}")
+    if total_size is not None and total != "*" and int(total) != total_size:
+        raise RangeResponseError(f"Remote file size changed from {total_size} to {total}")
+
+
+def http_status(exc):
+    """返回 HTTP 错误（requests 或 aiohttp）的状态码，其他异常返回 None。"""
+    if isinstance(exc, requests.exceptions.HTTPError):
+        return exc.response.status_code if exc.response is not None else None
+    # 只有已经导入 aiohttp 时才可能出现它的异常
+    aiohttp = sys.modules.get("aiohttp")
+    if aiohttp is not None and isinstance(exc, aiohttp.ClientResponseError):
+        return exc.status
+    return None
+
+
+def is_retryable(exc):
+    """网络错误、超时、5xx 和 429 等可以重试；4xx、校验失败和本地错误（如磁盘写满）不重试。"""
+    if isinstance(exc, RetryableError):
+        return True
+    status = http_status(exc)
+    if status is not None:
+        return status in RETRY_STATUS_CODES
+    if isinstance(exc, requests.exceptions.HTTPError):
+        return True
+    if isinstance(
+        exc,
+        (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+            ConnectionError,
+            asyncio.TimeoutError,
+        ),
+    ):
+        return True
+    aiohttp = sys.modules.get("aiohttp")
+    return aiohttp is not None and isinstance(exc, aiohttp.ClientError)
+
+
+def _retry_after(exc):
+    # 429/503 响应中的 Retry-After（秒）
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or getattr(exc, "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After", 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+class RetryBudget:
+    """一次传输（如一个文件的所有范围）共享的重试次数上限。"""
+
+    def __init__(self, budget):
+        self.remaining = budget
+        self.lock = threading.Lock()
+
+    def consume(self):
+        with self.lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+class RetryPolicy:
+    """
+    指数退避加随机抖动的重试策略。
+
+    每次只重试失败的那一次请求（一个字节范围或一个上传分块），而不是整个文件。
+    重试前取得了进展（如又写入了一部分数据）时重新计算连续失败次数，
+    因此长时间传输中偶尔断开的连接不会耗尽重试次数，总次数由 RetryBudget 限制。
+    """
+
+    def __init__(
+        self, max_retries=RETRY_TIMES, backoff=RETRY_BACKOFF, max_backoff=RETRY_MAX_BACKOFF, budget=RETRY_BUDGET
+    ):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget = budget
+
+    def with_max_retries(self, max_retries):
+        return RetryPolicy(max_retries, self.backoff, self.max_backoff, self.budget)
+
+    def new_budget(self):
+        return RetryBudget(self.budget)
+
+    def delay(self, attempt, exc=None):
+        # full jitter：在 [0, 退避上限] 之间随机，避免多个连接同时重试
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+        if exc is not None:
+            delay = max(delay, min(self.max_backoff, _retry_after(exc)))
+        return delay
+
+    def _next_delay(self, exc, attempt, budget, description):
+        if not is_retryable(exc) or attempt >= self.max_retries:
+            return None
+        if budget is not None and not budget.consume():
+            log(f"Retry budget exhausted for {description}.", level="warning")
+            return None
+        delay = self.delay(attempt, exc)
+        emit(
+            RETRY,
+            description=description,
+            error=str(exc),
+            attempt=attempt + 1,
+            max_retries=self.max_retries,
+            delay=delay,
+            status=http_status(exc),
+        )
+        return delay
+
+    def call(self, func, *args, budget=None, progress=None, description="request", **kwargs):
+        """
+        调用 func，失败时按策略重试。progress 是可选的无参函数，返回值变化表示上一次调用取得了进展。
+        """
+        attempt = 0
+        position = progress() if progress else None
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if progress is not None and progress() != position:
+                    position = progress()
+                    attempt = 0
+                delay = self._next_delay(e, attempt, budget, description)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    async def acall(self, func, *args, budget=None, progress=None, description="request", **kwargs):
+        """call 的协程版本，func 为协程函数。"""
+        attempt = 0
+        position = progress() if progress else None
+        while True:
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                if progress is not None and progress() != position:
+                    position = progress()
+                    attempt = 0
+                delay = self._next_delay(e, attempt, budget, description)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+_retry_policy = RetryPolicy()
+
+
+def get_retry_policy():
+    return _retry_policy
+
+
+def configure_retry(
+    max_retries=RETRY_TIMES, backoff=RETRY_BACKOFF, max_backoff=RETRY_MAX_BACKOFF, budget=RETRY_BUDGET
+):
+    """
+    configure_retry 设置下载、上传失败时的重试策略
+    -----------------------------------------------
+
+    连接中断、超时或服务端返回5xx时，只重试失败的字节范围（或上传分块），等待时间按指数增长并带有随机抖动。
+    4xx 错误和校验失败不会重试。
+
+    参数：
+    ::::::::::
+    - **max_retries** - 同一范围连续失败的最大重试次数，默认为3；重试前取得进展时重新计数
+    - **backoff** - 第一次重试前的等待上限（秒），之后每次翻倍，默认为1
+    - **max_backoff** - 单次等待的上限（秒），默认为30
+    - **budget** - 单个文件所有范围加起来的重试次数上限，默认为50
+    """
+    global _retry_policy
+    _retry_policy = RetryPolicy(max_retries, backoff, max_backoff, budget)
@@ -0,0 +1,119 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .constants import HEADERS, POOL_CONNECTIONS, POOL_MAXSIZE
+
+
+logger = logging.getLogger(__name__)
+
+_session = None
+_session_lock = threading.Lock()
+_pool_connections = POOL_CONNECTIONS
+_pool_maxsize = POOL_MAXSIZE
+
+
+def _mount_adapter(session):
+    # pool_block=True：连接数达到上限时等待空闲连接，而不是临时新建再丢弃
+    adapter = HTTPAdapter(pool_connections=_pool_connections, pool_maxsize=_pool_maxsize, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+
+def _build_session():
+    session = requests.Session()
+    _mount_adapter(session)
+    session.headers.update({"Connection": "keep-alive"})
+    return session
+
+
+def get_session():
+    """
+    get_session 获取进程内共享的 HTTP 会话
+    -----------------------------------------
+
+    访问 wisemodel hub 的 API 请求、元数据探测和默认的 requests 传输后端都通过此会话发出，复用 keep-alive 连接，
+    避免每个请求重新进行 TCP 和 TLS 握手。会话可在多线程间共享。
+
+    返回值：
+    ::::::::::
+        requests.Session: 共享会话
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def configure_session(pool_connections=None, pool_maxsize=None):
+    """
+    configure_session 配置共享 HTTP 会话的连接池
+    -----------------------------------------------
+
+    修改后会关闭旧会话，下一次请求时按新配置重建。
+
+    参数：
+    ::::::::::
+    - **pool_connections** - 缓存连接池的主机数量，默认为 POOL_CONNECTIONS
+    - **pool_maxsize** - 每个主机的最大连接数，默认为 POOL_MAXSIZE
+    """
+    global _session, _pool_connections, _pool_maxsize
+    with _session_lock:
+        if pool_connections is not None:
+            _pool_connections = pool_connections
+        if pool_maxsize is not None:
+            _pool_maxsize = pool_maxsize
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def ensure_pool_maxsize(pool_maxsize):
+    """
+    确保每个主机的连接池至少能容纳 pool_maxsize 个连接。
+
+    只会扩大连接池；已有会话会换上新的适配器并关闭旧适配器。旧连接池中的空闲连接随即关闭，
+    正在使用的连接在对应请求读取完毕后关闭，不会中断进行中的请求。
+    """
+    global _pool_maxsize
+    with _session_lock:
+        if pool_maxsize <= _pool_maxsize:
+            return
+        _pool_maxsize = pool_maxsize
+        if _session is not None:
+            old_adapter = _session.get_adapter("https://")
+            _mount_adapter(_session)
+            old_adapter.close()
+
+
+def prewarm_connections(url, num_connections):
+    """
+    prewarm_connections 预先建立到目标主机的连接
+
+    并发发送 HEAD 请求，使连接池中预先保留 num_connections 个已完成握手的连接，
+    供随后的分块并发下载直接复用。预热失败不影响下载。
+    """
+    session = get_session()
+    num_connections = min(num_connections, _pool_maxsize)
+    # 不要预热超过下载连接数上限的连接，多出来的连接用不上（rate_limit 间接依赖本模块，在此处导入）
+    from .rate_limit import get_limiter
+
+    max_connections = get_limiter("download").max_connections
+    if max_connections is not None:
+        num_connections = min(num_connections, max_connections)
+    if num_connections <= 1:
+        return
+
+    def _head(_):
+        try:
+            session.head(url, headers=HEADERS, allow_redirects=True).close()
+        except requests.exceptions.RequestException as e:
+            logger.debug(f"Failed to prewarm connection to {url}: {e}")
+
+    with ThreadPoolExecutor(max_workers=num_connections) as executor:
+        list(executor.map(_head, range(num_connections)))
@@ -0,0 +1,145 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .constants import LINK_MODE, MAX_WORKERS, RETRY_TIMES
+from .download_with_resume import GitFileDownload
+from .events import log
+from .integrity import IntegrityError
+from .session import ensure_pool_maxsize
+from .transport import get_transport
+
+
+class _FileJob:
+    def __init__(self, name, size, url, start, finalize=None, close=None, key=None):
+        self.name = name
+        self.key = name if key is None else key
+        self.size = size
+        self.url = url
+        self.start = start
+        self.finalize = finalize
+        self.close = close
+        self.remaining = 0
+        self.restarts = 0
+        self.failed = False
+        self.error = None
+
+
+class SnapshotScheduler:
+    """
+    在一个全局线程池中并发下载多个文件。
+
+    小文件作为单个任务提交，大文件的每个分块作为独立任务提交，二者共享同一个
+    max_workers 连接预算。文件按大小从大到小排队，最大的文件最先开始，缩短收尾时间。
+    小文件通过 transport 下载，加入的大文件也应使用同一个 transport。
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, retry_times=RETRY_TIMES, transport=None):
+        self.max_workers = max_workers
+        self.retry_times = retry_times
+        self.transport = get_transport(transport)
+        self.jobs = []
+
+    def add_lfs_download(self, downloader, key=None):
+        def start():
+            downloader.prepare()
+            return downloader.tasks()
+
+        size = downloader.metadata.size if downloader.metadata is not None else 0
+        self.jobs.append(
+            _FileJob(downloader.file_name, size, downloader.url, start, downloader.finalize, downloader.close, key)
+        )
+
+    def add_file_download(
+        self,
+        repo_id,
+        file_name,
+        revision="main",
+        local_dir=None,
+        force_download=False,
+        metadata=None,
+        link_mode=LINK_MODE,
+        key=None,
+    ):
+        downloader = GitFileDownload(repo_id, self.transport)
+
+        def start():
+            return [(downloader.download_file, file_name, revision, local_dir, force_download, metadata, link_mode)]
+
+        size = metadata.size if metadata is not None else 0
+        self.jobs.append(_FileJob(file_name, size, None, start, key=key))
+
+    def run(self):
+        """
+        执行所有下载任务，返回下载失败的文件名（添加任务时指定了 key 的为 key）列表。
+        """
+        # 大文件先开始，避免最后只剩一个大分片在下载
+        self.jobs.sort(key=lambda job: job.size, reverse=True)
+        ensure_pool_maxsize(self.max_workers)
+        if self.jobs and self.jobs[0].url:
+            self.transport.prewarm(self.jobs[0].url, self.max_workers)
+
+        failed = []
+        pending = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+
+            def submit(job, task, attempts=0):
+                pending[executor.submit(*task)] = (job, task, attempts)
+
+            # 准备（预分配空间、读取断点状态、探测镜像）也在线程池中进行，与已开始的传输重叠
+            for job in self.jobs:
+                submit(job, (job.start,))
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job, task, attempts = pending.pop(future)
+                    is_start = task[0] == job.start
+                    is_finalize = task[0] == job.finalize
+                    try:
+                        tasks = future.result()
+                    except Exception as e:
+                        log(f"Failed to download {job.name}: {e}", level="warning")
+                        # 整个文件的校验失败时已下载的内容已被丢弃，重新准备并从头下载
+                        if is_finalize and isinstance(e, IntegrityError) and job.restarts < self.retry_times:
+                            job.restarts += 1
+                            log(f"Retrying {job.restarts}...")
+                            submit(job, (job.start,))
+                            continue
+                        # 网络错误已经在任务内部按范围重试过，只有校验失败才需要重新下载整个文件
+                        if (
+                            not is_start
+                            and not is_finalize
+                            and isinstance(e, IntegrityError)
+                            and attempts < self.retry_times
+                        ):
+                            log(f"Retrying {attempts + 1}...")
+                            submit(job, task, attempts + 1)
+                            continue
+                        log(
+                            f"Failed to download {job.name} after {max(attempts, job.restarts)} retries.",
+                            level="warning",
+                        )
+                        if not job.failed:
+                            job.failed = True
+                            job.error = e
+                            failed.append(job.key)
+                        if is_start:
+                            # 准备失败（如磁盘空间不足）只影响这个文件，其他文件继续下载
+                            if job.close:
+                                job.close(e)
+                            continue
+                    else:
+                        if is_start:
+                            job.remaining = len(tasks)
+                            for task in tasks:
+                                submit(job, task)
+                            if not tasks and job.finalize:
+                                submit(job, (job.finalize,))
+                            continue
+                    if is_finalize:
+                        continue
+                    job.remaining -= 1
+                    if job.remaining == 0 and not job.failed and job.finalize:
+                        submit(job, (job.finalize,))
+                    elif job.remaining == 0 and job.failed and job.close:
+                        job.close(job.error)
+        return failed
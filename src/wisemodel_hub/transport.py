@@ -0,0 +1,220 @@
+import contextlib
+import json
+import logging
+import threading
+
+import requests
+
+from .constants import HEADERS, POOL_MAXSIZE, TRANSPORT
+from .session import get_session, prewarm_connections
+
+
+logger = logging.getLogger(__name__)
+
+_transports = {}
+_transports_lock = threading.Lock()
+_default_transport = TRANSPORT
+
+
+def _import_httpx():
+    try:
+        import httpx  # type: ignore
+    except ImportError:
+        raise ImportError(
+            "The http2 transport of wisemodel_hub needs the `httpx` module: `pip install wisemodel_hub[http2]`."
+        )
+    return httpx
+
+
+class Transport:
+    """
+    下载、上传代码发送 HTTP 请求的接口。
+
+    request 返回与 requests.Response 接口相同的响应（status_code、headers、iter_content、raise_for_status、json），
+    出错时抛出 requests 的异常，因此重试、镜像切换和校验逻辑与具体的后端无关。
+    """
+
+    name = None
+
+    def request(self, method, url, **kwargs):
+        raise NotImplementedError
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        kwargs.setdefault("allow_redirects", False)
+        return self.request("HEAD", url, **kwargs)
+
+    def prewarm(self, url, num_connections):
+        """在并发请求之前预先建立连接，默认什么都不做。"""
+
+    def close(self):
+        pass
+
+
+class RequestsTransport(Transport):
+    """通过 requests 共享会话（HTTP/1.1）发送请求，每个并发请求占用一个连接。"""
+
+    name = "requests"
+
+    def request(self, method, url, **kwargs):
+        return get_session().request(method, url, **kwargs)
+
+    def prewarm(self, url, num_connections):
+        prewarm_connections(url, num_connections)
+
+
+@contextlib.contextmanager
+def _translate_errors():
+    # 转换为 requests 的异常，is_retryable 等判断对两种后端一致
+    httpx = _import_httpx()
+    try:
+        yield
+    except httpx.TimeoutException as e:
+        raise requests.exceptions.Timeout(str(e)) from e
+    except httpx.TransportError as e:
+        raise requests.exceptions.ConnectionError(str(e)) from e
+
+
+class _HTTPXResponse:
+    """把 httpx 的响应包装为下载、上传代码使用的 requests.Response 接口。"""
+
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.reason = response.reason_phrase
+        self.url = str(response.url)
+        self.http_version = response.http_version
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def content(self):
+        with _translate_errors():
+            return self._response.read()
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size=1):
+        with _translate_errors():
+            yield from self._response.iter_bytes(chunk_size)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(
+                f"{self.status_code} Error: {self.reason} for url: {self.url}", response=self
+            )
+
+    def close(self):
+        self._response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class HTTP2Transport(Transport):
+    """
+    通过 httpx 以 HTTP/2 发送请求。
+
+    同一主机的并发请求作为多路复用的流共用少数几个连接，大文件的多个范围和上传的多个分块不再各占一个连接；
+    服务端不支持 HTTP/2（如未使用 TLS）时自动退回 HTTP/1.1。
+    """
+
+    name = "http2"
+
+    def __init__(self, max_connections=POOL_MAXSIZE):
+        httpx = _import_httpx()
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        # 与 requests 一致，不设置超时；需要时由调用方按请求传入 timeout
+        self.client = httpx.Client(http2=True, limits=limits, timeout=None)
+        # httpx 以 INFO 级别记录每个请求，大文件的每个范围都会输出一行
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    def request(self, method, url, stream=False, allow_redirects=True, data=None, **kwargs):
+        if isinstance(data, (str, bytes)):
+            kwargs["content"] = data
+        elif data is not None:
+            kwargs["data"] = data
+        with _translate_errors():
+            request = self.client.build_request(method, url, **kwargs)
+            response = self.client.send(request, stream=stream, follow_redirects=allow_redirects)
+        return _HTTPXResponse(response)
+
+    def prewarm(self, url, num_connections):
+        # 一个连接就能承载所有并发请求，只需提前完成握手和协议协商
+        try:
+            self.head(url, headers=HEADERS, allow_redirects=True).close()
+        except requests.exceptions.RequestException as e:
+            logger.debug(f"Failed to prewarm connection to {url}: {e}")
+
+    def close(self):
+        self.client.close()
+
+
+_BACKENDS = {
+    RequestsTransport.name: RequestsTransport,
+    HTTP2Transport.name: HTTP2Transport,
+}
+
+
+def _check_name(name):
+    if name not in _BACKENDS:
+        raise ValueError(f"Invalid transport {name!r}, expected one of {sorted(_BACKENDS)}")
+
+
+def get_transport(transport=None):
+    """
+    get_transport 获取传输后端
+    ----------------------------
+
+    返回进程内共享的传输后端实例，大文件的范围下载、小文件下载和上传分块都通过它发送请求。
+
+    参数：
+    ::::::::::
+    - **transport** - 后端名称：'requests' 或 'http2'，也可以是 Transport 实例；
+      默认为None，即使用 configure_transport 或环境变量 WM_TRANSPORT 设置的后端
+
+    返回值：
+    ::::::::::
+        Transport: 传输后端
+    """
+    if isinstance(transport, Transport):
+        return transport
+    name = transport or _default_transport
+    _check_name(name)
+    with _transports_lock:
+        if name not in _transports:
+            _transports[name] = _BACKENDS[name]()
+        return _transports[name]
+
+
+def configure_transport(transport="requests"):
+    """
+    configure_transport 设置默认的传输后端
+    ----------------------------------------
+
+    'requests' 通过 HTTP/1.1 发送请求，每个并发的范围或分块占用一个连接；
+    'http2' 通过 httpx 以 HTTP/2 多路复用少数几个连接，需要 `pip install wisemodel_hub[http2]`。
+    也可以通过环境变量 WM_TRANSPORT 设置，或在各下载、上传函数中用 transport 参数单独指定。
+
+    参数：
+    ::::::::::
+    - **transport** - 后端名称：'requests' 或 'http2'，默认为'requests'
+    """
+    global _default_transport
+    _check_name(transport)
+    if transport == HTTP2Transport.name:
+        # 尽早提示缺少依赖，而不是在第一次下载时
+        _import_httpx()
+    _default_transport = transport
@@ -25,6 +25,12 @@ def wm_upload():
     parser.add_argument("--repo_dir", type=str, default=None, help="远程仓库目录。默认值：None（上传到仓库根目录），如果file_path，此参数无效")
     parser.add_argument("--use_git", action="store_true", help="使用 git 上传。")
     parser.add_argument("--workers", type=int, default=5, help="上传时的并发线程数，默认值：5")
+    parser.add_argument(
+        "--transport",
+        choices=["requests", "http2"],
+        default=None,
+        help="传输后端，http2 多路复用少数几个连接（需要 httpx）。默认值：环境变量 WM_TRANSPORT 或 requests",
+    )
 
 
     args = parser.parse_args()
@@ -58,6 +64,7 @@ def wm_upload():
                 timeout=args.timeout,
                 resumable=resumable,
                 workers=args.workers,
+                transport=args.transport,
             )
         else:
             upload_file(
@@ -70,6 +77,7 @@ def wm_upload():
                 retries=args.retries,
                 timeout=args.timeout,
                 repo_dir=args.repo_dir,
+                transport=args.transport,
             )
 
 
@@ -2,11 +2,14 @@ import concurrent.futures
 import os
 
 import requests
-from tqdm import tqdm
 
 from .auth import get_local_token, login, login_required, notebook_login
 from .constants import WM_URL_ADDFILES, WM_URL_BASE, WM_URL_CHECK, WM_URL_MERGE, WM_URL_UPLOAD
+from .events import Transfer, log
 from .git_uploader import GitUploader
+from .rate_limit import get_limiter
+from .retry import RetryableError, get_retry_policy
+from .transport import get_transport
 from .utils import (
     calculate_md5,
     get_filtered_curr_paths,
@@ -17,6 +20,18 @@ from .utils import (
 )
 
 
+def _upload_chunk(transport, upload_data, files, timeout, headers, size):
+    limiter = get_limiter("upload")
+    # 分块整体发送，按块大小取令牌
+    limiter.throttle(size)
+    with limiter.connection():
+        response = transport.post(WM_URL_UPLOAD, data=upload_data, files=files, timeout=timeout, headers=headers)
+    response.raise_for_status()
+    upload_response = response.json()
+    if upload_response["code"] != 0:
+        raise RetryableError(f"分块 {upload_data['chunk']} 上传失败: {upload_response.get('message')}")
+
+
 @login_required
 def upload_file(
     file_path,
@@ -27,7 +42,8 @@ def upload_file(
     chunk_size=5 * 1024 * 1024,
     retries=3,
     timeout=None,
-    repo_dir=None
+    repo_dir=None,
+    transport=None,
 ):
     """
     upload_file 上传单个文件
@@ -43,9 +59,11 @@ def upload_file(
     - **branch** - wisemodel使用git管理仓库，此参数是git分支名
     - **commit_message** - 仓库提交信息
     - **chunk_size** - 上传时使用的分段大小，默认为5MB
-    - **retries** - 上传失败重试次数
+    - **retries** - 每个分块上传失败时的重试次数，重试用尽后抛出异常
     - **timeout** - 调用主站api的超时时间，默认为None
     - **repo_dir** - 远程仓库的相对路径，默认为None，即上传到仓库根目录
+    - **transport** - 传输后端，可选值：'requests'、'http2'（多个文件的分块多路复用少数几个连接，需要 httpx）；
+      默认为None，即由 configure_transport 或环境变量 WM_TRANSPORT 决定
     """
     if not is_branch_exist(repo_id, repo_type, branch):
         raise ValueError(f"仓库 {repo_id} 不存在分支 {branch}")
@@ -53,12 +71,13 @@ def upload_file(
     file_name = os.path.basename(file_path)
     file_md5 = calculate_md5(file_path)
     remote_project_url = f"{WM_URL_BASE}/{repo_type}/{repo_id}"
+    transport = get_transport(transport)
 
     # Step 1: Check the file chunk status
     check_data = {"fileName": file_name, "fileMd5": file_md5, "dir": "", "project_path": remote_project_url}
 
     headers = {"Authorization": f"Bearer {token}"}
-    response = requests.post(WM_URL_CHECK, data=check_data, headers=headers)
+    response = transport.post(WM_URL_CHECK, data=check_data, headers=headers)
     check_response = response.json()
 
     # 如果提示token失败，则重新登录
@@ -71,7 +90,7 @@ def upload_file(
         headers = {"Authorization": f"Bearer {token}"}
 
     if check_response["code"] != 0:
-        print(f"文件检查失败: {check_response['message']}")
+        log(f"文件检查失败: {check_response['message']}", level="warning")
         return
 
     existing_chunks = check_response["data"]["chunks"]
@@ -81,32 +100,34 @@ def upload_file(
     # Step 2: Upload file chunks
     file_size = os.path.getsize(file_path)
     num_chunks = (file_size + chunk_size - 1) // chunk_size  # 计算块的数量
+    policy = get_retry_policy().with_max_retries(retries)
 
-    with open(file_path, "rb") as f, tqdm(total=file_size, unit="B", unit_scale=True, desc=file_name) as pbar:
+    with open(file_path, "rb") as f, Transfer(file_name, file_size, direction="upload") as transfer:
         for i in range(num_chunks):
             if str(i) in existing_chunks:
                 f.seek(chunk_size, os.SEEK_CUR)
-                pbar.update(chunk_size)  # 跳过已存在的块，并更新进度条
+                transfer.update(chunk_size)  # 跳过已存在的块，并更新进度
                 continue
 
             chunk_data = f.read(chunk_size)
             upload_data = {"md5": file_md5, "dir": "", "chunk": i}
             files = {"file": (file_name, chunk_data)}
 
-            for _ in range(retries):
-                try:
-                    response = requests.post(
-                        WM_URL_UPLOAD, data=upload_data, files=files, timeout=timeout, headers=headers
-                    )
-                    upload_response = response.json()
-                    if upload_response["code"] == 0:
-                        pbar.update(len(chunk_data))
-                        break
-                except requests.exceptions.RequestException as e:
-                    print(f"Retry {i} due to {str(e)}")
+            # 只重试失败的分块，等待时间按指数退避
+            policy.call(
+                _upload_chunk,
+                transport,
+                upload_data,
+                files,
+                timeout,
+                headers,
+                len(chunk_data),
+                description=f"Upload of chunk {i} of {file_name}",
+            )
+            transfer.update(len(chunk_data))
 
     # Step 3: Check again the file chunk status after uploading all chunks
-    response = requests.post(WM_URL_CHECK, data=check_data, headers=headers)
+    response = transport.post(WM_URL_CHECK, data=check_data, headers=headers)
     check_response = response.json()
 
     if (
@@ -114,21 +135,21 @@ def upload_file(
         or "resultCode" in check_response["data"]
         and check_response["data"]["resultCode"] != num_chunks
     ):
-        print(f"文件检查失败或文件块数量不匹配: {check_response['message']}")
+        log(f"文件检查失败或文件块数量不匹配: {check_response['message']}", level="warning")
         return
-    print("所有文件块已成功上传并验证")
+    log("所有文件块已成功上传并验证")
 
     # Step 4: Merge file chunks
     merge_data = {"fileName": file_name, "fileMd5": file_md5, "dir": "", "project_path": remote_project_url}
-    response = requests.post(WM_URL_MERGE, data=merge_data, headers=headers)
+    response = transport.post(WM_URL_MERGE, data=merge_data, headers=headers)
     merge_response = response.json()
 
     if merge_response["code"] != 0:
-        print(f"文件合并失败: {merge_response['message']}")
+        log(f"文件合并失败: {merge_response['message']}", level="warning")
         return
 
     merged_file_path = merge_response["data"]["filepath"]
-    print(f"文件合并成功: {merged_file_path}")
+    log(f"文件合并成功: {merged_file_path}")
 
     # Step 5: Add merged file to repository
     if not repo_dir:
@@ -141,18 +162,17 @@ def upload_file(
         "wangpan_url": "",
         "git_folder": repo_dir,
     }
-    print(f"addfiles_data: {addfiles_data}")
-    print(f"headers: {headers}")
+    log(f"addfiles_data: {addfiles_data}", level="debug")
     headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-    response = requests.post(WM_URL_ADDFILES, json=addfiles_data, headers=headers)
+    response = transport.post(WM_URL_ADDFILES, json=addfiles_data, headers=headers)
     addfiles_response = response.json()
-    print(f"addfiles_response: {addfiles_response}")
+    log(f"addfiles_response: {addfiles_response}", level="debug")
 
     if addfiles_response["code"] != 0:
-        print(f"添加文件到仓库失败: {addfiles_response['message']}")
+        log(f"添加文件到仓库失败: {addfiles_response['message']}", level="warning")
         return
 
-    print(f"{file_name},文件上传并添加到仓库成功")
+    log(f"{file_name},文件上传并添加到仓库成功")
 
 
 @login_required
@@ -168,6 +188,7 @@ def push_to_hub(
     timeout=None,
     resumable: bool = True,
     workers: int = 5,
+    transport=None,
 ):
     """
     push_to_hub 上传文件夹到主站仓库
@@ -184,19 +205,31 @@ def push_to_hub(
     - **branch** - wisemodel使用git管理仓库，此参数是git分支名
     - **commit_message** - 仓库提交信息
     - **chunk_size** - 上传时使用的分段大小，默认为5MB
-    - **retries** - 上传失败重试次数
+    - **retries** - 每个分块上传失败时的重试次数，重试用尽后抛出异常
     - **timeout** - 调用主站api的超时时间，默认为None
     - **resumable** - 是否开启文件夹级别的断点续传。默认为True。
+    - **transport** - 传输后端，默认为None，参见 upload_file
     抛出异常：
     ::::::::::
     ValueError - dir_path 路径不是文件夹
     """
     if resumable:
-        print("📂 断点续传模式已开启：将检查服务端已存在的文件，跳过重复上传。")
+        log("📂 断点续传模式已开启：将检查服务端已存在的文件，跳过重复上传。")
     else:
-        print("📤 强制完整上传模式：将上传所有文件，忽略服务端状态。")
+        log("📤 强制完整上传模式：将上传所有文件，忽略服务端状态。")
     if not is_branch_exist(repo_id, repo_type, branch):
         raise ValueError(f"仓库 {repo_id} 不存在分支 {branch}")
+    files_to_upload = _collect_files_to_upload(dir_path, repo_id, repo_type, pattern, branch, resumable)
+    if not files_to_upload:
+        return
+    def upload_wrapper(args):
+        rel_path, full_path = args[0], args[1]
+        return upload_file(full_path, repo_id, repo_type, branch, commit_message, chunk_size, retries, timeout, repo_dir=os.path.dirname(rel_path), transport=transport)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(upload_wrapper, files_to_upload))
+
+
+def _collect_files_to_upload(dir_path, repo_id, repo_type, pattern, branch, resumable):
     if not os.path.isdir(dir_path):
         raise ValueError(f"指定路径 '{dir_path}' 不是文件夹")
     all_local_files = get_filtered_paths(dir_path, pattern)
@@ -206,12 +239,12 @@ def push_to_hub(
 
      # --- Step 0: 文件夹级别检查 ---
     if resumable:
-        print("🔍 正在检查服务端已存在的文件...")
+        log("🔍 正在检查服务端已存在的文件...")
         try:
             for root, _, _ in os.walk(dir_path):
-                  print(f"检查目录: {root}")
+                  log(f"检查目录: {root}", level="debug")
                   if root.find(".git")>=0 :
-                        print ("跳过.git目录")
+                        log("跳过.git目录")
                         continue
 #                  if root.find(".cache")>=0 :
 #                        print ("跳过.cache目录")
@@ -226,46 +259,37 @@ def push_to_hub(
 
                   repo_list=get_repo_file_list(repo_id, repo_type,gitPath,branch)
                   if repo_list:
-                        print(f"📋 发现服务端已存在 {len(repo_list)} 个文件。")
+                        log(f"📋 发现服务端已存在 {len(repo_list)} 个文件。")
                         # --- Step 1: 本地与服务端文件对比 ---
                         for rel_path, full_path in all_local_files:
                             if rel_path in repo_list:
-                                print(f"🗂️ 跳过已存在的文件: {rel_path}")
+                                log(f"🗂️ 跳过已存在的文件: {rel_path}", level="debug")
                                 skipped_count += 1
                             else:
                                 files_to_upload.append((rel_path, full_path))
                   else:
-                        print("无法获取服务端文件列表，将上传所有文件")
+                        log("无法获取服务端文件列表，将上传所有文件", level="warning")
                         files_to_upload.extend(all_local_files or [])
-                        print(f"files_to_upload: {len(files_to_upload)}")
+                        log(f"files_to_upload: {len(files_to_upload)}", level="debug")
 
         except requests.exceptions.RequestException as e:
-            print(f"⚠️ 检查服务端文件列表时网络出错，将上传所有文件。原因: {e}")
+            log(f"⚠️ 检查服务端文件列表时网络出错，将上传所有文件。原因: {e}", level="warning")
             files_to_upload =  all_local_files # 回退到上传所有文件
 
     else:
-        print("📤 强制完整上传模式：将上传所有文件，忽略服务端状态。")
+        log("📤 强制完整上传模式：将上传所有文件，忽略服务端状态。")
         files_to_upload = all_local_files
 
     # --- 总结与准备 ---
     total_files = len(all_local_files)
     if skipped_count > 0:
-        print(f"\n--- 文件检查完毕: 共 {total_files} 个文件，已跳过 {skipped_count} 个，准备上传剩余的 {len(files_to_upload)} 个文件 ---")
+        log(f"\n--- 文件检查完毕: 共 {total_files} 个文件，已跳过 {skipped_count} 个，准备上传剩余的 {len(files_to_upload)} 个文件 ---")
     elif files_to_upload:
-        print(f"\n--- 准备上传全部 {len(files_to_upload)} 个文件 ---")
+        log(f"\n--- 准备上传全部 {len(files_to_upload)} 个文件 ---")
     else:
-        print("\n🎉 所有文件都已存在于服务端，无需上传。")
-        return
-    #print(files_to_upload)
-    def upload_wrapper(args):
-        rel_path, full_path = args[0], args[1]
-        return upload_file(full_path, repo_id, repo_type, branch, commit_message, chunk_size, retries, timeout, repo_dir=os.path.dirname(rel_path))
+        log("\n🎉 所有文件都已存在于服务端，无需上传。")
     # 去掉非法的文件路径
-    files_to_upload = [item for item in files_to_upload if item and len(item) == 2 and item[0] and item[1]]
-    for rel_path, full_path in files_to_upload:
-        # upload_file(full_path, repo_id, repo_type, branch, commit_message, chunk_size, retries, timeout, repo_dir=os.path.dirname(rel_path))
-        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-            list(executor.map(upload_wrapper, files_to_upload))
+    return [item for item in files_to_upload if item and len(item) == 2 and item[0] and item[1]]
 
 
 def upload_with_git(
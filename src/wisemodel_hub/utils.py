@@ -3,15 +3,24 @@ import hashlib
 import json
 import logging
 import os
+import re
 import subprocess
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
 
 import gitlab
 import requests
 
 from .auth import get_local_token, login, login_required, notebook_login
+from .cache import get_snapshot_path, snapshot_matches
+from .cache_index import get_cache_index
 from .constants import (
-    CACHE_PATH,
     HEADERS,
+    MAX_WORKERS,
+    METADATA_CACHE_TTL,
     TEN_MB,
     WM_ENDPOINT,
     WM_GITLAB_ENDPOINT,
@@ -19,51 +28,233 @@ from .constants import (
     WM_URL_LIST_BRANCH,
     WM_URL_LIST_FILES,
 )
+from .session import get_session
 
 
 logger = logging.getLogger(__name__)
 
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
 
-# Get file names from GitLab repo based on repo id
-def get_file_names(repo_id, path="", revision="main"):
-    gl = gitlab.Gitlab(WM_GITLAB_ENDPOINT)
-    project = gl.projects.get(repo_id)
-    files = []
-    # 遍历文件树
-    items = project.repository_tree(path=path, ref=revision, all=True)
-    for item in items:
-        if item["type"] == "tree":  # 如果是目录，递归获取子目录内容
-            files.extend(get_file_names(repo_id, path=item["path"], revision=revision))
-        elif item["type"] == "blob":  # 如果是文件，添加到文件列表
-            files.append(item["path"])
 
+RepoFile = namedtuple("RepoFile", ["path", "blob_id", "size"])
+
+# {private_token: gitlab.Gitlab}，每个进程、每个 token 只创建一个客户端，复用其中的连接
+_gitlab_clients = {}
+_gitlab_clients_lock = threading.Lock()
+
+
+def get_gitlab_client(private_token=None):
+    """返回进程内共享的 GitLab 客户端。"""
+    with _gitlab_clients_lock:
+        client = _gitlab_clients.get(private_token)
+        if client is None:
+            client = _gitlab_clients[private_token] = gitlab.Gitlab(WM_GITLAB_ENDPOINT, private_token=private_token)
+        return client
+
+
+def list_repo_tree(repo_id, revision="main", path="", private_token=None):
+    """
+    一次递归列出 path 下的所有文件，返回 [RepoFile(path, blob_id, None), ...]。
+
+    GitLab 的目录树接口不返回文件大小，size 为 None。
+    """
+    project = get_gitlab_client(private_token).projects.get(repo_id, lazy=True)
+    items = project.repository_tree(path=path, ref=revision, recursive=True, all=True, per_page=100)
+    return [RepoFile(item["path"], item["id"], None) for item in items if item["type"] == "blob"]
+
+
+def _fill_sizes(repo_id, files, revision, max_workers):
+    # 目录树中没有大小，通过并发的 HEAD 请求补上
+    def fill(file):
+        if file.size is not None:
+            return file
+        return file._replace(size=get_remote_file_metadata(repo_id, file.path, revision).size)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(files)))) as executor:
+        return list(executor.map(fill, files))
+
+
+def list_repo_files(repo_id, revision="main", commit=None, sizes=False, max_workers=MAX_WORKERS):
+    """
+    list_repo_files 列出仓库中的全部文件
+    ------------------------------------
+
+    一次递归请求取得整个目录树，结果按 commit 缓存在本地索引中，同一 commit 不会再次请求。
+
+    参数：
+    ::::::::::
+    - **repo_id** - 仓库ID
+    - **revision** - 分支名、标签或 commit，默认为"main"
+    - **commit** - revision 当前指向的 commit，默认为None，即向服务端查询
+    - **sizes** - 是否返回文件大小，默认为False；目录树中没有大小，需要对每个文件发送一个 HEAD 请求，结果同样会被缓存
+    - **max_workers** - 查询文件大小时的并发请求数，默认为32
+
+    返回值：
+    ::::::::::
+        list: RepoFile(path, blob_id, size) 列表，按路径排序；sizes=False 且缓存中没有大小时 size 为 None
+    """
+    if commit is None:
+        commit = get_revision_commit(repo_id, revision)
+    index = get_cache_index()
+    cached = index.get_tree(repo_id, commit) if commit else None
+    if cached is not None:
+        files = [RepoFile(*entry) for entry in cached]
+    else:
+        # 按 commit 列出，避免列表期间分支被更新
+        files = sorted(list_repo_tree(repo_id, commit or revision))
+    changed = cached is None
+    if sizes and any(file.size is None for file in files):
+        files = _fill_sizes(repo_id, files, commit or revision, max_workers)
+        changed = True
+    if commit and changed:
+        index.set_tree(repo_id, commit, files)
     return files
 
+
+def get_file_names(repo_id, path="", revision="main", commit=None):
+    """返回仓库中 path 目录下所有文件的路径。"""
+    names = [file.path for file in list_repo_files(repo_id, revision, commit=commit)]
+    path = path.strip("/")
+    if path:
+        names = [name for name in names if name.startswith(path + "/")]
+    return names
+
+
+def get_revision_commit(repo_id, revision="main"):
+    """返回分支或标签当前指向的 commit sha，查询失败时返回 None。"""
+    try:
+        project = get_gitlab_client().projects.get(repo_id, lazy=True)
+        return project.commits.get(revision).id
+    except (gitlab.exceptions.GitlabError, requests.exceptions.RequestException) as e:
+        logger.info(f"failed to resolve commit of {repo_id}@{revision}: {e}")
+        return None
+
+
+FileMetadata = namedtuple("FileMetadata", ["url", "size", "etag", "accept_ranges", "last_modified"])
+
+# 按写入顺序排列，过期的记录在最前面，写入时顺带清理
+_metadata_cache = OrderedDict()
+_metadata_cache_lock = threading.Lock()
+
+
+def get_file_url(repo_id, file_name, revision="main"):
+    return WM_ENDPOINT + f"/file-proxy/{repo_id}/-/raw/{revision}/{file_name}"
+
+
+def parse_etag(etag):
+    if not etag:
+        return None
+    if etag.startswith("W/"):
+        etag = etag[2:]
+    return etag.strip('"')
+
+
+def file_metadata_from_headers(url, status_code, headers):
+    # 206 响应（范围探测）从 Content-Range 中取总大小，其余情况取 Content-Length
+    content_range = headers.get("Content-Range", "")
+    if status_code == 206 and "/" in content_range:
+        size = int(content_range.rsplit("/", 1)[1])
+        accept_ranges = True
+    else:
+        size = int(headers.get("Content-Length", 0))
+        accept_ranges = headers.get("Accept-Ranges", "").lower() == "bytes"
+    return FileMetadata(
+        url=url,
+        size=size,
+        etag=parse_etag(headers.get("ETag")),
+        accept_ranges=accept_ranges,
+        last_modified=headers.get("Last-Modified"),
+    )
+
+
+def _fetch_file_metadata(url):
+    session = get_session()
+    # HEAD 不会让服务端打开文件读取内容；若不支持 HEAD 则退回到只取一个字节的范围请求
+    res = session.head(url, headers=HEADERS, allow_redirects=True)
+    if res.ok and "Content-Length" in res.headers:
+        return file_metadata_from_headers(url, res.status_code, res.headers)
+
+    headers = deepcopy(HEADERS)
+    headers["Range"] = "bytes=0-0"
+    with session.get(url, stream=True, headers=headers) as res:
+        res.raise_for_status()
+        return file_metadata_from_headers(url, res.status_code, res.headers)
+
+
+def get_file_metadata(url, use_cache=True):
+    """
+    获取远程文件的元数据（大小、ETag、是否支持范围请求、最后修改时间）。
+
+    结果按 url 缓存 METADATA_CACHE_TTL 秒，同一文件在一次下载过程中只探测一次。
+    use_cache=False 时强制重新探测并刷新缓存。
+    """
+    now = time.monotonic()
+    if use_cache:
+        with _metadata_cache_lock:
+            cached = _metadata_cache.get(url)
+        if cached is not None and now - cached[0] < METADATA_CACHE_TTL:
+            return cached[1]
+
+    metadata = _fetch_file_metadata(url)
+    with _metadata_cache_lock:
+        _metadata_cache[url] = (now, metadata)
+        _metadata_cache.move_to_end(url)
+        # 长时间运行的进程（如 download_many、定时 sync_snapshot）会探测大量 URL，过期的记录不再保留
+        expired_before = time.monotonic() - METADATA_CACHE_TTL
+        while _metadata_cache:
+            oldest, (probed_at, _) = next(iter(_metadata_cache.items()))
+            if probed_at >= expired_before:
+                break
+            del _metadata_cache[oldest]
+    return metadata
+
+
+def get_remote_file_metadata(repo_id, file_name, revision="main", use_cache=True):
+    return get_file_metadata(get_file_url(repo_id, file_name, revision), use_cache=use_cache)
+
+
 def get_remote_file_size(repo_id, file_name, revision="main"):
-    return get_remote_file_size_with_url(WM_ENDPOINT + f"/file-proxy/{repo_id}/-/raw/{revision}/{file_name}")
+    return get_remote_file_metadata(repo_id, file_name, revision).size
 
 
 def get_remote_file_size_with_url(url):
-    res = requests.get(url, stream=True, headers=HEADERS)
-    res.raise_for_status()
-    total_size = int(res.headers.get("Content-Length", 0))
-    res.close()
-    return total_size
+    return get_file_metadata(url).size
 
 
-def is_file_downloaded(repo_id, file_name, revision):
-    cache_path = os.path.join(CACHE_PATH, repo_id.replace("/", "_"), file_name)
+def is_file_downloaded(repo_id, file_name, revision, metadata=None):
+    cache_path = get_snapshot_path(repo_id, revision, file_name)
     if not os.path.exists(cache_path):
         return False
     local_size = os.path.getsize(cache_path)
 
-    remote_size = get_remote_file_size(repo_id, file_name, revision)
+    if metadata is None:
+        metadata = get_remote_file_metadata(repo_id, file_name, revision)
+
+    return metadata.size == local_size and snapshot_matches(cache_path, metadata)
+
+
+def is_greater_than_10mb(repo_id, file_name, revision="main", metadata=None):
+    if metadata is None:
+        metadata = get_remote_file_metadata(repo_id, file_name, revision)
+    return metadata.size > TEN_MB
+
 
-    return remote_size == local_size
+def parse_size(size):
+    """把 "200G"、"512M"、"1.5T" 或字节数转换为字节数。"""
+    if isinstance(size, (int, float)):
+        return int(size)
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMGT]?)i?B?\s*", str(size), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid size: {size!r}")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).upper()])
 
 
-def is_greater_than_10mb(repo_id, file_name, revision="main"):
-    return get_remote_file_size(repo_id, file_name, revision) > TEN_MB
+def format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1024:
+            return f"{size:.1f}{unit}" if unit != "B" else f"{size}B"
+        size /= 1024
+    return f"{size:.1f}TB"
 
 
 def calculate_md5(file_path):
@@ -129,7 +320,7 @@ def _get_repo_branch_list(repo_id, repo_type):
     remote_project_url = f"{WM_URL_BASE}/{repo_type}/{repo_id}"
     request = {"project_path": remote_project_url}
     headers = {"authorization": f"Bearer {token}"}
-    response = requests.post(WM_URL_LIST_BRANCH, data=json.dumps(request), headers=headers)
+    response = get_session().post(WM_URL_LIST_BRANCH, data=json.dumps(request), headers=headers)
     json_response = response.json()
     return json_response
 
@@ -137,7 +328,7 @@ def _get_repo_branch_list(repo_id, repo_type):
 @login_required
 def get_repo_branch_list(repo_id, repo_type):
     json_response = _get_repo_branch_list(repo_id, repo_type)
-    print(json_response)
+    logger.debug(f"branch list of {repo_type}/{repo_id}: {json_response}")
     if json_response["code"] == 0:
         return [item["branch"] for item in json_response["data"]["list"]]
     elif json_response["code"] == 10003:
@@ -190,10 +381,10 @@ def get_repo_file_list(repo_id, repo_type,path="", branch="main"):
     baseReq={"page":1,"pageSize":500}
     request = {"project_path": remote_project_url,"path":path,"branch":branch,"baseReq":baseReq}
     headers = {"authorization": f"Bearer {token}"}
-    print(request)
-    response = requests.post(WM_URL_LIST_FILES, data=json.dumps(request), headers=headers)
+    logger.debug(f"list files: {request}")
+    response = get_session().post(WM_URL_LIST_FILES, data=json.dumps(request), headers=headers)
     json_response = response.json()
-    print(json_response)
+    logger.debug(f"file list of {repo_type}/{repo_id}/{path}: {json_response}")
     if json_response["code"] == 0:
         return [item["name"] for item in json_response["data"]["list"]]
     elif json_response["code"] == 10003:
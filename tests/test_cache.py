@@ -0,0 +1,59 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from wisemodel_hub.cache import link_snapshot_file, materialize
+
+
+def run_threads(target, count=8):
+    errors = []
+
+    def run():
+        try:
+            target()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+class ConcurrentLinkTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        self.src = os.path.join(self.root, "blob")
+        with open(self.src, "wb") as f:
+            f.write(b"content")
+
+    def assert_no_leftovers(self, directory):
+        self.assertEqual([name for name in os.listdir(directory) if name.endswith(".tmp")], [])
+
+    def test_threads_materialize_same_path(self):
+        dst = os.path.join(self.root, "out", "file")
+
+        def target():
+            for mode in ("copy", "hardlink", "symlink") * 20:
+                materialize(self.src, dst, mode)
+
+        self.assertEqual(run_threads(target), [])
+        with open(dst, "rb") as f:
+            self.assertEqual(f.read(), b"content")
+        self.assert_no_leftovers(os.path.dirname(dst))
+
+    def test_threads_link_same_snapshot_path(self):
+        snapshot_path = os.path.join(self.root, "snapshot", "file")
+
+        def target():
+            for _ in range(50):
+                link_snapshot_file(self.src, snapshot_path)
+
+        self.assertEqual(run_threads(target), [])
+        self.assertTrue(os.path.samefile(snapshot_path, self.src))
+        self.assert_no_leftovers(os.path.dirname(snapshot_path))
@@ -0,0 +1,49 @@
+import unittest
+
+from wisemodel_hub.lazy_snapshot import LazySnapshot
+
+
+def related(files, file_name):
+    snapshot = LazySnapshot("org/repo", file_names=files, prefetch=False)
+    return sorted(snapshot._related_files(file_name, None))
+
+
+class RelatedFilesTest(unittest.TestCase):
+    def test_shards_of_the_same_group(self):
+        files = [
+            "model-00001-of-00003.safetensors",
+            "model-00002-of-00003.safetensors",
+            "model-00003-of-00003.safetensors",
+            "model-00001-of-00002.bin",
+            "config.json",
+        ]
+        self.assertEqual(
+            related(files, "model-00001-of-00003.safetensors"),
+            ["model-00002-of-00003.safetensors", "model-00003-of-00003.safetensors"],
+        )
+
+    def test_other_precision_is_not_prefetched(self):
+        files = [
+            "model.fp16-00001-of-00002.safetensors",
+            "model.fp16-00002-of-00002.safetensors",
+            "model.fp32-00001-of-00002.safetensors",
+            "model.fp32-00002-of-00002.safetensors",
+        ]
+        self.assertEqual(
+            related(files, "model.fp16-00001-of-00002.safetensors"), ["model.fp16-00002-of-00002.safetensors"]
+        )
+
+    def test_other_checkpoint_is_not_prefetched(self):
+        files = [
+            "checkpoint-100/model.safetensors",
+            "checkpoint-200/model.safetensors",
+            "checkpoint-100/model-00001-of-00002.safetensors",
+            "checkpoint-100/model-00002-of-00002.safetensors",
+            "checkpoint-200/model-00001-of-00002.safetensors",
+            "checkpoint-200/model-00002-of-00002.safetensors",
+        ]
+        self.assertEqual(related(files, "checkpoint-100/model.safetensors"), [])
+        self.assertEqual(
+            related(files, "checkpoint-100/model-00001-of-00002.safetensors"),
+            ["checkpoint-100/model-00002-of-00002.safetensors"],
+        )
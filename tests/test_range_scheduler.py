@@ -0,0 +1,125 @@
+import random
+import unittest
+from unittest import mock
+
+from wisemodel_hub import range_scheduler
+from wisemodel_hub.range_scheduler import RangeScheduler
+
+
+def assert_tiles(test, ranges, total_size):
+    """范围按起点排序后首尾相接地覆盖 [0, total_size)，游标不越界。"""
+    position = 0
+    for start, cursor, end in sorted(ranges):
+        test.assertEqual(start, position)
+        test.assertLessEqual(start, cursor)
+        test.assertLessEqual(cursor, end)
+        position = end
+    test.assertEqual(position, total_size)
+
+
+class SplitTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(range_scheduler, "_bandwidth", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_split_covers_file(self):
+        total_size = 10 * range_scheduler.MIN_RANGE_SIZE + 123
+        ranges = RangeScheduler.split(total_size, 8)
+        self.assertEqual(len(ranges), 8)
+        assert_tiles(self, ranges, total_size)
+        for start, cursor, _ in ranges:
+            self.assertEqual(start, cursor)
+
+    def test_small_file_is_one_range(self):
+        self.assertEqual(RangeScheduler.split(100, 8), [[0, 0, 100]])
+        total_size = 3 * range_scheduler.MIN_RANGE_SIZE
+        self.assertEqual(len(RangeScheduler.split(total_size, 8)), 3)
+
+    def test_range_size_follows_bandwidth(self):
+        # 每个范围至少要传输 RANGE_TARGET_SECONDS 秒
+        speed = 4 * range_scheduler.MIN_RANGE_SIZE
+        range_scheduler.record_throughput(speed, 1)
+        total_size = 16 * range_scheduler.MIN_RANGE_SIZE
+        ranges = RangeScheduler.split(total_size, 32)
+        self.assertEqual(len(ranges), total_size // (speed * range_scheduler.RANGE_TARGET_SECONDS))
+        assert_tiles(self, ranges, total_size)
+
+
+class StealTest(unittest.TestCase):
+    def test_acquire_prefers_largest_idle_range(self):
+        scheduler = RangeScheduler([[0, 0, 10], [10, 10, 40], [40, 40, 60]], min_split_size=5)
+        self.assertEqual(scheduler.acquire(), 1)
+        self.assertEqual(scheduler.acquire(), 2)
+        self.assertEqual(scheduler.acquire(), 0)
+
+    def test_steal_splits_active_range_in_half(self):
+        scheduler = RangeScheduler([[0, 0, 100]], min_split_size=10)
+        self.assertEqual(scheduler.acquire(), 0)
+        scheduler.advance(0, 20)
+        self.assertEqual(scheduler.acquire(), 1)
+        self.assertEqual(scheduler.ranges, [[0, 20, 60], [60, 60, 100]])
+        assert_tiles(self, scheduler.ranges, 100)
+
+    def test_no_steal_below_min_split_size(self):
+        scheduler = RangeScheduler([[0, 0, 100]], min_split_size=10)
+        scheduler.acquire()
+        scheduler.advance(0, 81)
+        self.assertIsNone(scheduler.acquire())
+        self.assertEqual(scheduler.ranges, [[0, 81, 100]])
+
+    def test_clip_stops_at_stolen_tail(self):
+        scheduler = RangeScheduler([[0, 0, 100]], min_split_size=10)
+        scheduler.acquire()
+        scheduler.acquire()
+        # 原来的线程不能写入已被切走的后一半
+        self.assertEqual(scheduler.clip(0, 40, 30), 10)
+        self.assertEqual(scheduler.clip(0, 50, 30), 0)
+
+    def test_frontier_stops_at_first_gap(self):
+        scheduler = RangeScheduler([[0, 30, 30], [30, 35, 60], [60, 60, 90]])
+        self.assertEqual(scheduler.frontier(), 35)
+        scheduler.advance(1, 60)
+        scheduler.advance(2, 70)
+        self.assertEqual(scheduler.frontier(), 70)
+        self.assertFalse(scheduler.is_complete())
+
+    def test_random_workers_write_every_byte_once(self):
+        rng = random.Random(0)
+        for _ in range(50):
+            total_size = rng.randint(1, 5000)
+            scheduler = RangeScheduler(
+                [[start, start, min(start + 1000, total_size)] for start in range(0, total_size, 1000)],
+                min_split_size=rng.randint(1, 64),
+            )
+            written = bytearray(total_size)
+            workers = {}
+            frontier = 0
+            while True:
+                # 随机让空闲线程领取范围，或让正在下载的线程写入一块
+                if len(workers) < 4 and (not workers or rng.random() < 0.3):
+                    index = scheduler.acquire()
+                    if index is not None:
+                        workers[index] = scheduler.ranges[index][1]
+                        continue
+                if not workers:
+                    break
+                index = rng.choice(list(workers))
+                cursor = workers[index]
+                size = scheduler.clip(index, cursor, rng.randint(1, 300))
+                if size == 0:
+                    scheduler.release(index)
+                    del workers[index]
+                    continue
+                for offset in range(cursor, cursor + size):
+                    written[offset] += 1
+                scheduler.advance(index, cursor + size)
+                workers[index] = cursor + size
+
+                assert_tiles(self, scheduler.snapshot(), total_size)
+                self.assertGreaterEqual(scheduler.frontier(), frontier)
+                frontier = scheduler.frontier()
+
+            self.assertTrue(scheduler.is_complete())
+            self.assertEqual(scheduler.frontier(), total_size)
+            self.assertEqual(set(written), {1})
@@ -0,0 +1,59 @@
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from wisemodel_hub import session
+
+
+BODY = b"x" * (1 << 20)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+class EnsurePoolMaxsizeTest(unittest.TestCase):
+    def setUp(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.url = f"http://127.0.0.1:{server.server_port}/file"
+        for attribute, value in (("_session", None), ("_pool_maxsize", 2)):
+            patcher = mock.patch.object(session, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(lambda: session._session and session._session.close())
+
+    def test_grows_pool_and_closes_old_adapter(self):
+        old_adapter = session.get_session().get_adapter("https://")
+        with mock.patch.object(old_adapter, "close", wraps=old_adapter.close) as close:
+            session.ensure_pool_maxsize(8)
+        close.assert_called_once_with()
+        new_adapter = session.get_session().get_adapter("https://")
+        self.assertIsNot(new_adapter, old_adapter)
+        self.assertIs(session.get_session().get_adapter("http://"), new_adapter)
+        self.assertEqual(new_adapter._pool_maxsize, 8)
+
+    def test_never_shrinks(self):
+        adapter = session.get_session().get_adapter("https://")
+        session.ensure_pool_maxsize(1)
+        self.assertIs(session.get_session().get_adapter("https://"), adapter)
+
+    def test_in_flight_request_is_not_interrupted(self):
+        response = session.get_session().get(self.url, stream=True)
+        self.addCleanup(response.close)
+        first = response.raw.read(1024)
+        session.ensure_pool_maxsize(8)
+        self.assertEqual(first + response.raw.read(), BODY)
+        self.assertEqual(session.get_session().get(self.url).content, BODY)
@@ -0,0 +1,38 @@
+import unittest
+from unittest import mock
+
+from wisemodel_hub import utils
+
+
+class MetadataCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.fetch = self.patch(utils, "_fetch_file_metadata", side_effect=lambda url: url)
+        self.patch(utils, "_metadata_cache", utils.OrderedDict())
+        self.patch(utils.time, "monotonic", side_effect=lambda: self.now)
+
+    def patch(self, target, attribute, *args, **kwargs):
+        patcher = mock.patch.object(target, attribute, *args, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def test_cached_within_ttl(self):
+        self.assertEqual(utils.get_file_metadata("a"), "a")
+        self.now += utils.METADATA_CACHE_TTL / 2
+        self.assertEqual(utils.get_file_metadata("a"), "a")
+        self.assertEqual(self.fetch.call_count, 1)
+
+    def test_expired_entries_are_dropped_on_insert(self):
+        for index in range(100):
+            utils.get_file_metadata(f"url-{index}")
+        self.now += utils.METADATA_CACHE_TTL + 1
+        utils.get_file_metadata("new")
+        self.assertEqual(list(utils._metadata_cache), ["new"])
+
+    def test_refresh_moves_entry_to_the_end(self):
+        utils.get_file_metadata("a")
+        self.now += 1
+        utils.get_file_metadata("b")
+        self.now += utils.METADATA_CACHE_TTL - 0.5
+        utils.get_file_metadata("a", use_cache=False)
+        self.assertEqual(list(utils._metadata_cache), ["b", "a"])